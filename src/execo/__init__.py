@@ -33,10 +33,11 @@ from .process import Process, SshProcess, get_process, \
      ExpectOutputHandler
 from .action import Action, wait_any_actions, wait_all_actions, \
   Remote, Put, Get, TaktukRemote, TaktukPut, TaktukGet, Local, \
+  StreamGet, StreamGetArchive, TaktukSession, \
   ParallelActions, SequentialActions, default_action_factory, \
   get_remote, get_fileput, get_fileget, \
   ActionLifecycleHandler, ChainPut, filter_bad_hosts, \
-  RemoteSerial
+  RemoteSerial, get_taktuk_tree_params
 from .report import Report
 from .exception import ProcessesFailed, ActionsFailed
 try:
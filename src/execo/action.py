@@ -23,7 +23,7 @@ from .host import get_hosts_list, get_unique_hosts_list
 from .log import style, logger
 from .process import ProcessLifecycleHandler, SshProcess, ProcessOutputHandler, \
     TaktukProcess, Process, SerialSsh
-from .report import Report
+from .report import Report, _stats_counters
 from .ssh_utils import get_rewritten_host_address, get_scp_command, \
     get_taktuk_connector_command, get_ssh_command
 from .utils import name_from_cmdline, non_retrying_intr_cond_wait, intr_event_wait, get_port, \
@@ -31,7 +31,7 @@ from .utils import name_from_cmdline, non_retrying_intr_cond_wait, intr_event_wa
 from traceback import format_exc
 from .substitutions import get_caller_context, remote_substitute
 from .time_utils import get_seconds, format_date, Timer
-import threading, time, pipes, tempfile, os, shutil, stat
+import threading, time, pipes, tempfile, os, shutil, stat, tarfile, json, math, atexit, random
 
 class ActionLifecycleHandler(object):
 
@@ -82,6 +82,11 @@ class Action(object):
 
     _wait_multiple_actions_condition = threading.Condition()
 
+    _stats_lock = threading.RLock()
+    # lock protecting the cached stats of all actions. Shared by all
+    # actions, as the stats updates propagate from sub-actions to
+    # parent actions
+
     def __init__(self, lifecycle_handlers = None, name = None, default_expect_timeout = None):
         """:param lifecycle_handlers: List of instances of
           `execo.action.ActionLifecycleHandler` for being notified of
@@ -123,6 +128,10 @@ class Action(object):
         self._end_event.clear()
         self._thread_local_storage = threading.local()
         self._thread_local_storage.expect_handler = None
+        self._stats_parents = []
+        self._stats_cache = None
+        self._stats_max_end_date = None
+        self._processes_stats = {}
 
     def _common_reset(self):
         # all methods _common_reset() of this class hierarchy contain
@@ -134,6 +143,7 @@ class Action(object):
         self._end_event.clear()
         self._thread_local_storage.expect_handler = None
         self._init_processes()
+        self._invalidate_stats()
 
     def _args(self):
         # to be implemented in all subclasses. Must return a list with
@@ -275,35 +285,96 @@ class Action(object):
         """Action has started, ended, and is not in error."""
         return self.started and self.ended and self.ok
 
-    def stats(self):
-        """Return a dict summarizing the statistics of all processes
-        of this Action.
+    def _invalidate_stats(self):
+        # drop the cached stats of this action and of its parents,
+        # they will be fully recomputed by the next call to stats()
+        with Action._stats_lock:
+            self._stats_cache = None
+            for parent in self._stats_parents:
+                parent._invalidate_stats()
+
+    def _process_stats_changed(self, process):
+        # called on each process lifecycle event: incrementally
+        # update the cached stats of this action and of its parents
+        # with the difference between the new and the previous stats
+        # of the process, in O(depth)
+        with Action._stats_lock:
+            if self._stats_cache == None:
+                return
+            previous_stats = self._processes_stats.get(process)
+            if previous_stats == None:
+                self._invalidate_stats()
+                return
+            stats = process.stats()
+            self._processes_stats[process] = stats
+            delta = dict([ (k, stats[k] - previous_stats[k]) for k in _stats_counters ])
+            self._apply_stats_delta(delta, stats['start_date'], stats['end_date'])
+
+    def _apply_stats_delta(self, delta, start_date, end_date):
+        with Action._stats_lock:
+            if self._stats_cache == None:
+                return
+            for k in delta:
+                self._stats_cache[k] += delta[k]
+            if (start_date != None
+                and (self._stats_cache['start_date'] == None
+                     or start_date < self._stats_cache['start_date'])):
+                self._stats_cache['start_date'] = start_date
+            if (end_date != None
+                and (self._stats_max_end_date == None
+                     or end_date > self._stats_max_end_date)):
+                self._stats_max_end_date = end_date
+            self._set_stats_end_date(self._stats_cache)
+            for parent in self._stats_parents:
+                parent._apply_stats_delta(delta, start_date, end_date)
+
+    def _set_stats_end_date(self, stats):
+        # the end date is only available when all processes have ended
+        if stats['num_processes'] > 0 and stats['num_ended'] >= stats['num_processes']:
+            stats['end_date'] = self._stats_max_end_date
+        else:
+            stats['end_date'] = None
 
-        see `execo.report.Report.stats`.
-        """
+    def _compute_stats(self):
+        # full computation of the stats of this action. Also
+        # remember the stats of each process, for the incremental
+        # updates
         stats = Report.empty_stats()
-        stats['name'] = self.name
+        self._processes_stats = {}
+        self._stats_max_end_date = None
         for process in self.processes:
             pstats = process.stats()
+            self._processes_stats[process] = pstats
             if (stats['start_date'] == None
                 or (pstats['start_date'] != None
                     and pstats['start_date'] < stats['start_date'])):
                 stats['start_date'] = pstats['start_date']
-            if (stats['end_date'] == None
+            if (self._stats_max_end_date == None
                 or (pstats['end_date'] != None
-                    and pstats['end_date'] > stats['end_date'])):
-                stats['end_date'] = pstats['end_date']
-            stats['num_processes'] += pstats['num_processes']
-            stats['num_started'] += pstats['num_started']
-            stats['num_ended'] += pstats['num_ended']
-            stats['num_errors'] += pstats['num_errors']
-            stats['num_timeouts'] += pstats['num_timeouts']
-            stats['num_forced_kills'] += pstats['num_forced_kills']
-            stats['num_non_zero_exit_codes'] += pstats['num_non_zero_exit_codes']
-            stats['num_ok'] += pstats['num_ok']
-            stats['num_finished_ok'] += pstats['num_finished_ok']
-        if stats['num_processes'] > stats['num_ended']:
-            stats['end_date'] = None
+                    and pstats['end_date'] > self._stats_max_end_date)):
+                self._stats_max_end_date = pstats['end_date']
+            for k in _stats_counters:
+                stats[k] += pstats[k]
+        self._set_stats_end_date(stats)
+        return stats
+
+    def stats(self):
+        """Return a dict summarizing the statistics of all processes
+        of this Action.
+
+        see `execo.report.Report.stats`.
+
+        The stats are computed once, then maintained incrementally
+        on each process start or end (or expect failure, write
+        error), so that polling them is cheap, even on actions with
+        lots of processes.
+        """
+        with Action._stats_lock:
+            if self._stats_cache == None:
+                self._stats_cache = self._compute_stats()
+            stats = self._stats_cache.copy()
+        stats['name'] = self.name
+        stats['sub_stats'] = []
         return stats
 
     def __enter__(self):
@@ -466,7 +537,17 @@ class ActionNotificationProcessLH(ProcessLifecycleHandler):
         self.total_processes = total_processes
         self.terminated_processes = 0
 
+    def start(self, process):
+        self.action._process_stats_changed(process)
+
+    def reset(self, process):
+        self.action._invalidate_stats()
+
+    def stats_changed(self, process):
+        self.action._process_stats_changed(process)
+
     def end(self, process):
+        self.action._process_stats_changed(process)
         self.terminated_processes += 1
         logger.debug("%i/%i processes terminated in %s",
             self.terminated_processes,
@@ -736,6 +817,115 @@ def _escape_brackets_in_taktuk_options(s):
         s = s.replace( c, '\\' + c )
     return s
 
+def get_taktuk_tree_params(num_hosts):
+    """Return a tuple (arity, window) suited to deploy a taktuk tree on num_hosts hosts.
+
+    Returns (None, None) when the number of hosts is low enough that
+    taktuk defaults are fine. Otherwise, the arity is about the square
+    root of the number of hosts (giving a two-level tree), bounded
+    between 2 and 32, and the window is equal to the arity, so that
+    each node initiates all its connections in parallel.
+    """
+    if num_hosts <= 10:
+        return (None, None)
+    arity = min(max(int(math.ceil(math.sqrt(num_hosts))), 2), 32)
+    return (arity, arity)
+
+def _get_taktuk_tree_options(num_hosts, actual_connection_params):
+    # return the taktuk command line options for the deployment tree
+    taktuk_options = actual_connection_params['taktuk_options']
+    auto_arity, auto_window = get_taktuk_tree_params(num_hosts)
+    options = ()
+    for opts, param, auto_value in [ (('-d', '--dynamic'), 'taktuk_arity', auto_arity),
+                                      (('-w', '--window'), 'taktuk_window', auto_window) ]:
+        if any([ o in taktuk_options for o in opts ]):
+            continue
+        value = actual_connection_params.get(param)
+        if value == None:
+            value = auto_value
+        if value != None and value != False:
+            options += (opts[0], str(value))
+    return options
+
+def _get_taktuk_ordered_hosts(hosts, hosts_with_explicit_user, explicit_user, connection_params):
+    # list of (index, host), with or without explicit user, in the
+    # order in which they are given to taktuk: grouped according to
+    # the taktuk_group_func topology hint, if any
+    indexed_hosts = [ (idx, h) for (idx, h) in enumerate(hosts)
+                      if (h in hosts_with_explicit_user) == explicit_user ]
+    group_func = make_connection_params(connection_params).get('taktuk_group_func')
+    if group_func:
+        indexed_hosts.sort(key = lambda indexed_host: str(group_func(indexed_host[1])))
+    return indexed_hosts
+
+def _get_taktuk_hosts_args(hosts, hosts_with_explicit_user, connection_params):
+    # return a tuple (taktuk command line arguments to deploy on the
+    # hosts, list of hosts indexes in the order of the taktuk
+    # positions)
+    args = []
+    hosts_order = []
+    for explicit_user in (False, True):
+        for (index, host) in _get_taktuk_ordered_hosts(hosts, hosts_with_explicit_user, explicit_user, connection_params):
+            if explicit_user:
+                args.extend(("-l", host.user))
+            args.extend(("-m", get_rewritten_host_address(host.address, connection_params)))
+            hosts_order.append(index)
+    return (tuple(args), hosts_order)
+
+def _check_taktuk_hosts(hosts, actual_connection_params):
+    # we can provide per-host user with taktuk, but we cannot provide
+    # per-host port or keyfile, so check that all hosts and
+    # connection_params have the same port / keyfile (or None). return
+    # a tuple (set of hosts with explicit user, keyfile, port)
+    check_default_port = actual_connection_params['port']
+    check_default_keyfile = actual_connection_params['keyfile']
+    check_keyfiles = set()
+    check_ports = set()
+    hosts_with_explicit_user = set()
+    for host in hosts:
+        if host.user != None:
+            hosts_with_explicit_user.add(host)
+        if host.keyfile != None:
+            check_keyfiles.add(host.keyfile)
+        else:
+            check_keyfiles.add(check_default_keyfile)
+        if host.port != None:
+            check_ports.add(host.port)
+        else:
+            check_ports.add(check_default_port)
+    if len(check_keyfiles) > 1 or len(check_ports) > 1:
+        raise ValueError("unable to provide more than one keyfile / port for taktuk remote connection")
+    global_keyfile = None
+    global_port = None
+    if len(check_keyfiles) == 1:
+        global_keyfile = list(check_keyfiles)[0]
+    if len(check_ports) == 1:
+        global_port = list(check_ports)[0]
+    return (hosts_with_explicit_user, global_keyfile, global_port)
+
+def _get_taktuk_cmdline(num_hosts, global_keyfile, global_port, connection_params, actual_connection_params):
+    # return the taktuk command line (tuple of arguments) with the
+    # output format expected by _TaktukRemoteOutputHandler and its
+    # subclasses, without the hosts and commands arguments
+    taktuk_cmdline = (actual_connection_params['taktuk'],)
+    taktuk_cmdline += ("-E", "!")
+    taktuk_cmdline += ("-o", 'output="A $position # $line\\n"',
+                       "-o", 'error="B $position # $line\\n"',
+                       "-o", 'status="C $position # $line\\n"',
+                       "-o", 'connector="D $position # $peer_position # $line\\n"',
+                       "-o", 'state="E $position # $peer_position # $line # ".event_msg($line)."\\n"',
+                       "-o", 'info="F $position # $line\\n"',
+                       "-o", 'taktuk="G $position # $line\\n"',
+                       "-o", 'message="H $position # $line\\n"',
+                       "-o", 'default="I $position # $type > $line\\n"')
+    taktuk_cmdline += actual_connection_params['taktuk_options']
+    taktuk_cmdline += _get_taktuk_tree_options(num_hosts, actual_connection_params)
+    taktuk_cmdline += ("-c", " ".join(
+        get_taktuk_connector_command(keyfile = global_keyfile,
+                                     port = global_port,
+                                     connection_params = connection_params)))
+    return taktuk_cmdline
+
 class TaktukRemote(Action):
 
     """Launch a command remotely on several host, with ``taktuk``.
@@ -757,6 +947,14 @@ class TaktukRemote(Action):
       workaround is to pass options -tt but passing these options to
       taktuk connector causes immediate closing of the connector upon
       connection.
+
+    The shape of the taktuk deployment tree (arity and window of the
+    work-stealing deployment) is automatically sized according to the
+    number of hosts, see `execo.action.get_taktuk_tree_params`. It can
+    be overridden with connection_params keys ``taktuk_arity`` and
+    ``taktuk_window``, and hosts can be grouped (e.g. by cluster) with
+    ``taktuk_group_func``, so that nodes of a same group are deployed
+    close to each other.
     """
 
     def __init__(self, cmd, hosts, connection_params = None, process_args = None, **kwargs):
@@ -821,83 +1019,42 @@ class TaktukRemote(Action):
             p._taktuk_remote = self
             self.processes.append(p)
 
-    def _gen_taktuk_commands(self, hosts_with_explicit_user):
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h not in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-m", get_rewritten_host_address(host.address, self.connection_params), "-[", "exec", "[", _escape_brackets_in_taktuk_options(self.processes[index].cmd), "]", "-]",)
-            self._taktuk_hosts_order.append(index)
-            self.processes[index]._taktuk_index = index
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-l", host.user, "-m", get_rewritten_host_address(host.address, self.connection_params), "-[", "exec", "[", _escape_brackets_in_taktuk_options(self.processes[index].cmd), "]", "-]",)
-            self._taktuk_hosts_order.append(index)
-            self.processes[index]._taktuk_index = index
+    def _gen_taktuk_commands(self, unreachable = ()):
+        # return the commands to send to taktuk standard input: a
+        # single broadcast if the command is the same for all hosts,
+        # else one command per host (skipping unreachable hosts
+        # indexes)
+        cmds = set([ process.cmd for process in self.processes ])
+        if len(cmds) == 1:
+            return "broadcast exec [ %s ]\n" % (_escape_brackets_in_taktuk_options(self._taktuk_exec_cmd(cmds.pop())),)
+        return "".join([ "%i exec [ %s ]\n" % (position, _escape_brackets_in_taktuk_options(self._taktuk_exec_cmd(self.processes[index].cmd)))
+                         for (position, index) in enumerate(self._taktuk_hosts_order, 1)
+                         if index not in unreachable ])
+
+    def _taktuk_exec_cmd(self, cmd):
+        # the command executed by taktuk for a process command
+        return cmd
 
     def _init_processes(self):
         # taktuk code common to TaktukRemote and subclasses TaktukGet
         # TaktukPut
         self.processes = []
         self._taktuk_hosts_order = []
-        self._taktuk_commands = ()
         self._taktuk = None
         if len(self.hosts) > 0:
-            # we can provide per-host user with taktuk, but we cannot
-            # provide per-host port or keyfile, so check that all hosts
-            # and connection_params have the same port / keyfile (or None)
             actual_connection_params = make_connection_params(self.connection_params)
-            check_default_port = actual_connection_params['port']
-            check_default_keyfile = actual_connection_params['keyfile']
-            check_keyfiles = set()
-            check_ports = set()
-            hosts_with_explicit_user = set()
-            for host in self.hosts:
-                if host.user != None:
-                    hosts_with_explicit_user.add(host)
-                if host.keyfile != None:
-                    check_keyfiles.add(host.keyfile)
-                else:
-                    check_keyfiles.add(check_default_keyfile)
-                if host.port != None:
-                    check_ports.add(host.port)
-                else:
-                    check_ports.add(check_default_port)
-            if len(check_keyfiles) > 1 or len(check_ports) > 1:
-                raise ValueError("unable to provide more than one keyfile / port for taktuk remote connection")
-            global_keyfile = None
-            global_port = None
-            if len(check_keyfiles) == 1:
-                global_keyfile = list(check_keyfiles)[0]
-            if len(check_ports) == 1:
-                global_port = list(check_ports)[0]
+            (hosts_with_explicit_user, global_keyfile, global_port) = _check_taktuk_hosts(self.hosts, actual_connection_params)
             self._gen_taktukprocesses()
-            self._gen_taktuk_commands(hosts_with_explicit_user)
-            #self._taktuk_commands += ("quit",)
-            #handler = _TaktukRemoteOutputHandler(self)
-            taktuk_options_filehandle, taktuk_options_filename = tempfile.mkstemp(prefix = 'tmp_execo_taktuk_')
-            self._taktuk_commands = " ".join(self._taktuk_commands)
-            os.write(taktuk_options_filehandle, self._taktuk_commands + "\n")
-            os.close(taktuk_options_filehandle)
-            logger.debug("generated taktuk tmp cmd file %s with content:\n%s", taktuk_options_filename, self._taktuk_commands)
-            real_taktuk_cmdline = (actual_connection_params['taktuk'],)
-            real_taktuk_cmdline += ("-E", "!")
-            real_taktuk_cmdline += ("-o", 'output="A $position # $line\\n"',
-                                    "-o", 'error="B $position # $line\\n"',
-                                    "-o", 'status="C $position # $line\\n"',
-                                    "-o", 'connector="D $position # $peer_position # $line\\n"',
-                                    "-o", 'state="E $position # $peer_position # $line # ".event_msg($line)."\\n"',
-                                    "-o", 'info="F $position # $line\\n"',
-                                    "-o", 'taktuk="G $position # $line\\n"',
-                                    "-o", 'message="H $position # $line\\n"',
-                                    "-o", 'default="I $position # $type > $line\\n"')
-            real_taktuk_cmdline += actual_connection_params['taktuk_options']
-            real_taktuk_cmdline += ("-c", " ".join(
-                get_taktuk_connector_command(keyfile = global_keyfile,
-                                             port = global_port,
-                                             connection_params = self.connection_params)))
-            real_taktuk_cmdline += ("-F", taktuk_options_filename)
-            real_taktuk_cmdline = " ".join([pipes.quote(arg) for arg in real_taktuk_cmdline])
-            real_taktuk_cmdline += " && rm -f " + taktuk_options_filename
+            # hosts are given on taktuk command line (without a shell,
+            # to avoid the command line length limit of sh -c), and the
+            # commands are sent on taktuk standard input when starting
+            (taktuk_hosts_args, self._taktuk_hosts_order) = _get_taktuk_hosts_args(
+                self.hosts, hosts_with_explicit_user, self.connection_params)
+            real_taktuk_cmdline = _get_taktuk_cmdline(len(self.hosts), global_keyfile, global_port,
+                                                      self.connection_params, actual_connection_params)
+            real_taktuk_cmdline += taktuk_hosts_args
             self._taktuk = Process(real_taktuk_cmdline)
             #self._taktuk.close_stdin = False
-            self._taktuk.shell = True
             #self._taktuk.default_stdout_handler = False
             #self._taktuk.default_stderr_handler = False
             self._taktuk.stdout_handlers.append(self._taktuk_stdout_output_handler)
@@ -911,6 +1068,9 @@ class TaktukRemote(Action):
             self._notify_terminated()
         else:
             self._taktuk.start()
+            taktuk_commands = self._gen_taktuk_commands()
+            logger.debug("send commands to taktuk of %s:\n%s", self, taktuk_commands)
+            self._taktuk.write(taktuk_commands)
         return retval
 
     def kill(self):
@@ -1213,16 +1373,9 @@ class TaktukPut(TaktukRemote):
             process._num_transfers_failed = 0
             self.processes.append(process)
 
-    def _gen_taktuk_commands(self, hosts_with_explicit_user):
-        self._taktuk_hosts_order = []
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h not in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-m", get_rewritten_host_address(host.address, self.connection_params))
-            self._taktuk_hosts_order.append(index)
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-l", host.user, "-m", get_rewritten_host_address(host.address, self.connection_params))
-            self._taktuk_hosts_order.append(index)
-        for src in self.local_files:
-            self._taktuk_commands += ("broadcast", "put", "[", src, "]", "[", self.remote_location, "]", ";")
+    def _gen_taktuk_commands(self, unreachable = ()):
+        return "".join([ "broadcast put [ %s ] [ %s ]\n" % (src, self.remote_location)
+                         for src in self.local_files ])
 
 class _TaktukGetOutputHandler(_TaktukRemoteOutputHandler):
 
@@ -1366,16 +1519,570 @@ class TaktukGet(TaktukRemote):
             process._num_transfers_failed = 0
             self.processes.append(process)
 
-    def _gen_taktuk_commands(self, hosts_with_explicit_user):
+    def _gen_taktuk_commands(self, unreachable = ()):
+        return "".join([ "broadcast get [ %s ] [ %s ]\n" % (src, self.local_location)
+                         for src in self.remote_files ])
+
+class _TaktukSessionOutputHandler(ProcessOutputHandler):
+
+    """Dispatch the output of the taktuk process of a `execo.action.TaktukSession` to its current action."""
+
+    def __init__(self, session):
+        super(_TaktukSessionOutputHandler, self).__init__()
+        self.session = session
+
+    def read_line(self, process, stream, string, eof, error):
+        try:
+            if len(string) > 0 and ord(string[0]) == 69: # state
+                (_, _, line) = string[2:].partition(" # ")
+                (peer_position, _, line) = line.partition(" # ")
+                (state_code, _, _) = line.partition(" # ")
+                if int(state_code) in (3, 5): # connection failed or lost
+                    self.session._unreachable.add(self.session._taktuk_hosts_order[int(peer_position)-1])
+        except Exception as e: #IGNORE:W0703
+            logger.critical("%s: Unexpected exception %s while parsing taktuk output. Please report this message.", self.__class__.__name__, e)
+            logger.critical("line received = %s", string.rstrip('\n'))
+        action = self.session._get_output_action(string)
+        if action:
+            action._taktuk_stdout_output_handler.read_line(process, stream, string, eof, error)
+
+class _TaktukSessionLH(ProcessLifecycleHandler):
+
+    """Notify a `execo.action.TaktukSession` and its current action of the end of its taktuk process."""
+
+    def __init__(self, session):
+        super(_TaktukSessionLH, self).__init__()
+        self.session = session
+
+    def end(self, process):
+        self.session.ended = True
+        action = self.session._current_action
+        if action:
+            _TaktukLH(action).end(process)
+
+class _TaktukSessionActionMixin(object):
+
+    # code common to the actions run inside a TaktukSession: instead
+    # of running their own taktuk instance, they send their commands
+    # to the already deployed taktuk of the session.
+
+    def _init_processes(self):
+        self.processes = []
+        self._taktuk = None
+        self._taktuk_hosts_order = self.session._taktuk_hosts_order
+        if len(self.hosts) > 0:
+            self._gen_taktukprocesses()
+
+    def start(self):
+        retval = Action.start(self)
+        if len(self.processes) == 0:
+            logger.debug("%s contains 0 processes -> immediately terminated", self)
+            self._notify_terminated()
+        else:
+            self.session._start_action(self)
+        return retval
+
+    def kill(self):
+        retval = Action.kill(self)
+        if self.session._current_action == self:
+            for process in self.processes:
+                if process.running:
+                    process.killed = True
+            self.session._write("broadcast kill\n")
+        return retval
+
+    def wait(self, timeout = None):
+        return Action.wait(self, timeout)
+
+    def _notify_terminated(self):
+        self.session._end_action(self)
+        Action._notify_terminated(self)
+
+class _TaktukSessionRemote(_TaktukSessionActionMixin, TaktukRemote):
+
+    def __init__(self, session, cmd, **kwargs):
+        self.session = session
+        self._session_tag = None
+        super(_TaktukSessionRemote, self).__init__(cmd, session.hosts, connection_params = session.connection_params, **kwargs)
+
+    def _taktuk_exec_cmd(self, cmd):
+        # the command first outputs the tag given by the session on
+        # stdout and stderr, so that the session knows which outputs
+        # are from it
+        return "echo %s; echo %s >&2; %s" % (self._session_tag, self._session_tag, cmd)
+
+
+class _TaktukSessionPut(_TaktukSessionActionMixin, TaktukPut):
+
+    def __init__(self, session, local_files, remote_location = ".", **kwargs):
+        self.session = session
+        super(_TaktukSessionPut, self).__init__(session.hosts, local_files, remote_location, connection_params = session.connection_params, **kwargs)
+
+
+class _TaktukSessionGet(_TaktukSessionActionMixin, TaktukGet):
+
+    def __init__(self, session, remote_files, local_location = ".", **kwargs):
+        self.session = session
+        super(_TaktukSessionGet, self).__init__(session.hosts, remote_files, local_location, connection_params = session.connection_params, **kwargs)
+
+
+class TaktukSession(object):
+
+    """A taktuk deployment kept alive to run several commands or file transfers on the same hosts.
+
+    `execo.action.TaktukRemote`, `execo.action.TaktukPut` and
+    `execo.action.TaktukGet` deploy a whole taktuk tree each time
+    they are run. A TaktukSession deploys it once, keeps taktuk in
+    interactive mode, and sends it the commands of the successive
+    actions, so that repeated broadcasts on the same hosts avoid the
+    deployment cost. It is intended to be used as a context manager::
+
+     with TaktukSession(hosts) as session:
+       session.run("hostname")
+       session.put(["some_file"], "/tmp")
+       r = session.run("cat /tmp/some_file")
+
+    `execo.action.TaktukSession.run`,
+    `execo.action.TaktukSession.put` and
+    `execo.action.TaktukSession.get` return actions behaving like
+    `execo.action.TaktukRemote`, `execo.action.TaktukPut` and
+    `execo.action.TaktukGet`, with one `execo.process.TaktukProcess`
+    per host of the session. As taktuk output cannot be attributed to
+    concurrent commands, only one action at a time can run in a
+    session. The commands of each action are tagged, so that output
+    still received on a host from previous commands (for example
+    from background processes they started, or from a killed action)
+    before the start of the current command is discarded instead of
+    being attributed to the current action. Output of background
+    processes which continue after the start of the next command
+    cannot be told apart from this command's output, and should be
+    redirected by the commands starting them. Hosts whose connection failed or was lost are reported as
+    failed processes in all subsequent actions.
+    """
+
+    def __init__(self, hosts, connection_params = None):
+        """
+        :param hosts: iterable of `execo.host.Host` on which to deploy
+          taktuk.
+
+        :param connection_params: a dict similar to
+          `execo.config.default_connection_params` whose values will
+          override those in default_connection_params for connection.
+        """
+        self.hosts = get_hosts_list(singleton_to_collection(hosts))
+        """List of `execo.host.Host` on which taktuk is deployed."""
+        self.connection_params = connection_params
+        """A dict similar to `execo.config.default_connection_params` whose values
+        will override those in default_connection_params for connection."""
+        self.started = False
+        """whether this TaktukSession was started (boolean)"""
+        self.ended = False
+        """whether the taktuk process of this TaktukSession has ended (boolean)"""
+        self._lock = threading.RLock()
+        self._current_action = None
+        self._num_actions = 0
+        self._tag_pending = None
+        # if the current action runs commands, associates the taktuk
+        # positions of the reachable hosts to the set of headers of
+        # taktuk outputs (stdout, stderr) on which its tag was not yet
+        # received
+        self._unreachable = set()
+        self._taktuk = None
         self._taktuk_hosts_order = []
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h not in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-m", get_rewritten_host_address(host.address, self.connection_params))
-            self._taktuk_hosts_order.append(index)
-        for (index, host) in [ (idx, h) for (idx, h) in enumerate(self.hosts) if h in hosts_with_explicit_user ]:
-            self._taktuk_commands += ("-l", host.user, "-m", get_rewritten_host_address(host.address, self.connection_params))
-            self._taktuk_hosts_order.append(index)
-        for src in self.remote_files:
-            self._taktuk_commands += ("broadcast", "get", "[", src, "]", "[", self.local_location, "]", ";")
+
+    def __repr__(self):
+        kwargs = ""
+        if self.connection_params: kwargs = ", connection_params=%r" % (self.connection_params,)
+        return "%s(%r%s)" % (self.__class__.__name__, self.hosts, kwargs)
+
+    def _init_taktuk(self):
+        actual_connection_params = make_connection_params(self.connection_params)
+        (hosts_with_explicit_user, global_keyfile, global_port) = _check_taktuk_hosts(self.hosts, actual_connection_params)
+        (taktuk_hosts_args, hosts_order) = _get_taktuk_hosts_args(
+            self.hosts, hosts_with_explicit_user, self.connection_params)
+        # updated in place: actions created before start share it
+        self._taktuk_hosts_order[:] = hosts_order
+        real_taktuk_cmdline = _get_taktuk_cmdline(len(self.hosts), global_keyfile, global_port,
+                                                  self.connection_params, actual_connection_params)
+        real_taktuk_cmdline += taktuk_hosts_args
+        self._taktuk = Process(real_taktuk_cmdline)
+        self._taktuk.stdout_handlers.append(_TaktukSessionOutputHandler(self))
+        self._taktuk.lifecycle_handlers.append(_TaktukSessionLH(self))
+
+    def start(self):
+        """Deploy taktuk on the hosts.
+
+        return self"""
+        if self.started:
+            raise ValueError("TaktukSession may be started only once")
+        self.started = True
+        if len(self.hosts) > 0:
+            self._init_taktuk()
+            self._taktuk.start()
+        else:
+            self.ended = True
+        return self
+
+    def close(self):
+        """Quit taktuk and wait for its termination.
+
+        return self"""
+        with self._lock:
+            action = self._current_action
+        if action:
+            action.kill()
+            action.wait()
+        if self._taktuk:
+            self._write("quit\n")
+            self._taktuk.wait()
+        self.ended = True
+        return self
+
+    def kill(self):
+        """Kill taktuk. Its current action processes are terminated.
+
+        return self"""
+        if self._taktuk:
+            self._taktuk.kill()
+        return self
+
+    def __enter__(self):
+        """Context manager enter function: starts the session if needed and returns self"""
+        if not self.started:
+            self.start()
+        return self
+
+    def __exit__(self, t, v, traceback):
+        """Context manager leave function: closes the session"""
+        self.close()
+        return False
+
+    def _write(self, s):
+        if self._taktuk and not self.ended:
+            self._taktuk.write(s)
+
+    def _start_action(self, action):
+        with self._lock:
+            if not self.started or self.ended:
+                raise ValueError("%s not running, unable to start %s" % (self, action))
+            if self._current_action:
+                raise ValueError("%s already running %s, unable to start %s" % (self, self._current_action, action))
+            self._current_action = action
+            unreachable = set(self._unreachable)
+            self._num_actions += 1
+            if isinstance(action, _TaktukSessionRemote):
+                action._session_tag = "execo-%08x-%i" % (random.getrandbits(32), self._num_actions)
+                self._tag_pending = dict([ (position, set([ 65, 66 ]))
+                                           for (position, index) in enumerate(self._taktuk_hosts_order, 1)
+                                           if index not in unreachable ])
+            else:
+                self._tag_pending = None
+            commands = action._gen_taktuk_commands(unreachable)
+        for index in unreachable:
+            action.processes[index]._set_terminated(error = True, error_reason = "taktuk connection failed")
+        if len(unreachable) < len(action.processes):
+            self._write(commands)
+
+    def _get_output_action(self, string):
+        # return the action to which a taktuk output line must be
+        # dispatched, or None to discard it. Commands outputs (stdout,
+        # stderr, status) of a host are discarded until the tag of the
+        # current action is received on both stdout and stderr, and
+        # all commands outputs are discarded during transfers.
+        with self._lock:
+            action = self._current_action
+            if not action or len(string) == 0 or ord(string[0]) not in (65, 66, 67):
+                return action
+            if self._tag_pending == None:
+                return None
+            header = ord(string[0])
+            (position, _, line) = string[2:].partition(" # ")
+            pending = self._tag_pending.get(int(position))
+            if not pending:
+                return action
+            if header in pending:
+                if line.rstrip("\n") == action._session_tag:
+                    pending.discard(header)
+                return None
+            if header == 67: # status of a previous command
+                return None
+            return action
+
+    def _end_action(self, action):
+        with self._lock:
+            if self._current_action == action:
+                self._current_action = None
+
+    def _run(self, action, timeout):
+        action.run(timeout)
+        if not action.ended:
+            action.kill()
+            action.wait()
+        return action
+
+    def run(self, cmd, timeout = None, **kwargs):
+        """Run a command on all hosts of the session, wait for its termination and return it.
+
+        :param cmd: the command to run remotely. substitions
+          described in `execo.substitutions.remote_substitute` will be
+          performed.
+
+        :param timeout: if not None, the command is killed if not
+          terminated after this timeout.
+
+        Other keyword arguments are passed to the
+        `execo.action.TaktukRemote` constructor.
+        """
+        return self._run(_TaktukSessionRemote(self, cmd, **kwargs), timeout)
+
+    def put(self, local_files, remote_location = ".", timeout = None, **kwargs):
+        """Copy local files to all hosts of the session, wait for the transfers termination and return the action.
+
+        Parameters are the same as for `execo.action.TaktukPut`, with
+        a timeout as for `execo.action.TaktukSession.run`.
+        """
+        return self._run(_TaktukSessionPut(self, local_files, remote_location, **kwargs), timeout)
+
+    def get(self, remote_files, local_location = ".", timeout = None, **kwargs):
+        """Copy remote files from all hosts of the session to a local directory, wait for the transfers termination and return the action.
+
+        Parameters are the same as for `execo.action.TaktukGet`, with
+        a timeout as for `execo.action.TaktukSession.run`.
+        """
+        return self._run(_TaktukSessionGet(self, remote_files, local_location, **kwargs), timeout)
+
+_stream_get_compressions = {
+    None: ("", "", ""),
+    "gzip": ("z", ".gz", "gz"),
+    "bzip2": ("j", ".bz2", "bz2"),
+    "xz": ("J", ".xz", "xz"),
+    }
+# compression -> (tar compression flag, member file extension suffix,
+# tarfile open mode suffix)
+
+class StreamGet(Remote):
+
+    """Stream remote files from several remote hosts into one local archive directory, with ``ssh`` or a similar remote connection tool.
+
+    Instead of copying each remote file to its own local file (as
+    `execo.action.Get` or `execo.action.TaktukGet` do), a ``tar cf -``
+    is run remotely, and its output is streamed, over the remote
+    connection, into a single tar member per host in
+    ``local_location``. The files retrieved can later be accessed by
+    (host, path) without extracting everything, through
+    `execo.action.StreamGetArchive` (see
+    `execo.action.StreamGet.archive`).
+
+    The ssh connection used must be binary clean, so the options
+    ``-t`` / ``-tt`` are removed from the ``ssh_options`` of the
+    connection params.
+    """
+
+    def __init__(self, hosts, remote_files, local_location = ".", compression = None, connection_params = None, **kwargs):
+        """
+        :param hosts: iterable of `execo.host.Host` from which to get
+          the files.
+
+        :param remote_files: an iterable of string of file or
+          directory paths. substitions described in
+          `execo.substitutions.remote_substitute` will be performed.
+
+        :param local_location: the local directory where the per-host
+          archive members will be written. Created if needed.
+          substitions described in
+          `execo.substitutions.remote_substitute` will be performed.
+
+        :param compression: None (default, no compression), or one
+          of ``gzip``, ``bzip2``, ``xz``. Compression is done on the
+          remote hosts.
+
+        :param connection_params: a dict similar to
+          `execo.config.default_connection_params` whose values will
+          override those in default_connection_params for connection.
+        """
+        self.hosts = hosts
+        """Iterable of `execo.host.Host` from which to get the files."""
+        if "name" not in kwargs:
+            kwargs.update({"name": "%s from %i hosts" % (self.__class__.__name__, len(self.hosts))})
+        super(Remote, self).__init__(**kwargs)
+        self.remote_files = remote_files
+        """Iterable of string of file paths. substitions described in
+        `execo.substitutions.remote_substitute` will be performed."""
+        self.local_location = local_location
+        """The local directory where the per-host archive members are
+        written. substitions described in
+        `execo.substitutions.remote_substitute` will be performed."""
+        if compression not in _stream_get_compressions:
+            raise ValueError("unsupported compression %r" % (compression,))
+        self.compression = compression
+        """None, or one of ``gzip``, ``bzip2``, ``xz``"""
+        self.connection_params = connection_params
+        """Dict similar to `execo.config.default_connection_params` whose values
+        will override those in default_connection_params for connection."""
+        self._caller_context = get_caller_context(['get_fileget'])
+        self._init_processes()
+
+    def _args(self):
+        return [ repr(self.hosts),
+                 repr(self.remote_files) ] + Action._args(self) + StreamGet._kwargs(self)
+
+    def _kwargs(self):
+        kwargs = []
+        kwargs.append("local_location=%r" % (self.local_location,))
+        if self.compression: kwargs.append("compression=%r" % (self.compression,))
+        if self.connection_params: kwargs.append("connection_params=%r" % (self.connection_params,))
+        return kwargs
+
+    def _infos(self):
+        infos = []
+        if self.connection_params: infos.append("connection_params=%r" % (self.connection_params,))
+        return infos
+
+    def _init_processes(self):
+        self.processes = []
+        if len(self.remote_files) > 0:
+            tar_flag, member_ext, _ = _stream_get_compressions[self.compression]
+            stream_connection_params = make_connection_params(self.connection_params)
+            stream_connection_params['ssh_options'] = tuple([ opt for opt in stream_connection_params['ssh_options']
+                                                              if opt not in ('-t', '-tt') ])
+            processlh = ActionNotificationProcessLH(self, len(self.hosts))
+            for (index, host) in enumerate(self.hosts):
+                local_location = remote_substitute(self.local_location, self.hosts, index, self._caller_context)
+                remote_cmd = "tar c%sf - %s" % (
+                    tar_flag,
+                    " ".join([ pipes.quote(remote_substitute(path, self.hosts, index, self._caller_context))
+                               for path in self.remote_files ]))
+                member = os.path.join(local_location, "%s.tar%s" % (host.address, member_ext))
+                real_command = (get_ssh_command(host.user, host.keyfile, host.port, stream_connection_params)
+                                + (get_rewritten_host_address(host.address, self.connection_params),
+                                   pipes.quote(remote_cmd)))
+                real_command = ' '.join(real_command) + " > " + pipes.quote(member)
+                p = Process(real_command)
+                p.shell = True
+                p.lifecycle_handlers.append(processlh)
+                p.host = host
+                p.stream_get_member = member
+                self.processes.append(p)
+
+    def start(self):
+        for process in self.processes:
+            member_dir = os.path.dirname(process.stream_get_member)
+            if member_dir and not os.path.isdir(member_dir):
+                os.makedirs(member_dir)
+        return super(StreamGet, self).start()
+
+    def archive(self):
+        """Return a `execo.action.StreamGetArchive` to access the retrieved files.
+
+        Only meaningful if ``local_location`` is the same for all
+        hosts (ie. it does not use substitutions).
+        """
+        return StreamGetArchive(self.local_location, self.compression)
+
+class StreamGetArchive(object):
+
+    """Random access, by (host, path), to the archive directory written by `execo.action.StreamGet`.
+
+    Each host's tar member is indexed on first access to it. The
+    index is saved next to the member (file with suffix ``.index``),
+    so that later accesses (possibly from other processes) don't need
+    to scan the member again. For uncompressed members, the index
+    stores the data offset of each file, allowing direct reads
+    without going through the tar stream.
+    """
+
+    def __init__(self, local_location, compression = None):
+        """
+        :param local_location: the directory written by
+          `execo.action.StreamGet`.
+
+        :param compression: the compression given to
+          `execo.action.StreamGet`.
+        """
+        if compression not in _stream_get_compressions:
+            raise ValueError("unsupported compression %r" % (compression,))
+        self.local_location = local_location
+        self.compression = compression
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def _member(self, host):
+        if isinstance(host, Host):
+            host = host.address
+        return os.path.join(self.local_location, "%s.tar%s" % (host, _stream_get_compressions[self.compression][1]))
+
+    def _tarfile_mode(self):
+        mode_ext = _stream_get_compressions[self.compression][2]
+        if mode_ext:
+            return "r:" + mode_ext
+        return "r:"
+
+    def _get_index(self, host):
+        member = self._member(host)
+        with self._lock:
+            if member in self._indexes:
+                return self._indexes[member]
+            index = None
+            index_filename = member + ".index"
+            if (os.path.isfile(index_filename)
+                and os.stat(index_filename).st_mtime >= os.stat(member).st_mtime):
+                try:
+                    with open(index_filename) as f:
+                        index = json.load(f)
+                except ValueError:
+                    index = None
+            if index == None:
+                index = {}
+                tar = tarfile.open(member, self._tarfile_mode())
+                try:
+                    for tarinfo in tar:
+                        if tarinfo.isfile():
+                            index[tarinfo.name] = (tarinfo.offset_data, tarinfo.size)
+                finally:
+                    tar.close()
+                try:
+                    with open(index_filename, "w") as f:
+                        json.dump(index, f)
+                except EnvironmentError:
+                    pass
+            self._indexes[member] = index
+            return index
+
+    def hosts(self):
+        """Return the list of host addresses for which there is an archive member."""
+        suffix = ".tar" + _stream_get_compressions[self.compression][1]
+        return sorted([ f[:-len(suffix)] for f in os.listdir(self.local_location) if f.endswith(suffix) ])
+
+    def getnames(self, host):
+        """Return the list of the file paths retrieved from a host.
+
+        :param host: `execo.host.Host` or host address.
+        """
+        return sorted(self._get_index(host))
+
+    def read(self, host, path):
+        """Return the content (bytes) of a file retrieved from a host.
+
+        :param host: `execo.host.Host` or host address.
+
+        :param path: path of the file, as stored in the tar member
+          (tar strips the leading ``/`` of absolute paths, so it is
+          also stripped here).
+        """
+        path = path.lstrip("/")
+        index = self._get_index(host)
+        if path not in index:
+            raise KeyError("no such file %s in archive of %s" % (path, host))
+        if self.compression == None:
+            offset, size = index[path]
+            with open(self._member(host), "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+        tar = tarfile.open(self._member(host), self._tarfile_mode())
+        try:
+            return tar.extractfile(path).read()
+        finally:
+            tar.close()
 
 class Local(Action):
 
@@ -1468,6 +2175,9 @@ class ParallelActions(Action):
         for action in self.actions:
             action.lifecycle_handlers = [ lh for lh in action.lifecycle_handlers if not isinstance(lh, ParallelSubActionLH) ]
             action.lifecycle_handlers.append(subactionslh)
+            if self not in action._stats_parents:
+                action._stats_parents.append(self)
+        self._invalidate_stats()
 
     def start(self):
         retval = super(ParallelActions, self).start()
@@ -1503,14 +2213,25 @@ class ParallelActions(Action):
     def processes(self, v):
         pass
 
-    def stats(self):
+    def _compute_stats(self):
         stats = Report.empty_stats()
-        stats['name'] = self.name
         stats['sub_stats'] = [action.stats() for action in self.actions]
-        s = Report.aggregate_stats(stats)
-        if self.hide_subactions:
-            s['sub_stats'] = []
-        return s
+        stats = Report.aggregate_stats(stats)
+        stats['sub_stats'] = []
+        self._stats_max_end_date = None
+        for action in self.actions:
+            if (action._stats_max_end_date != None
+                and (self._stats_max_end_date == None
+                     or action._stats_max_end_date > self._stats_max_end_date)):
+                self._stats_max_end_date = action._stats_max_end_date
+        self._set_stats_end_date(stats)
+        return stats
+
+    def stats(self):
+        stats = super(ParallelActions, self).stats()
+        if not self.hide_subactions:
+            stats['sub_stats'] = [action.stats() for action in self.actions]
+        return stats
 
 class SequentialSubActionLH(ActionLifecycleHandler):
 
@@ -1560,6 +2281,9 @@ class SequentialActions(Action):
         for action in self.actions:
             action.lifecycle_handlers = [ lh for lh in action.lifecycle_handlers if not isinstance(lh, SequentialSubActionLH) ]
             action.lifecycle_handlers.append(subactionslh)
+            if self not in action._stats_parents:
+                action._stats_parents.append(self)
+        self._invalidate_stats()
 
     def start(self):
         retval = super(SequentialActions, self).start()
@@ -1594,14 +2318,25 @@ class SequentialActions(Action):
     def processes(self, v):
         pass
 
-    def stats(self):
+    def _compute_stats(self):
         stats = Report.empty_stats()
-        stats['name'] = self.name
         stats['sub_stats'] = [action.stats() for action in self.actions]
-        s = Report.aggregate_stats(stats)
-        if self.hide_subactions:
-            s['sub_stats'] = []
-        return s
+        stats = Report.aggregate_stats(stats)
+        stats['sub_stats'] = []
+        self._stats_max_end_date = None
+        for action in self.actions:
+            if (action._stats_max_end_date != None
+                and (self._stats_max_end_date == None
+                     or action._stats_max_end_date > self._stats_max_end_date)):
+                self._stats_max_end_date = action._stats_max_end_date
+        self._set_stats_end_date(stats)
+        return stats
+
+    def stats(self):
+        stats = super(SequentialActions, self).stats()
+        if not self.hide_subactions:
+            stats['sub_stats'] = [action.stats() for action in self.actions]
+        return stats
 
 # class _ChainPutActionHostFilteringLH(ActionLifecycleHandler):
 
@@ -1668,6 +2403,32 @@ class _ChainPutCopy(ParallelActions):
 _execo_chainput = os.path.abspath(os.path.join(os.path.dirname(__file__), "execo-chainput"))
 if not os.path.isfile(_execo_chainput): _execo_chainput = None
 
+_chainput_script = None
+_chainput_script_lock = threading.Lock()
+
+def _remove_file(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+def _get_chainput_script():
+    # return the path of an executable copy of execo-chainput, shared
+    # by all ChainPut of this python process: it is created at first
+    # use and removed at exit
+    global _chainput_script
+    with _chainput_script_lock:
+        if _chainput_script == None:
+            if not _execo_chainput:
+                raise EnvironmentError("unable to find execo-chainput")
+            chainscript_handle, chainscript_filename = tempfile.mkstemp(prefix = 'tmp_execo_chainscript_')
+            os.close(chainscript_handle)
+            shutil.copyfile(_execo_chainput, chainscript_filename)
+            os.chmod(chainscript_filename, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+            atexit.register(_remove_file, chainscript_filename)
+            _chainput_script = chainscript_filename
+        return _chainput_script
+
 class ChainPut(SequentialActions):
 
     """Broadcast local files to several remote host, with an unencrypted, unauthenticated chain of host to host copies (idea taken from `kastafior <https://gforge.inria.fr/plugins/scmgit/cgi-bin/gitweb.cgi?p=kadeploy3/kadeploy3.git;a=tree;f=addons/kastafior;h=e5472ce9e800c80d9f54d1097ebbcba77f8ccd7a;hb=3.1.7>`_).
@@ -1691,6 +2452,12 @@ class ChainPut(SequentialActions):
     any data without authentication. Insecure temporary files are
     used. It is thus intended to be used in a secured network
     environment.
+
+    The chain script is copied once per python process. Each ChainPut
+    hard links this shared copy under its own temporary name, so that
+    concurrent ChainPut never overwrite a script which another chain
+    is running, and this name is removed from the local and remote
+    hosts when the last file has been sent.
     """
 
     def __init__(self, hosts, local_files, remote_location = ".", connection_params = None, **kwargs):
@@ -1732,16 +2499,13 @@ class ChainPut(SequentialActions):
             if isinstance(chain_retries, float):
                 chain_retries = int(chain_retries * len(self.hosts))
 
-            chainhosts_handle, chainhosts_filename = tempfile.mkstemp(prefix = 'tmp_execo_chainhosts_')
-            chainhosts = "\n".join([h.address for h in self.hosts]) + "\n"
-            os.write(chainhosts_handle, chainhosts)
-            os.close(chainhosts_handle)
-
+            # the chain hosts file and the link to the shared chain
+            # script are only written when starting, and removed when
+            # terminated or killed
+            chainhosts_filename = tempfile.mktemp(prefix = 'tmp_execo_chainhosts_')
+            self._chainhosts_filename = chainhosts_filename
             chainscript_filename = tempfile.mktemp(prefix = 'tmp_execo_chainscript_')
-            if not _execo_chainput:
-                raise EnvironmentError("unable to find execo-chainput")
-            shutil.copy2(_execo_chainput, chainscript_filename)
-            os.chmod(chainscript_filename, os.stat(chainscript_filename).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH )
+            self._chainscript_filename = chainscript_filename
 
             preparechain = TaktukPut(self.hosts,
                                      [ chainhosts_filename, chainscript_filename ],
@@ -1801,9 +2565,40 @@ class ChainPut(SequentialActions):
 
             self.actions = [ preparechain ] + chains
         else:
+            self._chainhosts_filename = None
+            self._chainscript_filename = None
             self.actions = []
         super(ChainPut, self)._init_actions()
 
+    def _remove_chain_files(self):
+        if self._chainhosts_filename:
+            _remove_file(self._chainhosts_filename)
+        if self._chainscript_filename:
+            _remove_file(self._chainscript_filename)
+
+    def start(self):
+        if self._chainscript_filename:
+            chainscript = _get_chainput_script()
+            try:
+                os.link(chainscript, self._chainscript_filename)
+            except (OSError, AttributeError):
+                shutil.copyfile(chainscript, self._chainscript_filename)
+                shutil.copymode(chainscript, self._chainscript_filename)
+        if self._chainhosts_filename:
+            chainhosts_handle = os.open(self._chainhosts_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IRUSR | stat.S_IWUSR)
+            with os.fdopen(chainhosts_handle, "w") as chainhosts_file:
+                chainhosts_file.write("\n".join([h.address for h in self.hosts]) + "\n")
+        return super(ChainPut, self).start()
+
+    def kill(self):
+        retval = super(ChainPut, self).kill()
+        self._remove_chain_files()
+        return retval
+
+    def _notify_terminated(self):
+        self._remove_chain_files()
+        super(ChainPut, self)._notify_terminated()
+
 class RemoteSerial(Remote):
 
     """Open a serial port on several hosts in parallel through ``ssh`` or a similar remote connection tool.
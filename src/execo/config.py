@@ -148,6 +148,9 @@ def make_default_connection_params():
                          '-o', 'ConnectTimeout=20',
                          '-rp' ),
         'taktuk_options': ( '-s', ),
+        'taktuk_arity': None,
+        'taktuk_window': None,
+        'taktuk_group_func': None,
         'taktuk_connector': 'ssh',
         'taktuk_connector_options': ( '-o', 'BatchMode=yes',
                                       '-o', 'PasswordAuthentication=no',
@@ -188,6 +191,24 @@ default_connection_params = make_default_connection_params()
 
 - ``taktuk_options``: tuple of options passed to taktuk.
 
+- ``taktuk_arity``: maximum arity of the taktuk deployment tree
+  (taktuk option ``-d``, dynamic / work-stealing deployment). If None,
+  it is automatically sized from the number of hosts (see
+  `execo.action.get_taktuk_tree_params`). If False, the option is not
+  passed to taktuk. Ignored if ``-d`` is already in
+  ``taktuk_options``.
+
+- ``taktuk_window``: size of the taktuk deployment window (taktuk
+  option ``-w``, number of connections initiated in parallel by each
+  node). Same semantics as ``taktuk_arity`` for None and False.
+
+- ``taktuk_group_func``: topology hint. Function called on each
+  `execo.host.Host`, returning a group key (for example its cluster,
+  see `execo_g5k.api_utils.get_host_cluster`). Hosts are given to
+  taktuk grouped by key, so that the work-stealing deployment tends
+  to keep subtrees inside a group. If None, hosts are given in their
+  original order.
+
 - ``taktuk_connector``: the ssh-like connector command for taktuk.
 
 - ``taktuk_connector_options``: tuple of options passed to
@@ -102,7 +102,7 @@ class Logger(logging.getLoggerClass()):
 
     # copied from logging, modified to handle cases for custom log levels
     if sys.version_info >= (3,):
-        def findCaller(self, stack_info=False):
+        def findCaller(self, stack_info=False, stacklevel=1):
             """
             Find the stack frame of the caller so that we can note the source
             file name, line number and function name.
@@ -33,9 +33,11 @@ import threading, time, pipes, sys
 
 if sys.version_info >= (3,):
     import codecs, locale
-    _decode = lambda s: codecs.decode(s, locale.getpreferredencoding())
+    _decode = lambda s: codecs.decode(s, locale.getpreferredencoding()) if isinstance(s, bytes) else s
+    _encode = lambda s: codecs.encode(s, locale.getpreferredencoding()) if isinstance(s, str) else s
 else:
     _decode = lambda s: s
+    _encode = lambda s: s
 
 STDOUT = 1
 """Identifier for the stdout stream"""
@@ -67,6 +69,13 @@ class ProcessLifecycleHandler(object):
         """
         pass
 
+    def stats_changed(self, process):
+        """Handle a change of `execo.process.ProcessBase`'s stats not related to its start or end (expect failure, write error).
+
+        :param process: The ProcessBase whose stats changed.
+        """
+        pass
+
 class ProcessOutputHandler(object):
 
     """Abstract handler for `execo.process.ProcessBase` output."""
@@ -95,10 +104,14 @@ class ProcessOutputHandler(object):
             self._buffer[k] = ""
         self._buffer[k] += string
         lines = self._buffer[k].splitlines(True)
-        if len(lines) > 2:
-            for line in lines[:-1]:
+        if len(lines) > 0:
+            # the last line is kept in the buffer if incomplete
+            if lines[-1].endswith("\n") or lines[-1].endswith("\r"):
+                self._buffer[k] = ""
+            else:
+                self._buffer[k] = lines.pop()
+            for line in lines:
                 self.read_line(process, stream, line, False, False)
-            self._buffer[k] = lines[-1]
         if eof or error:
             self.read_line(process, stream, self._buffer[k], eof, error)
             del self._buffer[k]
@@ -810,8 +823,17 @@ class ProcessBase(object):
         self.kill()
         return False
 
+    def _notify_stats_changed(self):
+        for handler in list(self.lifecycle_handlers):
+            try:
+                handler.stats_changed(self)
+            except Exception as e:
+                logger.error("process lifecycle handler %s stats_changed raised exception for process %s:\n%s" % (
+                        handler, self, format_exc()))
+
     def _notify_expect_fail(self, regexes):
         self.expect_fail = True
+        self._notify_stats_changed()
         regexes_dump = []
         for r in singleton_to_collection(regexes):
             if isinstance(r, type(re.compile(''))):
@@ -1303,7 +1325,9 @@ class Process(ProcessBase):
                     non_retrying_intr_cond_wait(self.started_condition)
         logger.iodebug("write to fd %s: %r" % (self.stdin_fd, s))
         try:
-            os.write(self.stdin_fd, s)
+            if self.stdin_fd == None:
+                raise OSError(errno.EBADF, "process standard input not available")
+            os.write(self.stdin_fd, _encode(s))
         except OSError as e:
             s = None
             with self._lock:
@@ -1311,6 +1335,7 @@ class Process(ProcessBase):
                     self.write_error = True
                     s = style.emph("write error:") + " " + e.__class__.__name__ + " " + str(e.args) + self.dump()
             if s != None:
+                self._notify_stats_changed()
                 if self.nolog_write_error:
                     logger.debug(s)
                 else:
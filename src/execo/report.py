@@ -24,6 +24,22 @@ if sys.version_info >= (3,):
 else:
     _BIGNUM = sys.maxint
 
+_stats_counters = [
+    'num_processes',
+    'num_started',
+    'num_ended',
+    'num_errors',
+    'num_timeouts',
+    'num_forced_kills',
+    'num_non_zero_exit_codes',
+    'num_expect_fail',
+    'num_write_error',
+    'num_ok',
+    'num_finished_ok'
+    ]
+# keys of the stats dicts which are counters summed when aggregating
+# stats
+
 #def sort_reports(reports):
 #    reports.sort(key = lambda report: report.stats().get('start_date') or _BIGNUM)
 
@@ -42,6 +58,7 @@ class Report(object):
         self.__name = "%s" % (self.__class__.__name__,)
         self._stats = Report.empty_stats()
         self._stats['name'] = self.__name
+        self._aggregated_stats = None
         if stats_objects:
             self.add(stats_objects)
 
@@ -55,6 +72,7 @@ class Report(object):
     def name(self, value):
         self.__name = value
         self._stats['name'] = self.__name
+        self._aggregated_stats = None
 
     def add(self, stats_objects):
         """Add some sub-`execo.report.Report` or `execo.action.Action` to this report.
@@ -62,6 +80,7 @@ class Report(object):
         :param stats_objects:
         """
         self._stats['sub_stats'].extend([o.stats() for o in stats_objects])
+        self._aggregated_stats = None
 
     @staticmethod
     def empty_stats():
@@ -99,19 +118,7 @@ class Report(object):
                         no_end_date = True
                     elif aggstats[k] == None or substats[k] > aggstats[k]:
                         aggstats[k] = substats[k]
-                elif k in [
-                    'num_processes',
-                    'num_started',
-                    'num_ended',
-                    'num_errors',
-                    'num_timeouts',
-                    'num_forced_kills',
-                    'num_non_zero_exit_codes',
-                    'num_expect_fail',
-                    'num_write_error',
-                    'num_ok',
-                    'num_finished_ok'
-                    ]:
+                elif k in _stats_counters:
                     aggstats[k] += substats[k]
         if no_end_date:
             aggstats['end_date'] = None
@@ -170,7 +177,12 @@ class Report(object):
         - ``num_finished_ok``: number of processes which started,
           ended, and are ok.
         """
-        return Report.aggregate_stats(self._stats)
+        # the stats of the registered objects are snapshots taken
+        # when added, so the aggregation is computed once and cached
+        # until the next add()
+        if self._aggregated_stats == None:
+            self._aggregated_stats = Report.aggregate_stats(self._stats)
+        return self._aggregated_stats.copy()
 
     def __repr__(self):
         return "<Report(<%i entries>, name=%r)>" % (len(self._stats['sub_stats']), self._stats['name'])
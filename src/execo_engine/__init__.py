@@ -19,5 +19,9 @@
 
 from .log import logger
 from .engine import Engine
+from .results import ResultStore
+from .timeseries import TimeSeriesStore, MetricsCollector, RemoteProcSource
 from .utils import slugify, redirect_outputs, copy_outputs
-from .sweep import HashableDict, sweep, ParamSweeper, geom, igeom, sweep_stats
+from .sweep import HashableDict, Combination, sweep, isweep, LazySweep, ParamSweeper, geom, igeom, sweep_stats, \
+    random_sweep, latin_hypercube_sweep, quasi_random_sweep, fractional_factorial_sweep, \
+    SuccessiveHalving, ParamSweeperCoordinator
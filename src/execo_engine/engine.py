@@ -17,12 +17,48 @@
 # along with Execo.  If not, see <http://www.gnu.org/licenses/>
 
 from .log import logger
-import os, sys, time, inspect, pipes
-from .utils import redirect_outputs, copy_outputs
+import os, sys, time, inspect, pipes, signal, traceback, multiprocessing, multiprocessing.pool
+if sys.version_info >= (3,):
+    import queue, pickle
+else:
+    import Queue as queue
+    import cPickle as pickle
+from .utils import redirect_outputs, copy_outputs, slugify
+from .sweep import ParamSweeperCoordinator
+from .results import ResultStore
+from .timeseries import TimeSeriesStore, MetricsCollector
 from argparse import ArgumentParser
 
 _engineargs = sys.argv[1:]
 
+def _ignore_sigint():
+    # initializer of the worker processes of Engine.run_sweep: only
+    # the engine process handles SIGINT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _timed_call(func, combination):
+    # run func on a combination in a worker of Engine.run_sweep.
+    # Return the tuple (combination, result, start time, duration,
+    # None or the formatted exception)
+    start = time.time()
+    result = None
+    try:
+        result = func(combination)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return (combination, result, start, time.time() - start, error)
+
+def _pool_error_callback(results, combination):
+    # return the error callback of a pool task of Engine.run_sweep,
+    # called when the task or its result can not be transferred to or
+    # from the worker (for example because it can not be pickled), in
+    # which case _timed_call does not return
+    def error_callback(exception):
+        results.put((combination, None, time.time(), 0.0,
+                     "".join(traceback.format_exception_only(type(exception), exception))))
+    return error_callback
+
 def run_meth_on_engine_ancestors(instance, method_name):
     engine_ancestors = [ cls for cls in inspect.getmro(instance.__class__) if issubclass(cls, Engine) ]
     for cls in engine_ancestors:
@@ -95,6 +131,46 @@ class Engine(object):
          sweeper = ParamSweeper(sweeps, os.path.join(self.result_dir, "sweeps"))
          [...]
 
+    `execo_engine.engine.Engine.run_sweep` runs a function on all the
+    elements of a ParamSweeper, in parallel::
+
+     def run(self):
+         sweeper = ParamSweeper(os.path.join(self.result_dir, "sweeps"), sweep({...}))
+         self.run_sweep(sweeper, self.experiment, workers = 8)
+
+    `execo_engine.engine.Engine.open_result_store` opens a
+    `execo_engine.results.ResultStore` in the results directory, where
+    run_sweep can store the values returned by the function.
+
+    When continuing an experiment (option ``-c``), expensive setups
+    (jobs reservations, deployments) can be reused instead of redone,
+    with `execo_engine.engine.Engine.checkpoint`::
+
+     def run(self):
+         jobs = self.checkpoint(
+             "jobs", lambda: oarsub([...]),
+             check = lambda jobs: all([ get_oar_job_info(*job).get("state") == "Running"
+                                        for job in jobs ]))
+         [...]
+
+    Metrics (Grid'5000 metrology, remote ``/proc`` sampling) can be
+    collected in background during the experiment, into a
+    `execo_engine.timeseries.TimeSeriesStore` in the results
+    directory, with
+    `execo_engine.engine.Engine.start_metrics_collector`::
+
+     def run(self):
+         self.start_metrics_collector({
+             "power": HostsMetricSource(hosts, "power"),
+             "proc": RemoteProcSource(hosts) })
+         [...]
+
+    If the experiment runs processes on hosts which do not share the
+    results directory, the engine can serve the ParamSweeper states
+    with `execo_engine.engine.Engine.start_sweeper_coordinator`, the
+    remote processes instanciating their ParamSweeper with the
+    address of the coordinator.
+
     """
 
     def _create_result_dir(self):
@@ -149,6 +225,9 @@ class Engine(object):
         any file pertaining to a particular execution of the
         experiment should be located.
         """
+        self.__coordinators = []
+        self.__result_stores = []
+        self.__metrics_collectors = []
 
     def start(self, engineargs = _engineargs):
         """Start the engine.
@@ -203,7 +282,299 @@ class Engine(object):
         logger.info("command line arguments: %s" % (sys.argv,))
         logger.info("command line: " + " ".join([pipes.quote(arg) for arg in sys.argv]))
         logger.info("run in directory %s", self.result_dir)
-        run_meth_on_engine_ancestors(self, "run")
+        try:
+            run_meth_on_engine_ancestors(self, "run")
+        finally:
+            for metrics_collector in self.__metrics_collectors:
+                metrics_collector.stop()
+            for result_store in self.__result_stores:
+                result_store.close()
+            for coordinator in self.__coordinators:
+                coordinator.stop()
+
+    def run_sweep(self, sweeper, func, workers = 1, mode = "thread", batch_size = None,
+                  timings_file = "sweep_timings", result_store = None):
+        """Run a function on all the remaining elements of a `execo_engine.sweep.ParamSweeper`, with a pool of workers.
+
+        Elements are claimed by batches with
+        `execo_engine.sweep.ParamSweeper.get_next_batch`, as workers
+        become available, and are marked *done* when the function
+        returns, or *skipped* if it raises an exception (which is
+        logged). Returns when there are no more remaining elements.
+
+        On SIGINT (KeyboardInterrupt), the claimed elements not yet
+        started are canceled, and the running ones are waited for,
+        then KeyboardInterrupt is raised again. On a second SIGINT,
+        the workers are terminated (only possible with processes) and
+        the running elements are canceled.
+
+        :param sweeper: the `execo_engine.sweep.ParamSweeper`
+
+        :param func: function taking an element as argument. With
+          processes, it must be picklable (a module level function or
+          a method of a picklable object, thus usually not a method of
+          the engine, which holds the sweeper), else ValueError is
+          raised.
+
+        :param workers: number of elements processed in parallel.
+
+        :param mode: ``"thread"`` (default) to run func in threads of
+          the engine process, or ``"process"`` to run it in worker
+          processes.
+
+        :param batch_size: number of elements claimed at once. If
+          None (default), the number of workers.
+
+        :param timings_file: name of the file, in the result
+          directory, where a line is appended for each element:
+          element (slugified), state (``done`` or ``skipped``), start
+          timestamp, duration in seconds, separated by tabs. If None,
+          timings are not recorded.
+
+        :param result_store: if not None, a
+          `execo_engine.results.ResultStore` where the values returned
+          by func are appended. Elements are then marked *done* when
+          their result is written by the store.
+        """
+        if mode == "thread":
+            pool = multiprocessing.pool.ThreadPool(workers)
+        elif mode == "process":
+            try:
+                pickle.dumps(func, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                raise ValueError("run_sweep: %r must be picklable with processes: %s" % (func, e))
+            pool = multiprocessing.Pool(workers, _ignore_sigint)
+        else:
+            raise ValueError("unknown run_sweep mode %r" % (mode,))
+        if batch_size == None:
+            batch_size = workers
+        timings = None
+        if timings_file != None:
+            timings = open(os.path.join(self.result_dir, timings_file), "a")
+        results = queue.Queue()
+        claimed = []
+        # claimed elements not yet submitted to the pool
+        running = set()
+        submitted = dict()
+        # with python 2, which has no pool error callbacks, associates
+        # running elements to their AsyncResult
+        stopping = False
+        try:
+            while True:
+                try:
+                    while not stopping and len(running) < workers:
+                        if len(claimed) == 0:
+                            claimed = sweeper.get_next_batch(batch_size)
+                            if len(claimed) == 0:
+                                break
+                        combination = claimed.pop(0)
+                        running.add(combination)
+                        if sys.version_info >= (3,):
+                            pool.apply_async(_timed_call, (func, combination), callback = results.put,
+                                             error_callback = _pool_error_callback(results, combination))
+                        else:
+                            submitted[combination] = pool.apply_async(_timed_call, (func, combination),
+                                                                      callback = results.put)
+                    if len(running) == 0:
+                        break
+                    try:
+                        # timeout so that KeyboardInterrupt is raised
+                        # with python 2
+                        (combination, result, start, duration, error) = results.get(True, 1)
+                    except queue.Empty:
+                        for (c, async_result) in list(submitted.items()):
+                            if async_result.ready() and not async_result.successful():
+                                del submitted[c]
+                                try:
+                                    async_result.get()
+                                except Exception as e:
+                                    _pool_error_callback(results, c)(e)
+                        continue
+                    running.discard(combination)
+                    submitted.pop(combination, None)
+                    if error == None:
+                        if result_store:
+                            result_store.append(combination, result, sweeper)
+                        else:
+                            sweeper.done(combination)
+                        state = "done"
+                    else:
+                        logger.error("%s failed, skipped:\n%s", combination, error)
+                        sweeper.skip(combination)
+                        state = "skipped"
+                    if timings:
+                        timings.write("%s\t%s\t%.3f\t%.3f\n" % (slugify(combination), state, start, duration))
+                        timings.flush()
+                except KeyboardInterrupt:
+                    if stopping:
+                        raise
+                    stopping = True
+                    logger.warning("interrupted, waiting for %i running elements (interrupt again to terminate them)",
+                                   len(running))
+                    sweeper.cancel_batch(claimed)
+                    claimed = []
+            if stopping:
+                raise KeyboardInterrupt
+        except:
+            pool.terminate()
+            if len(claimed) + len(running) > 0:
+                sweeper.cancel_batch(claimed + list(running))
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+            if timings:
+                timings.close()
+            if result_store:
+                result_store.flush()
+
+    def __checkpoint_filename(self, name):
+        return os.path.join(self.result_dir, "checkpoints", slugify(name))
+
+    def checkpoint(self, name, setup, check = None, dumps = None, loads = None):
+        """Return a resource checkpointed by a previous run in the same results directory, if still valid, else set it up and checkpoint it.
+
+        Resources are anything which is costly to set up (for
+        example reserved jobs, deployed hosts), and which a restarted
+        engine (continuing an experiment with option ``-c``) can
+        reattach to instead of setting them up again.
+
+        :param name: name of the resource. Its checkpoint is saved in
+          the directory ``checkpoints`` of the results directory.
+
+        :param setup: function without arguments, which sets up and
+          returns the resource. Called if there is no valid
+          checkpoint.
+
+        :param check: if not None, function taking the checkpointed
+          resource, and returning whether it is still valid (for
+          example whether the jobs are still running, or the hosts
+          still deployed).
+
+        :param dumps: if not None, function serializing the resource
+          to bytes. Default: pickle.
+
+        :param loads: if not None, function deserializing the resource
+          from bytes. Default: pickle.
+        """
+        filename = self.__checkpoint_filename(name)
+        if os.path.exists(filename):
+            try:
+                with open(filename, "rb") as f:
+                    data = f.read()
+                if loads:
+                    resource = loads(data)
+                else:
+                    resource = pickle.loads(data)
+            except Exception as e:
+                logger.warning("checkpoint %s: unable to load %s: %s", name, filename, e)
+            else:
+                if check == None or check(resource):
+                    logger.info("checkpoint %s: reattached", name)
+                    return resource
+                logger.info("checkpoint %s: not valid anymore", name)
+        resource = setup()
+        self.save_checkpoint(name, resource, dumps)
+        return resource
+
+    def save_checkpoint(self, name, resource, dumps = None):
+        """Save (or replace) the checkpoint of a resource.
+
+        Use it when a checkpointed resource changes. Arguments are as
+        for `execo_engine.engine.Engine.checkpoint`.
+        """
+        filename = self.__checkpoint_filename(name)
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except os.error:
+            pass
+        if dumps:
+            data = dumps(resource)
+        else:
+            data = pickle.dumps(resource, 2)
+        with open(filename + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(filename + ".tmp", filename)
+        logger.debug("checkpoint %s: saved to %s", name, filename)
+
+    def drop_checkpoint(self, name):
+        """Remove the checkpoint of a resource (for example after releasing it)."""
+        try:
+            os.remove(self.__checkpoint_filename(name))
+        except os.error:
+            pass
+
+    def open_result_store(self, name = "results", flush_interval = 10, chunk_size = 1000):
+        """Open and return a `execo_engine.results.ResultStore` in the results directory.
+
+        It is closed (its buffered results being written) at the end
+        of `execo_engine.engine.Engine.run`. If the experiment is
+        continued in the same results directory (option ``-c``), the
+        store contains the results of the previous runs.
+
+        :param name: name of the store directory, in the results
+          directory.
+
+        :param flush_interval: see `execo_engine.results.ResultStore`
+
+        :param chunk_size: see `execo_engine.results.ResultStore`
+        """
+        result_store = ResultStore(os.path.join(self.result_dir, name), flush_interval, chunk_size)
+        self.__result_stores.append(result_store)
+        return result_store
+
+    def start_metrics_collector(self, sources, name = "metrics", interval = 60, tiers = None, max_lag = None):
+        """Start and return a `execo_engine.timeseries.MetricsCollector` storing metrics in the results directory.
+
+        It collects metrics in background until the end of
+        `execo_engine.engine.Engine.run`. If the experiment is
+        continued in the same results directory (option ``-c``),
+        collection resumes from the watermarks of the previous run.
+
+        :param sources: see `execo_engine.timeseries.MetricsCollector`
+
+        :param name: name of the `execo_engine.timeseries.TimeSeriesStore`
+          directory, in the results directory.
+
+        :param interval: see `execo_engine.timeseries.MetricsCollector`
+
+        :param tiers: see `execo_engine.timeseries.TimeSeriesStore`. If
+          None, default tiers.
+
+        :param max_lag: see `execo_engine.timeseries.MetricsCollector`
+        """
+        directory = os.path.join(self.result_dir, name)
+        if tiers:
+            store = TimeSeriesStore(directory, tiers)
+        else:
+            store = TimeSeriesStore(directory)
+        metrics_collector = MetricsCollector(store, sources, interval, max_lag)
+        metrics_collector.start()
+        self.__metrics_collectors.append(metrics_collector)
+        return metrics_collector
+
+    def start_sweeper_coordinator(self, persistence_dir, address = ("localhost", 0), authkey = None, storage = None):
+        """Start and return a `execo_engine.sweep.ParamSweeperCoordinator`.
+
+        It serves the states of the
+        `execo_engine.utils.ParamSweeper` instances given its address
+        (`execo_engine.sweep.ParamSweeperCoordinator.address`), until
+        the end of `execo_engine.engine.Engine.run`. Arguments are
+        those of the `execo_engine.sweep.ParamSweeperCoordinator`
+        constructor: unless authkey is given, a coordinator listening
+        on a non loopback interface writes its generated
+        authentication key to the file ``authkey`` of
+        persistence_dir. Typically called from
+        `execo_engine.engine.Engine.run`, with a persistence directory
+        in the results directory.
+        """
+        coordinator = ParamSweeperCoordinator(persistence_dir, address, authkey, storage).start()
+        self.__coordinators.append(coordinator)
+        logger.info("sweeper coordinator listening on %s", coordinator.address)
+        return coordinator
 
     # ------------------------------------------------------------------
     #
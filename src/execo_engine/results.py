@@ -0,0 +1,372 @@
+# Copyright 2009-2016 INRIA Rhone-Alpes, Service Experimentation et
+# Developpement
+#
+# This file is part of Execo.
+#
+# Execo is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Execo is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Execo.  If not, see <http://www.gnu.org/licenses/>
+
+import threading, os, sys, socket, time, glob
+if sys.version_info >= (3,):
+    import pickle
+else:
+    import cPickle as pickle
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from .log import logger
+from .sweep import Combination
+
+_chunk_pattern = "chunk-*"
+# chunk files are named chunk-<timestamp>-<host>-<pid>-<number>.<npz
+# or pickle>, so that sorting their names sorts them by creation time
+
+_array_types = (bool, int, float, str)
+if sys.version_info < (3,):
+    _array_types += (long, unicode)
+# types of values which can be stored in numpy arrays and loaded back
+# unchanged
+
+def _to_array(column):
+    # return column as a numpy array, or None if its values are not
+    # all of the same type of _array_types, or if it would need the
+    # object dtype (which npz files can only store pickled)
+    types = set([ type(value) for value in column ])
+    if len(types) != 1 or types.pop() not in _array_types:
+        return None
+    try:
+        array = numpy.asarray(column)
+    except Exception:
+        return None
+    if array.dtype.hasobject or array.ndim != 1:
+        return None
+    return array
+
+def _concatenate_columns(chunks):
+    # concatenate the dicts of columns of a list of chunks (tuples
+    # (number of rows, dict of columns)), absent columns being filled
+    # with None. Columns whose parts are all numpy arrays of the same
+    # kind are concatenated as numpy arrays, others as lists
+    keys = set()
+    for (num_rows, columns) in chunks:
+        keys.update(columns)
+    concatenated = dict()
+    for key in keys:
+        parts = [ columns.get(key, [ None ] * num_rows) for (num_rows, columns) in chunks ]
+        if numpy and len(parts) > 0:
+            kinds = set([ part.dtype.kind if isinstance(part, numpy.ndarray) else None
+                          for part in parts ])
+            if len(kinds) == 1 and None not in kinds:
+                concatenated[key] = numpy.concatenate(parts)
+                continue
+        column = []
+        for part in parts:
+            column.extend(part.tolist() if numpy and isinstance(part, numpy.ndarray) else part)
+        concatenated[key] = column
+    return concatenated
+
+def _column_codes(column):
+    # return a numpy array of integers, equal for equal values of column
+    if isinstance(column, numpy.ndarray):
+        return numpy.unique(column, return_inverse = True)[1].reshape(-1)
+    codes = dict()
+    return numpy.array([ codes.setdefault(value, len(codes)) for value in column ], dtype = int)
+
+def _last_rows(columns, num_rows):
+    # return the sorted indexes of the last occurrence of each
+    # distinct row of the given columns
+    if num_rows == 0:
+        return []
+    if len(columns) == 0:
+        return [ num_rows - 1 ]
+    if numpy:
+        codes = numpy.column_stack([ _column_codes(column) for column in columns ])
+        inverse = numpy.unique(codes, axis = 0, return_inverse = True)[1].reshape(-1)
+        first_reversed = numpy.unique(inverse[::-1], return_index = True)[1]
+        return numpy.sort(num_rows - 1 - first_reversed)
+    last = dict()
+    for (i, row) in enumerate(zip(*columns)):
+        last[row] = i
+    return sorted(last.values())
+
+def _select_rows(columns, rows):
+    # return the given rows of a dict of columns, without the columns
+    # whose values are all missing in these rows
+    selected = dict()
+    for (key, column) in columns.items():
+        if isinstance(column, list):
+            column = [ column[i] for i in rows ]
+            if all([ value is None for value in column ]):
+                continue
+        else:
+            column = column[rows]
+        selected[key] = column
+    return selected
+
+def _to_lists(columns):
+    # return a dict of columns as lists
+    return dict([ (key, column if isinstance(column, list) else column.tolist())
+                  for (key, column) in columns.items() ])
+
+class ResultStore(object):
+
+    """Persistent, append only, store of the results of the combinations of a sweep.
+
+    Results of combinations are appended with
+    `execo_engine.results.ResultStore.append`, and buffered in
+    memory. A background thread periodically writes the buffered
+    results to a new chunk file in the store directory. Chunks are
+    columnar: one column per factor of the combinations and one
+    column per result field. If numpy is available and all columns
+    of a chunk can be stored as plain numpy arrays, chunks are npz
+    files, else they are pickled dicts of lists.
+
+    Chunks are written to a temporary file, then atomically renamed,
+    so that a chunk is either fully present or absent. If a
+    `execo_engine.sweep.ParamSweeper` is given when appending a
+    result, the combination is marked *done* only after its chunk
+    has been written: if the process crashes in between, the
+    combination is still *inprogress* (or *todo* after its lease
+    expires) and its result is not lost. A combination whose result
+    is appended several times (for example because it was marked
+    *done* by a crashed process after its result was written) has
+    its last result loaded.
+
+    ResultStores are thread-safe. Several processes, on the same or
+    on different hosts, can share a store directory, each one with
+    its own ResultStore instance, since each instance writes its own
+    chunk files.
+
+    Usage::
+
+      store = ResultStore(os.path.join(self.result_dir, "results"))
+      combination = sweeper.get_next()
+      store.append(combination, { "bw": bandwidth, "rtt": rtt }, sweeper)
+      [...]
+      store.close()
+      # later, for analysis:
+      results = ResultStore(result_dir + "/results").load()
+      plot(results["num_flows"], results["bw"])
+    """
+
+    def __init__(self, directory, flush_interval = 10, chunk_size = 1000):
+        """
+        :param directory: the directory of the store, created if
+          needed.
+
+        :param flush_interval: maximum delay in seconds before
+          buffered results are written.
+
+        :param chunk_size: buffered results are written as soon as
+          there are chunk_size of them.
+        """
+        self.__directory = directory
+        try:
+            os.makedirs(self.__directory)
+        except os.error:
+            pass
+        self.__flush_interval = flush_interval
+        self.__chunk_size = chunk_size
+        self.__lock = threading.Lock()
+        # protects the buffers
+        self.__flush_lock = threading.Lock()
+        # serializes chunk writes
+        self.__condition = threading.Condition(self.__lock)
+        self.__buffer = []
+        # list of tuples (combination, result dict, sweeper or None)
+        self.__num_chunks = 0
+        self.__closed = False
+        self.__flusher = threading.Thread(target = self.__flush_loop,
+                                          name = "%s flusher" % (self,))
+        self.__flusher.daemon = True
+        self.__flusher.start()
+
+    def __str__(self):
+        return "<ResultStore %s>" % (self.__directory,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, traceback):
+        self.close()
+        return False
+
+    def append(self, combination, result, sweeper = None):
+        """Append the result of a combination.
+
+        :param combination: the combination (a dict or
+          `execo_engine.sweep.Combination`).
+
+        :param result: a dict of result fields (whose names must
+          differ from the factors of the combination), or any other
+          value, which is then the result field ``result``.
+
+        :param sweeper: if not None, a
+          `execo_engine.sweep.ParamSweeper` on which the combination
+          is marked *done* once its result is written.
+        """
+        if not isinstance(result, dict):
+            result = { "result": result }
+        for key in result:
+            if key in combination:
+                raise ValueError("result field %r is also a factor of %s" % (key, combination))
+        with self.__lock:
+            if self.__closed:
+                raise ValueError("%s is closed" % (self,))
+            self.__buffer.append((combination, result, sweeper))
+            if len(self.__buffer) >= self.__chunk_size:
+                self.__condition.notify()
+
+    def flush(self):
+        """Write the buffered results now, and mark their combinations *done*."""
+        with self.__flush_lock:
+            with self.__lock:
+                buffered = self.__buffer
+                self.__buffer = []
+            if len(buffered) == 0:
+                return
+            try:
+                self.__write_chunk(buffered)
+            except:
+                with self.__lock:
+                    self.__buffer = buffered + self.__buffer
+                raise
+        sweepers = dict()
+        for (combination, result, sweeper) in buffered:
+            if sweeper != None:
+                sweepers.setdefault(id(sweeper), (sweeper, []))[1].append(combination)
+        for (sweeper, combinations) in sweepers.values():
+            sweeper.done_batch(combinations)
+
+    def close(self):
+        """Write the buffered results and stop the background thread."""
+        with self.__lock:
+            self.__closed = True
+            self.__condition.notify()
+        self.__flusher.join()
+        self.flush()
+
+    def __flush_loop(self):
+        while True:
+            with self.__lock:
+                if not self.__closed and len(self.__buffer) < self.__chunk_size:
+                    self.__condition.wait(self.__flush_interval)
+                if self.__closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("%s: error writing results: %s", self, e)
+
+    def __write_chunk(self, buffered):
+        factors = dict()
+        results = dict()
+        for (columns, index) in ((factors, 0), (results, 1)):
+            keys = set()
+            for row in buffered:
+                keys.update(row[index])
+            for key in keys:
+                columns[key] = [ row[index].get(key) for row in buffered ]
+        self.__num_chunks += 1
+        basename = "chunk-%017.6f-%s-%i-%i" % (time.time(), socket.gethostname(), os.getpid(), self.__num_chunks)
+        arrays = None
+        if numpy:
+            arrays = dict()
+            for (prefix, columns) in (("f:", factors), ("r:", results)):
+                for (key, column) in columns.items():
+                    array = _to_array(column)
+                    if array is None or not isinstance(key, str):
+                        arrays = None
+                        break
+                    arrays[prefix + key] = array
+                if arrays == None:
+                    break
+        tmp_filename = os.path.join(self.__directory, "." + basename)
+        with open(tmp_filename, "wb") as f:
+            if arrays != None:
+                filename = os.path.join(self.__directory, basename + ".npz")
+                numpy.savez(f, **arrays)
+            else:
+                filename = os.path.join(self.__directory, basename + ".pickle")
+                pickle.dump((factors, results), f, 2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_filename, filename)
+        logger.trace("%s: %i results written to %s", self, len(buffered), filename)
+
+    def __load_columns(self):
+        # return (number of rows, factors, results) of all rows of all
+        # chunks, keeping only the last result of each combination,
+        # factors and results being dicts of columns
+        chunks = []
+        for filename in sorted(glob.glob(os.path.join(self.__directory, _chunk_pattern))):
+            if filename.endswith(".npz"):
+                if not numpy:
+                    raise ValueError("numpy is needed to load %s" % (filename,))
+                factors = dict()
+                results = dict()
+                with numpy.load(filename) as npz:
+                    for name in npz.files:
+                        if name.startswith("f:"):
+                            factors[name[2:]] = npz[name]
+                        else:
+                            results[name[2:]] = npz[name]
+            else:
+                with open(filename, "rb") as f:
+                    (factors, results) = pickle.load(f)
+            num_rows = len(next(iter(factors.values()), next(iter(results.values()), [])))
+            chunks.append((num_rows, factors, results))
+        factors = _concatenate_columns([ (num_rows, factors) for (num_rows, factors, results) in chunks ])
+        results = _concatenate_columns([ (num_rows, results) for (num_rows, factors, results) in chunks ])
+        rows = _last_rows(list(factors.values()), sum([ num_rows for (num_rows, factors, results) in chunks ]))
+        return (len(rows), _select_rows(factors, rows), _select_rows(results, rows))
+
+    def get_results(self):
+        """Return a dict associating combinations (as `execo_engine.sweep.Combination`) to their result dict."""
+        (num_rows, factors, results) = self.__load_columns()
+        factors = _to_lists(factors)
+        results = _to_lists(results)
+        rows = dict()
+        for i in range(0, num_rows):
+            combination = Combination([ (key, column[i]) for (key, column) in factors.items()
+                                        if column[i] != None ])
+            rows[combination] = dict([ (key, column[i]) for (key, column) in results.items()
+                                       if column[i] != None ])
+        return rows
+
+    def load(self, arrays = True):
+        """Return the results, as a dict associating factors and result fields to columns.
+
+        The i-th element of each column is the level of a factor, or
+        the value of a result field, for the i-th result. Missing
+        values (factors absent from a combination, or fields absent
+        from a result) are None.
+
+        :param arrays: if True (default) and numpy is available,
+          columns are numpy arrays (with the object dtype if their
+          values have different types, or are missing), else they are
+          lists.
+        """
+        (num_rows, factors, results) = self.__load_columns()
+        columns = dict(factors)
+        columns.update(results)
+        if not (arrays and numpy):
+            return _to_lists(columns)
+        for (key, column) in columns.items():
+            if isinstance(column, list):
+                array = _to_array(column)
+                if array is None:
+                    array = numpy.array(column, dtype = object)
+                columns[key] = array
+        return columns
@@ -16,12 +16,21 @@
 # You should have received a copy of the GNU General Public License
 # along with Execo.  If not, see <http://www.gnu.org/licenses/>
 
-import threading, os, fcntl, math, sys
+import threading, os, fcntl, math, sys, random, hashlib, sqlite3, heapq, socket, time, weakref, itertools
+import multiprocessing.connection
 import pickle as pickle
 if sys.version_info >= (3,):
     import pickle
 else:
     import cPickle as pickle
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+try:
+    from collections import Counter
+except ImportError:
+    Counter = None
 from .log import logger
 
 def geom(range_min, range_max, num_steps):
@@ -43,7 +52,13 @@ def igeom(range_min, range_max, num_steps):
 
 class HashableDict(dict):
 
-    """Hashable dictionnary. Beware: must not mutate it after its first use as a key."""
+    """Hashable dictionnary. Beware: must not mutate it after its first use as a key.
+
+    This is the type of the combinations returned by
+    `execo_engine.sweep.sweep` and the other functions returning
+    lists of combinations. Being a dict, it can be serialized (for
+    example with json) as such.
+    """
 
     def __key(self):
         return tuple((k,self[k]) for k in sorted(self))
@@ -51,6 +66,121 @@ class HashableDict(dict):
     def __hash__(self):
         return hash(self.__key())
 
+_combination_schemas = dict()
+# interned combination schemas: associates a tuple of keys to the
+# tuple (keys, dict of key positions, key positions in sorted keys
+# order), shared by all combinations having these keys
+
+def _get_combination_schema(keys):
+    schema = _combination_schemas.get(keys)
+    if schema == None:
+        positions = dict([ (key, i) for (i, key) in enumerate(keys) ])
+        schema = _combination_schemas.setdefault(
+            keys, (keys, positions, tuple([ positions[key] for key in sorted(keys) ])))
+    return schema
+
+class Combination(object):
+
+    """Immutable and hashable mapping of factors to levels.
+
+    This is the type of the combinations generated by
+    `execo_engine.sweep.isweep`. It is a read-only
+    ``collections.abc.Mapping`` (``combination[key]``, ``in``,
+    ``len()``, iteration, ``keys()``, ``values()``, ``items()``,
+    ``get()``), but not a dict: ``copy()`` (or ``dict(combination)``)
+    returns a dict, for example to serialize it with json.
+
+    Its memory footprint is much lower than a dict's: it only stores
+    the tuple of levels, the tuple of factors and the key positions
+    being shared by all combinations with the same factors. Its hash
+    is computed once. It compares equal, and has the same hash, as a
+    `execo_engine.sweep.HashableDict` with the same content, so both
+    can be mixed in sets or as dict keys (for example with states
+    persisted by previous versions of `execo_engine.sweep.ParamSweeper`).
+    """
+
+    __slots__ = ("__schema", "__values", "__hash")
+
+    def __init__(self, *args, **kwargs):
+        """Same arguments as the dict constructor."""
+        d = dict(*args, **kwargs)
+        self.__schema = _get_combination_schema(tuple(d))
+        self.__values = tuple(d.values())
+        self.__hash = None
+
+    @classmethod
+    def _make(cls, keys, values):
+        # fast constructor from a tuple of keys and a tuple of values
+        combination = cls.__new__(cls)
+        combination.__schema = _get_combination_schema(keys)
+        combination.__values = values
+        combination.__hash = None
+        return combination
+
+    def __reduce__(self):
+        return (Combination, (list(self.items()),))
+
+    def __getitem__(self, key):
+        return self.__values[self.__schema[1][key]]
+
+    def get(self, key, default = None):
+        position = self.__schema[1].get(key)
+        if position == None:
+            return default
+        return self.__values[position]
+
+    def __contains__(self, key):
+        return key in self.__schema[1]
+
+    def __iter__(self):
+        return iter(self.__schema[0])
+
+    def __len__(self):
+        return len(self.__values)
+
+    def keys(self):
+        return list(self.__schema[0])
+
+    def values(self):
+        return list(self.__values)
+
+    def items(self):
+        return list(zip(self.__schema[0], self.__values))
+
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return "{%s}" % (", ".join([ "%r: %r" % item for item in zip(self.__schema[0], self.__values) ]),)
+
+    def __hash__(self):
+        if self.__hash == None:
+            self.__hash = hash(tuple([ (self.__schema[0][i], self.__values[i]) for i in self.__schema[2] ]))
+        return self.__hash
+
+    def __eq__(self, other):
+        if isinstance(other, Combination):
+            if self.__schema is other.__schema:
+                return self.__values == other.__values
+            if hash(self) != hash(other):
+                return False
+        elif not isinstance(other, dict):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        for (key, value) in zip(self.__schema[0], self.__values):
+            if key not in other or other[key] != value:
+                return False
+        return True
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+Mapping.register(Combination)
+
 def sweep(parameters):
 
     """Generates all combinations of parameters.
@@ -78,9 +208,12 @@ def sweep(parameters):
     levels of a given factor.
 
     The returned list contains `execo_engine.sweep.HashableDict`
-    instead of dict, which is a simple subclass of dict, so that
-    parameters combinations can be used as dict keys (but don't modify
-    them in such cases)
+    instead of dict, so that parameters combinations can be used as
+    dict keys.
+
+    For huge sweeps, use `execo_engine.sweep.isweep`, which does not
+    materialize the combinations, and generates the more compact
+    `execo_engine.sweep.Combination`.
 
     Examples:
 
@@ -105,48 +238,1225 @@ def sweep(parameters):
     [{'param 1 2': 0.0, 'param 1 1': 'x', 'param 1': 'a', 'param 2': 1}, {'param 1 2': 0.0, 'param 1 1': 'y', 'param 1': 'a', 'param 2': 1}, {'param 1 2': 1.0, 'param 1 1': 'x', 'param 1': 'a', 'param 2': 1}, {'param 1 2': 1.0, 'param 1 1': 'y', 'param 1': 'a', 'param 2': 1}, {'param 2 1': -10, 'param 1': 'a', 'param 2': 2}, {'param 2 1': 10, 'param 1': 'a', 'param 2': 2}, {'param 1 2': 0.0, 'param 1 1': 'x', 'param 1': 'b', 'param 2': 1}, {'param 1 2': 0.0, 'param 1 1': 'y', 'param 1': 'b', 'param 2': 1}, {'param 1 2': 1.0, 'param 1 1': 'x', 'param 1': 'b', 'param 2': 1}, {'param 1 2': 1.0, 'param 1 1': 'y', 'param 1': 'b', 'param 2': 1}, {'param 2 1': -10, 'param 1': 'b', 'param 2': 2}, {'param 2 1': 10, 'param 1': 'b', 'param 2': 2}]
     """
 
-    result = [HashableDict()]
-    for key, val in parameters.items():
-        if len(val) == 0: continue
-        newresult = []
-        for i in result:
+    return [ HashableDict(combination) for combination in isweep(parameters) ]
+
+class LazySweep(object):
+
+    """Lazy sequence of all combinations of parameters, as generated by `execo_engine.sweep.sweep`.
+
+    Combinations are generated on demand, so that huge sweeps can be
+    defined, counted (with ``len()``), iterated over, and randomly
+    accessed (with ``lazy_sweep[index]``) without being
+    materialized. Memory usage only depends on the number of factors
+    and levels, not on the number of combinations. Combinations are
+    `execo_engine.sweep.Combination`, in the same order as in the
+    list returned by `execo_engine.sweep.sweep`: the index of a
+    combination is a mixed radix number, whose digits are the indexes
+    of the levels of each factor.
+
+    LazySweep instances are immutable. They can be given as sweeps to
+    `execo_engine.sweep.ParamSweeper`, which then does not
+    materialize them.
+
+    Example:
+
+    >>> s = isweep({
+    ...     "param 1": ["a", "b"],
+    ...     "param 2": [1, 2, 3]
+    ...     })
+    >>> len(s)
+    6
+    >>> s[4]
+    {'param 1': 'b', 'param 2': 2}
+    >>> s.index({'param 1': 'b', 'param 2': 2})
+    4
+    """
+
+    def __init__(self, parameters):
+        """:param parameters: dict of factors and their levels, as for `execo_engine.sweep.sweep`"""
+        self.__factors = []
+        # list of tuples (factor, levels, number of combinations,
+        # is_subsweep). levels is the list of levels of the factor,
+        # or, if is_subsweep, the list of tuples (level, LazySweep of
+        # the sub-sweep for this level)
+        self.__num_combinations = 1
+        for key, val in parameters.items():
+            if len(val) == 0: continue
             if isinstance(val, dict):
-                for subkey, subval in val.items():
-                    for subcombs in sweep(subval):
-                        subresult = HashableDict(i)
-                        subresult.update({key: subkey})
-                        subresult.update(subcombs)
-                        newresult.append(subresult)
+                levels = [ (subkey, LazySweep(subval)) for (subkey, subval) in val.items() ]
+                num_combinations = sum([ subsweep.__num_combinations for (subkey, subsweep) in levels ])
+                self.__factors.append((key, levels, num_combinations, True))
+            else:
+                levels = list(val)
+                num_combinations = len(levels)
+                self.__factors.append((key, levels, num_combinations, False))
+            self.__num_combinations *= num_combinations
+        self.__level_indexes = None
+        # for each factor, dict associating levels to their index (or,
+        # if is_subsweep, to the tuple (offset, LazySweep)). Built on
+        # first use, since levels must be hashable.
+
+    def __repr__(self):
+        return "<LazySweep of %i combinations>" % (self.__num_combinations,)
+
+    def __len__(self):
+        return self.__num_combinations
+
+    def __decode(self, index, combination):
+        digits = []
+        for (key, levels, num_combinations, is_subsweep) in reversed(self.__factors):
+            (index, digit) = divmod(index, num_combinations)
+            digits.append(digit)
+        digits.reverse()
+        for ((key, levels, num_combinations, is_subsweep), digit) in zip(self.__factors, digits):
+            if is_subsweep:
+                for (level, subsweep) in levels:
+                    if digit < subsweep.__num_combinations:
+                        combination[key] = level
+                        subsweep.__decode(digit, combination)
+                        break
+                    digit -= subsweep.__num_combinations
             else:
-                for j in val:
-                    subresult = HashableDict(i)
-                    subresult.update({key: j})
-                    newresult.append(subresult)
-        result = newresult
-    return result
+                combination[key] = levels[digit]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.__num_combinations
+        if index < 0 or index >= self.__num_combinations:
+            raise IndexError("LazySweep index out of range")
+        combination = dict()
+        self.__decode(index, combination)
+        return Combination._make(tuple(combination), tuple(combination.values()))
+
+    def __iter_factors(self, i, combination):
+        # generate the combinations of the factors from i, the ones
+        # before being already in combination (which is modified)
+        if i == len(self.__factors):
+            yield Combination._make(tuple(combination), tuple(combination.values()))
+            return
+        (key, levels, num_combinations, is_subsweep) = self.__factors[i]
+        if is_subsweep:
+            for (level, subsweep) in levels:
+                for subcombination in subsweep:
+                    subresult = dict(combination)
+                    subresult[key] = level
+                    subresult.update(subcombination)
+                    for c in self.__iter_factors(i + 1, subresult):
+                        yield c
+        else:
+            for level in levels:
+                combination[key] = level
+                for c in self.__iter_factors(i + 1, combination):
+                    yield c
+
+    def __iter__(self):
+        return self.__iter_factors(0, dict())
+
+    def __encode(self, combination, keys):
+        if self.__level_indexes == None:
+            level_indexes = []
+            for (key, levels, num_combinations, is_subsweep) in self.__factors:
+                if is_subsweep:
+                    indexes = dict()
+                    offset = 0
+                    for (level, subsweep) in levels:
+                        indexes[level] = (offset, subsweep)
+                        offset += subsweep.__num_combinations
+                else:
+                    indexes = dict([ (level, i) for (i, level) in enumerate(levels) ])
+                level_indexes.append(indexes)
+            self.__level_indexes = level_indexes
+        index = 0
+        for ((key, levels, num_combinations, is_subsweep), indexes) in zip(self.__factors, self.__level_indexes):
+            if key not in combination:
+                return None
+            try:
+                digit = indexes[combination[key]]
+            except (KeyError, TypeError):
+                return None
+            keys.add(key)
+            if is_subsweep:
+                (offset, subsweep) = digit
+                subindex = subsweep.__encode(combination, keys)
+                if subindex == None:
+                    return None
+                digit = offset + subindex
+            index = index * num_combinations + digit
+        return index
+
+    def index(self, combination):
+        """Return the index of a combination. Raise ValueError if it is not in the sweep."""
+        keys = set()
+        index = None
+        if isinstance(combination, (dict, Combination)):
+            index = self.__encode(combination, keys)
+        if index == None or len(keys) != len(combination):
+            raise ValueError("%r is not in sweep" % (combination,))
+        return index
+
+    def _level_counts(self):
+        # return a dict associating tuples (factor, level) to their
+        # number of occurrences in the combinations, computed from
+        # the factors without iterating over the combinations
+        counts = dict()
+        for (key, levels, num_combinations, is_subsweep) in self.__factors:
+            repeat = self.__num_combinations // num_combinations
+            if is_subsweep:
+                for (level, subsweep) in levels:
+                    counts[(key, level)] = counts.get((key, level), 0) + repeat * subsweep.__num_combinations
+                    for (item, count) in subsweep._level_counts().items():
+                        counts[item] = counts.get(item, 0) + repeat * count
+            else:
+                for level in levels:
+                    counts[(key, level)] = counts.get((key, level), 0) + repeat
+        return counts
+
+    def __contains__(self, combination):
+        try:
+            self.index(combination)
+            return True
+        except ValueError:
+            return False
+
+def isweep(parameters):
+
+    """Return a `execo_engine.sweep.LazySweep` of all combinations of parameters.
+
+    Same as `execo_engine.sweep.sweep`, but combinations are generated
+    lazily instead of being returned in a list.
+    """
+
+    return LazySweep(parameters)
+
+def _add_level_counts(counts, elements, increment = 1):
+    # add increment to counts (dict associating tuples (factor,
+    # level) to numbers of combinations) for each factor level of
+    # elements. Elements which are not combinations are ignored.
+    items = itertools.chain.from_iterable(element.items() for element in elements
+                                          if isinstance(element, (Combination, dict)))
+    if Counter:
+        items = Counter(items).items()
+    else:
+        items = [ (item, 1) for item in items ]
+    for (item, count) in items:
+        counts[item] = counts.get(item, 0) + increment * count
+
+class _CountingSet(set):
+
+    # set of combinations which can maintain the number of its
+    # elements per factor level. Counts are only maintained once
+    # they have been requested with level_counts, so that sets whose
+    # counts are never requested have no overhead but the method
+    # calls.
+
+    def __init__(self, elements = ()):
+        set.__init__(self, elements)
+        self.__level_counts = None
+
+    def level_counts(self):
+        if self.__level_counts == None:
+            self.__level_counts = dict()
+            _add_level_counts(self.__level_counts, self)
+        return self.__level_counts
+
+    def add(self, element):
+        if self.__level_counts != None and element not in self:
+            _add_level_counts(self.__level_counts, [element])
+        set.add(self, element)
+
+    def discard(self, element):
+        if self.__level_counts != None and element in self:
+            _add_level_counts(self.__level_counts, [element], -1)
+        set.discard(self, element)
+
+    def update(self, elements):
+        if self.__level_counts != None:
+            elements = set(elements).difference(self)
+            _add_level_counts(self.__level_counts, elements)
+        set.update(self, elements)
+
+    def difference_update(self, elements):
+        if self.__level_counts != None:
+            elements = self.intersection(elements)
+            _add_level_counts(self.__level_counts, elements, -1)
+        set.difference_update(self, elements)
+
+    def clear(self):
+        if self.__level_counts != None:
+            self.__level_counts = dict()
+        set.clear(self)
+
+    def copy(self):
+        return set(self)
+
+def _level_stats(total, remaining, skipped, inprogress, done):
+    # the result of sweep_stats, from the level counts of each state
+    def nest(counts):
+        nested = dict()
+        for ((factor, level), count) in counts.items():
+            if count != 0:
+                nested.setdefault(factor, dict())[level] = count
+        return nested
+    stats = {
+        "total": nest(total),
+        "remaining": nest(remaining),
+        "skipped": nest(skipped),
+        "inprogress": nest(inprogress),
+        "done": nest(done),
+        }
+    for (state, counts) in [ ("remaining", remaining), ("skipped", skipped),
+                             ("inprogress", inprogress), ("done", done) ]:
+        ratios = dict()
+        for (factor, levels) in stats["total"].items():
+            ratios[factor] = dict()
+            for (level, count) in levels.items():
+                ratios[factor][level] = float(counts.get((factor, level), 0)) / float(count)
+        stats[state + "_ratio"] = ratios
+    return stats
+
+class _LazyRemaining(object):
+
+    # set-like container of the remaining elements of a LazySweep,
+    # which only stores the removed elements. Elements are iterated
+    # over in the LazySweep order, starting from a cursor, before
+    # which all elements are removed, except readded ones.
+
+    def __init__(self, sweeps):
+        self.__sweeps = sweeps
+        self.__removed = _CountingSet()
+        self.__readded = set()
+        self.__cursor = 0
+
+    def level_counts(self):
+        counts = self.__sweeps._level_counts()
+        for (item, count) in self.__removed.level_counts().items():
+            counts[item] = counts.get(item, 0) - count
+        return counts
+
+    def __len__(self):
+        return len(self.__sweeps) - len(self.__removed)
+
+    def __contains__(self, element):
+        return element not in self.__removed and element in self.__sweeps
+
+    def __iter__(self):
+        for element in list(self.__readded):
+            yield element
+        index = self.__cursor
+        while index < len(self.__sweeps):
+            element = self.__sweeps[index]
+            if element not in self.__removed:
+                yield element
+            elif index == self.__cursor:
+                self.__cursor += 1
+            index += 1
+
+    def discard(self, element):
+        if element in self.__sweeps:
+            self.__removed.add(element)
+            self.__readded.discard(element)
+
+    def difference_update(self, elements):
+        for element in elements:
+            self.discard(element)
+
+    def add(self, element):
+        if element in self.__removed:
+            self.__removed.discard(element)
+            if self.__sweeps.index(element) < self.__cursor:
+                self.__readded.add(element)
+
+    def update(self, elements):
+        for element in elements:
+            self.add(element)
+
+    def copy(self):
+        return set(self)
+
+def _get_flat_factors(parameters):
+    # list of tuples (factor, levels) of parameters, which must not
+    # contain sub-sweeps
+    factors = []
+    for key, val in parameters.items():
+        if len(val) == 0: continue
+        if isinstance(val, dict):
+            raise ValueError("factor %r: sub-sweeps are not supported by this design" % (key,))
+        factors.append((key, list(val)))
+    return factors
+
+def _points_to_combinations(factors, points):
+    # map points of the unit hypercube [0, 1)^len(factors) to
+    # combinations, each coordinate selecting a level of a factor
+    keys = tuple([ key for (key, levels) in factors ])
+    combinations = []
+    for point in points:
+        values = []
+        for ((key, levels), u) in zip(factors, point):
+            values.append(levels[min(int(u * len(levels)), len(levels) - 1)])
+        combinations.append(HashableDict(zip(keys, values)))
+    return combinations
+
+def random_sweep(parameters, num_combinations, seed = None):
+    """Return combinations randomly sampled without replacement among all combinations of parameters.
+
+    :param parameters: dict of factors and their levels, as for
+      `execo_engine.sweep.sweep` (sub-sweeps are supported).
+
+    :param num_combinations: number of combinations to return (less if
+      there are less combinations of parameters).
+
+    :param seed: seed of the random generator. If None (default), the
+      sample differs at each call.
+
+    The full sweep is not materialized, combinations are drawn by
+    index from a `execo_engine.sweep.LazySweep`.
+    """
+    s = isweep(parameters)
+    rand = random.Random(seed)
+    num_combinations = min(num_combinations, len(s))
+    if sys.version_info >= (3,):
+        indexes = rand.sample(range(len(s)), num_combinations)
+    else:
+        indexes = rand.sample(xrange(len(s)), num_combinations)
+    return [ HashableDict(s[index]) for index in indexes ]
+
+def latin_hypercube_sweep(parameters, num_combinations, seed = None):
+    """Return a latin hypercube sample of combinations of parameters.
+
+    For each factor, the unit interval is split in num_combinations
+    strata, and each stratum is used exactly once, in a random order,
+    to select a level. Thus, each level of each factor is used in
+    (nearly) the same number of combinations, whatever
+    num_combinations. With few levels, some combinations may be
+    repeated (duplicates are merged when given to
+    `execo_engine.sweep.ParamSweeper`).
+
+    :param parameters: dict of factors and their levels, as for
+      `execo_engine.sweep.sweep` (sub-sweeps are not supported).
+
+    :param num_combinations: number of combinations to return.
+
+    :param seed: seed of the random generator. If None (default), the
+      sample differs at each call.
+    """
+    factors = _get_flat_factors(parameters)
+    rand = random.Random(seed)
+    columns = []
+    for factor in factors:
+        strata = list(range(num_combinations))
+        rand.shuffle(strata)
+        columns.append([ (stratum + rand.random()) / num_combinations for stratum in strata ])
+    return _points_to_combinations(factors, zip(*columns))
+
+_sobol_direction_numbers = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+    ]
+# sobol sequence parameters (degree s, coefficients a, initial
+# direction numbers m) of dimensions 2 and above, from S. Joe and
+# F. Y. Kuo, new-joe-kuo-6.21201
+
+_sobol_bits = 32
+
+def _sobol_points(dimensions, num_points, skip):
+    if dimensions > len(_sobol_direction_numbers) + 1:
+        raise ValueError("sobol sequence supports at most %i factors" % (len(_sobol_direction_numbers) + 1,))
+    if skip + num_points > 2 ** _sobol_bits:
+        raise ValueError("sobol sequence supports at most %i points" % (2 ** _sobol_bits,))
+    directions = [ [ 1 << (_sobol_bits - i) for i in range(1, _sobol_bits + 1) ] ]
+    for (s, a, m) in _sobol_direction_numbers[:dimensions - 1]:
+        v = [ m[i] << (_sobol_bits - i - 1) for i in range(0, s) ]
+        for i in range(s, _sobol_bits):
+            x = v[i - s] ^ (v[i - s] >> s)
+            for k in range(1, s):
+                if (a >> (s - 1 - k)) & 1:
+                    x ^= v[i - k]
+            v.append(x)
+        directions.append(v)
+    # gray code order: point n is point n - 1 xored with the direction
+    # number of the rightmost zero bit of n - 1
+    x = [ 0 ] * dimensions
+    for n in range(0, skip + num_points):
+        if n > 0:
+            c = 0
+            while (n - 1) >> c & 1:
+                c += 1
+            for d in range(0, dimensions):
+                x[d] ^= directions[d][c]
+        if n >= skip:
+            yield [ float(xd) / 2 ** _sobol_bits for xd in x ]
+
+def _halton_points(dimensions, num_points, skip):
+    primes = []
+    candidate = 2
+    while len(primes) < dimensions:
+        if all([ candidate % p != 0 for p in primes ]):
+            primes.append(candidate)
+        candidate += 1
+    for n in range(skip, skip + num_points):
+        point = []
+        for base in primes:
+            # radical inverse of n in base
+            u = 0.0
+            f = 1.0 / base
+            i = n
+            while i > 0:
+                u += f * (i % base)
+                i //= base
+                f /= base
+            point.append(u)
+        yield point
+
+def quasi_random_sweep(parameters, num_combinations, sequence = "sobol", skip = 0):
+    """Return combinations of parameters following a low discrepancy sequence.
+
+    Points of a low discrepancy (quasi random) sequence of the unit
+    hypercube, with one dimension per factor, are mapped to
+    combinations (each coordinate selecting a level of a
+    factor). Compared to random sampling, they cover the space of
+    combinations more evenly. The result is deterministic. With few
+    levels, some combinations may be repeated (duplicates are merged
+    when given to `execo_engine.sweep.ParamSweeper`).
+
+    :param parameters: dict of factors and their levels, as for
+      `execo_engine.sweep.sweep` (sub-sweeps are not supported).
+
+    :param num_combinations: number of combinations to return. For
+      sobol sequences, powers of two give the best balance.
+
+    :param sequence: ``"sobol"`` (default, up to 21 factors) or
+      ``"halton"``.
+
+    :param skip: number of initial points of the sequence to skip
+      (the first point selects the first level of all factors). Use
+      it to get additional combinations, complementing a previous
+      call.
+    """
+    factors = _get_flat_factors(parameters)
+    if sequence == "sobol":
+        points = _sobol_points(len(factors), num_combinations, skip)
+    elif sequence == "halton":
+        points = _halton_points(len(factors), num_combinations, skip)
+    else:
+        raise ValueError("unknown sequence %r" % (sequence,))
+    return _points_to_combinations(factors, points)
+
+def fractional_factorial_sweep(parameters, generators):
+    """Return the combinations of a two level fractional factorial design 2^(k-p).
+
+    The k factors are split in k-p base factors, on which a full
+    factorial design (2^(k-p) combinations) is done, and p generated
+    factors, whose levels are given by interactions of base factors:
+    with the first level of each factor noted -1 and the second +1,
+    the level of a generated factor is the product of the levels of
+    the base factors of its generator (*The Art Of Computer Systems
+    Performance Analysis, R. Jain, Wiley 1991, chapter 19*).
+
+    :param parameters: dict of factors and their levels, as for
+      `execo_engine.sweep.sweep`, each factor having exactly two
+      levels.
+
+    :param generators: either a dict associating each generated factor
+      to the list of base factors whose interaction gives its level,
+      or an integer p, in which case the last p factors (in
+      parameters iteration order) are generated from the interactions
+      of the most base factors, which maximizes the resolution of the
+      design for small p.
+
+    Example:
+
+    >>> fractional_factorial_sweep({
+    ...     "a": [0, 1], "b": [0, 1], "c": [0, 1] },
+    ...     { "c": ["a", "b"] })
+    [{'a': 0, 'b': 0, 'c': 1}, {'a': 0, 'b': 1, 'c': 0}, {'a': 1, 'b': 0, 'c': 0}, {'a': 1, 'b': 1, 'c': 1}]
+    """
+    factors = _get_flat_factors(parameters)
+    for (key, levels) in factors:
+        if len(levels) != 2:
+            raise ValueError("factor %r: fractional factorial designs need exactly two levels" % (key,))
+    keys = [ key for (key, levels) in factors ]
+    if not isinstance(generators, dict):
+        num_generated = int(generators)
+        if num_generated < 0 or num_generated >= len(keys):
+            raise ValueError("invalid number of generated factors %i for %i factors" % (num_generated, len(keys)))
+        base = keys[:len(keys) - num_generated]
+        interactions = []
+        for size in range(len(base), 1, -1):
+            for mask in range(0, 2 ** len(base)):
+                subset = [ base[i] for i in range(0, len(base)) if mask >> (len(base) - 1 - i) & 1 ]
+                if len(subset) == size:
+                    interactions.append(subset)
+        if len(interactions) < num_generated:
+            raise ValueError("not enough interactions of %i base factors to generate %i factors" % (len(base), num_generated))
+        generators = dict(zip(keys[len(base):], interactions))
+    base = [ key for key in keys if key not in generators ]
+    for (generated, generator) in generators.items():
+        if generated not in keys:
+            raise ValueError("unknown generated factor %r" % (generated,))
+        for key in generator:
+            if key not in base:
+                raise ValueError("generator of %r: %r is not a base factor" % (generated, key))
+    levels = dict(factors)
+    combinations = []
+    for run in range(0, 2 ** len(base)):
+        signs = dict([ (key, run >> (len(base) - 1 - i) & 1) for (i, key) in enumerate(base) ])
+        for (generated, generator) in generators.items():
+            # product of -1 / +1 levels: +1 if even number of -1
+            signs[generated] = 1 - sum([ 1 - signs[key] for key in generator ]) % 2
+        combinations.append(HashableDict([ (key, levels[key][signs[key]]) for key in keys ]))
+    return combinations
 
 # context manager for opening and locking files
 # beware: for locking purpose, the file is always opened in mode "ab+"
 # which is the only mode allowing both locking the file and having
 # read write access to it. but it forces to handle correctly file
 # position and truncation
+# the file is only fsynced if it was modified
 class _openlock():
 
     def __init__(self, filename):
         self.__filename = filename
 
+    def __file_state(self):
+        st = os.fstat(self.__file.fileno())
+        return (st.st_size, st.st_mtime, st.st_ctime)
+
     def __enter__(self):
         self.__file = open(self.__filename, "ab+")
         fcntl.lockf(self.__file, fcntl.LOCK_EX)
+        self.__initial_state = self.__file_state()
         return self.__file
 
     def __exit__(self, t, v, traceback):
         self.__file.flush()
-        os.fsync(self.__file.fileno())
+        if self.__file_state() != self.__initial_state:
+            os.fsync(self.__file.fileno())
         fcntl.lockf(self.__file, fcntl.LOCK_UN)
         self.__file.close()
         return False
 
+_inprogress_journal_tag = "execo_engine.sweep inprogress journal"
+# tag of the header record of the inprogress journal
+
+_inprogress_journal_compaction_threshold = 1000
+# the inprogress journal is compacted when it contains more records
+# than this threshold and more than twice the number of inprogress
+# elements
+
+class _PickleStorage(object):
+
+    # persistence of the ParamSweeper states in python pickle files:
+    # ``done`` is a stream of pickled elements, ``inprogress`` is a
+    # journal of the inprogress state transitions, ``sweeps`` is a
+    # pickled set of all elements.
+    #
+    # storages are used as context managers: all other methods,
+    # except load_sweeps and save_sweeps, must be called inside a
+    # with statement, which locks the storage for other processes /
+    # ParamSweepers.
+    #
+    # inprogress elements may have a lease, which is a tuple (owner,
+    # host, pid, deadline). All elements of an owner share its
+    # deadline, so that it is renewed in O(1).
+
+    def __init__(self, persistence_dir):
+        self.__persistence_dir = persistence_dir
+        self.__done = set()
+        self.__inprogress = dict()
+        # associates inprogress elements to their owner (None if no
+        # lease)
+        self.__owners = dict()
+        # associates owners to lists [host, pid, deadline, set of
+        # elements]
+        self.__done_filepos = None
+        self.__inprogress_filepos = 0
+        self.__inprogress_generation = None
+        self.__inprogress_journal_len = 0
+
+    def __enter__(self):
+        self.__done_lock = _openlock(os.path.join(self.__persistence_dir, "done"))
+        self.__done_file = self.__done_lock.__enter__()
+        try:
+            self.__inprogress_lock = _openlock(os.path.join(self.__persistence_dir, "inprogress"))
+            self.__inprogress_file = self.__inprogress_lock.__enter__()
+        except:
+            self.__done_lock.__exit__(*sys.exc_info())
+            raise
+        return self
+
+    def __exit__(self, t, v, traceback):
+        try:
+            self.__inprogress_lock.__exit__(t, v, traceback)
+        finally:
+            self.__done_lock.__exit__(t, v, traceback)
+        return False
+
+    def load_sweeps(self):
+        with _openlock(os.path.join(self.__persistence_dir, "sweeps")) as sweeps_file:
+            sweeps_file.seek(0, os.SEEK_SET)
+            return pickle.load(sweeps_file)
+
+    def save_sweeps(self, sweeps):
+        with _openlock(os.path.join(self.__persistence_dir, "sweeps")) as sweeps_file:
+            sweeps_file.truncate(0)
+            if not isinstance(sweeps, LazySweep):
+                sweeps = set(sweeps)
+            pickle.dump(sweeps, sweeps_file)
+
+    def __set_inprogress(self, elements, lease):
+        owner = None
+        if lease != None:
+            (owner, host, pid, deadline) = lease
+            if owner in self.__owners:
+                self.__owners[owner][2] = deadline
+            else:
+                self.__owners[owner] = [ host, pid, deadline, set() ]
+            self.__owners[owner][3].update(elements)
+        for element in elements:
+            previous_owner = self.__inprogress.get(element)
+            if previous_owner != None and previous_owner != owner and previous_owner in self.__owners:
+                self.__owners[previous_owner][3].discard(element)
+            self.__inprogress[element] = owner
+
+    def __unset_inprogress(self, elements):
+        for element in elements:
+            if element in self.__inprogress:
+                owner = self.__inprogress.pop(element)
+                if owner != None and owner in self.__owners:
+                    self.__owners[owner][3].discard(element)
+
+    def __read_inprogress_records(self):
+        # read the inprogress journal records appended since the last
+        # read. Return the tuple (added elements, removed elements)
+        added = set()
+        removed = set()
+        self.__inprogress_file.seek(self.__inprogress_filepos, os.SEEK_SET)
+        while True:
+            try:
+                record = pickle.load(self.__inprogress_file)
+            except:
+                self.__inprogress_file.truncate(self.__inprogress_filepos)
+                break
+            self.__inprogress_filepos = self.__inprogress_file.tell()
+            self.__inprogress_journal_len += 1
+            if record[0] == "+":
+                if len(record) > 2:
+                    lease = record[2]
+                else:
+                    lease = None
+                self.__set_inprogress(record[1], lease)
+                added.update(record[1])
+                removed.difference_update(record[1])
+            elif record[0] == "-":
+                self.__unset_inprogress(record[1])
+                removed.update(record[1])
+                added.difference_update(record[1])
+            elif record[0] == "r":
+                if record[1] in self.__owners:
+                    self.__owners[record[1]][2] = record[2]
+        return (added, removed)
+
+    def __load_inprogress(self):
+        # fully read the inprogress journal: a header record with the
+        # journal generation (changed at each compaction), followed
+        # by records ("+", elements[, lease]), ("-", elements) or
+        # ("r", owner, deadline) (lease renewal). A file containing a
+        # single pickled set (format of previous versions) is also
+        # accepted.
+        self.__inprogress = dict()
+        self.__owners = dict()
+        self.__inprogress_filepos = 0
+        self.__inprogress_generation = None
+        self.__inprogress_journal_len = 0
+        self.__inprogress_file.seek(0, os.SEEK_SET)
+        try:
+            header = pickle.load(self.__inprogress_file)
+        except:
+            self.__inprogress_file.truncate(0)
+            return
+        self.__inprogress_filepos = self.__inprogress_file.tell()
+        if isinstance(header, set):
+            self.__set_inprogress(header, None)
+        elif isinstance(header, tuple) and len(header) == 2 and header[0] == _inprogress_journal_tag:
+            self.__inprogress_generation = header[1]
+            self.__read_inprogress_records()
+        else:
+            self.__inprogress_file.truncate(0)
+            self.__inprogress_filepos = 0
+
+    def __update_inprogress(self):
+        # incrementally read the inprogress journal, or fully reload
+        # it if it was compacted, truncated or removed since the last
+        # read. Return the tuple (added elements, removed elements)
+        self.__inprogress_file.seek(0, os.SEEK_END)
+        generation = None
+        if self.__inprogress_file.tell() >= self.__inprogress_filepos and self.__inprogress_generation != None:
+            self.__inprogress_file.seek(0, os.SEEK_SET)
+            try:
+                header = pickle.load(self.__inprogress_file)
+                if isinstance(header, tuple) and len(header) == 2 and header[0] == _inprogress_journal_tag:
+                    generation = header[1]
+            except:
+                pass
+        if generation != None and generation == self.__inprogress_generation:
+            return self.__read_inprogress_records()
+        previous_inprogress = set(self.__inprogress)
+        self.__load_inprogress()
+        return (set(self.__inprogress).difference(previous_inprogress),
+                previous_inprogress.difference(self.__inprogress))
+
+    def __compact_inprogress(self):
+        # rewrite the inprogress journal with a new generation and one
+        # record per lease owner, containing all inprogress elements
+        self.__inprogress_file.truncate(0)
+        self.__inprogress_generation = random.getrandbits(64)
+        pickle.dump((_inprogress_journal_tag, self.__inprogress_generation), self.__inprogress_file)
+        pickle.dump(("+", [ element for (element, owner) in self.__inprogress.items() if owner == None ]),
+                    self.__inprogress_file)
+        self.__inprogress_journal_len = 1
+        for (owner, (host, pid, deadline, elements)) in list(self.__owners.items()):
+            if len(elements) == 0:
+                del self.__owners[owner]
+                continue
+            pickle.dump(("+", list(elements), (owner, host, pid, deadline)), self.__inprogress_file)
+            self.__inprogress_journal_len += 1
+        self.__inprogress_filepos = self.__inprogress_file.tell()
+
+    def __write_inprogress(self, record):
+        # append a record to the inprogress journal, the in-memory
+        # inprogress state being already up to date. Journals in the
+        # format of previous versions, or grown too big, are
+        # compacted instead.
+        if (self.__inprogress_generation == None
+            or (self.__inprogress_journal_len > _inprogress_journal_compaction_threshold
+                and self.__inprogress_journal_len > 2 * (len(self.__inprogress) + len(self.__owners)))):
+            self.__compact_inprogress()
+        else:
+            pickle.dump(record, self.__inprogress_file)
+            self.__inprogress_filepos = self.__inprogress_file.tell()
+            self.__inprogress_journal_len += 1
+
+    def load_all(self):
+        """fully read the storage, return the tuple (done elements, inprogress elements)"""
+        self.__done.clear()
+        self.__done_filepos = 0
+        self.__done_file.seek(0, os.SEEK_SET)
+        while True:
+            try:
+                self.__done.add(pickle.load(self.__done_file))
+                self.__done_filepos = self.__done_file.tell()
+            except:
+                self.__done_file.truncate(self.__done_filepos)
+                break
+        self.__load_inprogress()
+        return (self.__done, set(self.__inprogress))
+
+    def full_load(self, sweeps):
+        """fully read the storage, return the tuple (done elements, inprogress elements) of sweeps"""
+        self.load_all()
+        if isinstance(sweeps, LazySweep):
+            return (set([ element for element in self.__done if element in sweeps ]),
+                    set([ element for element in self.__inprogress if element in sweeps ]))
+        return (self.__done.intersection(sweeps),
+                set(self.__inprogress).intersection(sweeps))
+
+    def update(self):
+        """incrementally read the storage.
+
+        Return the tuple (newly done elements, elements added to
+        inprogress, elements removed from inprogress), or None if a
+        full_load is needed.
+        """
+        self.__done_file.seek(0, os.SEEK_END)
+        new_done_filepos = self.__done_file.tell()
+        if self.__done_filepos == None or new_done_filepos < self.__done_filepos:
+            return None
+        new_done = set()
+        if new_done_filepos > self.__done_filepos:
+            self.__done_file.seek(self.__done_filepos, os.SEEK_SET)
+            while True:
+                try:
+                    new_done.add(pickle.load(self.__done_file))
+                    self.__done_filepos = self.__done_file.tell()
+                except:
+                    self.__done_file.truncate(self.__done_filepos)
+                    break
+            self.__done.update(new_done)
+        (added_inprogress, removed_inprogress) = self.__update_inprogress()
+        return (new_done, added_inprogress, removed_inprogress)
+
+    def add_done(self, elements):
+        self.__done.update(elements)
+        self.__unset_inprogress(elements)
+        self.__done_file.seek(0, os.SEEK_END)
+        for element in elements:
+            pickle.dump(element, self.__done_file)
+        self.__done_filepos = self.__done_file.tell()
+        self.__write_inprogress(("-", list(elements)))
+
+    def add_inprogress(self, elements, lease = None):
+        self.__set_inprogress(elements, lease)
+        if lease == None:
+            self.__write_inprogress(("+", list(elements)))
+        else:
+            self.__write_inprogress(("+", list(elements), lease))
+
+    def remove_inprogress(self, elements):
+        self.__unset_inprogress(elements)
+        self.__write_inprogress(("-", list(elements)))
+
+    def reset_inprogress(self):
+        self.__inprogress.clear()
+        self.__owners.clear()
+        self.__compact_inprogress()
+
+    def renew(self, owner, deadline):
+        """renew the leases of owner, if it has inprogress elements
+
+        As for the other methods writing to the storage, the storage
+        must have been synced with update (or full_load) before.
+        """
+        if owner in self.__owners and len(self.__owners[owner][3]) > 0:
+            self.__owners[owner][2] = deadline
+            self.__write_inprogress(("r", owner, deadline))
+
+    def expire(self, now):
+        """remove the inprogress elements whose lease has expired, and return them"""
+        expired = set()
+        for (owner, (host, pid, deadline, elements)) in list(self.__owners.items()):
+            if deadline < now:
+                expired.update(elements)
+                del self.__owners[owner]
+        if len(expired) > 0:
+            self.__unset_inprogress(expired)
+            self.__write_inprogress(("-", list(expired)))
+        return expired
+
+    def get_leases(self):
+        """return a dict associating inprogress elements with a lease to their lease"""
+        leases = dict()
+        for (owner, (host, pid, deadline, elements)) in self.__owners.items():
+            for element in elements:
+                leases[element] = (owner, host, pid, deadline)
+        return leases
+
+_sqlite_filename = "sweeps.sqlite"
+# name of the sqlite database in the persistence directory
+
+_sqlite_timeout = 600
+# how long (in seconds) to wait for a sqlite database locked by
+# another process
+
+_lazy_sweeps_key = "LazySweep"
+# key of the row of the sqlite sweeps table holding a LazySweep
+
+_state_todo = 0
+_state_inprogress = 1
+_state_done = 2
+# states of the elements in the sqlite database
+
+def _element_key(element):
+    # stable key of an element, identical across processes and runs
+    if isinstance(element, (dict, Combination)):
+        s = repr(sorted([ (repr(k), repr(v)) for (k, v) in element.items() ]))
+    else:
+        s = repr(element)
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+class _SqliteStorage(object):
+
+    # persistence of the ParamSweeper states in a sqlite database in
+    # WAL mode. Elements are indexed by a stable key (hash of their
+    # representation), each row holding the element state and the
+    # sequence number of its last change, so that incremental updates
+    # only read the rows changed since the last update, and states of
+    # given elements can be looked up without loading all elements.
+    #
+    # same usage as _PickleStorage. A storage with states in pickle
+    # files is imported when the database is created. Leases of
+    # inprogress elements are stored in the owners table, and
+    # elements reference their owner.
+
+    def __init__(self, persistence_dir):
+        self.__persistence_dir = persistence_dir
+        self.__seq = None
+        self.__db = sqlite3.connect(os.path.join(persistence_dir, _sqlite_filename),
+                                    timeout = _sqlite_timeout,
+                                    isolation_level = None,
+                                    check_same_thread = False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        with self:
+            self.__db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS elements (key TEXT PRIMARY KEY, element BLOB NOT NULL, state INTEGER NOT NULL, seq INTEGER NOT NULL, owner TEXT)")
+            if "owner" not in [ column[1] for column in self.__db.execute("PRAGMA table_info(elements)") ]:
+                self.__db.execute("ALTER TABLE elements ADD COLUMN owner TEXT")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS elements_state ON elements (state)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS elements_seq ON elements (seq)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS elements_owner ON elements (owner)")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, host TEXT, pid INTEGER, deadline REAL NOT NULL)")
+            self.__db.execute("CREATE TABLE IF NOT EXISTS sweeps (key TEXT PRIMARY KEY, element BLOB NOT NULL)")
+            if self.__db.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone() == None:
+                self.__db.execute("INSERT INTO meta (name, value) VALUES ('seq', 0)")
+                self.__import_pickle_storage()
+
+    def __enter__(self):
+        self.__db.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, t, v, traceback):
+        if t == None:
+            self.__db.execute("COMMIT")
+        else:
+            self.__db.execute("ROLLBACK")
+            self.__seq = None
+        return False
+
+    def __import_pickle_storage(self):
+        if (not os.path.exists(os.path.join(self.__persistence_dir, "done"))
+            and not os.path.exists(os.path.join(self.__persistence_dir, "inprogress"))):
+            return
+        logger.info("importing ParamSweeper pickle storage in %s", self.__persistence_dir)
+        pickle_storage = _PickleStorage(self.__persistence_dir)
+        with pickle_storage:
+            (done, inprogress) = pickle_storage.load_all()
+            self.add_inprogress(inprogress)
+            self.add_done(done)
+        sweeps_filename = os.path.join(self.__persistence_dir, "sweeps")
+        if os.path.exists(sweeps_filename) and os.path.getsize(sweeps_filename) > 0:
+            self.__insert_sweeps(pickle_storage.load_sweeps())
+
+    def __insert_sweeps(self, sweeps):
+        self.__db.execute("DELETE FROM sweeps")
+        if isinstance(sweeps, LazySweep):
+            self.__db.execute("INSERT INTO sweeps (key, element) VALUES (?, ?)",
+                              (_lazy_sweeps_key, self.__dumps(sweeps)))
+            return
+        self.__db.executemany("INSERT OR REPLACE INTO sweeps (key, element) VALUES (?, ?)",
+                              ((_element_key(element), self.__dumps(element)) for element in sweeps))
+
+    def __dumps(self, element):
+        return sqlite3.Binary(pickle.dumps(element, 2))
+
+    def __loads(self, blob):
+        return pickle.loads(bytes(blob))
+
+    def __get_seq(self):
+        return self.__db.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone()[0]
+
+    def __next_seq(self):
+        self.__db.execute("UPDATE meta SET value = value + 1 WHERE name = 'seq'")
+        self.__seq = self.__get_seq()
+        return self.__seq
+
+    def load_sweeps(self):
+        with self:
+            sweeps = set()
+            for (key, blob) in self.__db.execute("SELECT key, element FROM sweeps"):
+                if key == _lazy_sweeps_key:
+                    return self.__loads(blob)
+                sweeps.add(self.__loads(blob))
+            return sweeps
+
+    def save_sweeps(self, sweeps):
+        with self:
+            self.__insert_sweeps(sweeps)
+
+    def full_load(self, sweeps):
+        self.__seq = self.__get_seq()
+        done = set()
+        inprogress = set()
+        if isinstance(sweeps, LazySweep):
+            for (blob, state) in self.__db.execute("SELECT element, state FROM elements WHERE state != ?", (_state_todo,)):
+                element = self.__loads(blob)
+                if element in sweeps:
+                    if state == _state_done:
+                        done.add(element)
+                    else:
+                        inprogress.add(element)
+            return (done, inprogress)
+        keys = dict([ (_element_key(element), element) for element in sweeps ])
+        keys_list = list(keys)
+        # chunks of keys below the default sqlite limit of 999
+        # variables per statement
+        for i in range(0, len(keys_list), 500):
+            chunk = keys_list[i:i+500]
+            for (key, state) in self.__db.execute(
+                "SELECT key, state FROM elements WHERE state != ? AND key IN (%s)" % (",".join(["?"] * len(chunk)),),
+                [ _state_todo ] + chunk):
+                if state == _state_done:
+                    done.add(keys[key])
+                else:
+                    inprogress.add(keys[key])
+        return (done, inprogress)
+
+    def update(self):
+        if self.__seq == None:
+            return None
+        new_done = set()
+        added_inprogress = set()
+        removed_inprogress = set()
+        for (blob, state) in self.__db.execute("SELECT element, state FROM elements WHERE seq > ?", (self.__seq,)):
+            element = self.__loads(blob)
+            if state == _state_inprogress:
+                added_inprogress.add(element)
+            else:
+                removed_inprogress.add(element)
+                if state == _state_done:
+                    new_done.add(element)
+        self.__seq = self.__get_seq()
+        return (new_done, added_inprogress, removed_inprogress)
+
+    def __set_state(self, elements, state, owner = None):
+        seq = self.__next_seq()
+        self.__db.executemany("INSERT OR REPLACE INTO elements (key, element, state, seq, owner) VALUES (?, ?, ?, ?, ?)",
+                              ((_element_key(element), self.__dumps(element), state, seq, owner) for element in elements))
+
+    def add_done(self, elements):
+        self.__set_state(elements, _state_done)
+
+    def add_inprogress(self, elements, lease = None):
+        owner = None
+        if lease != None:
+            owner = lease[0]
+            self.__db.execute("INSERT OR REPLACE INTO owners (owner, host, pid, deadline) VALUES (?, ?, ?, ?)", lease)
+        self.__set_state(elements, _state_inprogress, owner)
+
+    def remove_inprogress(self, elements):
+        seq = self.__next_seq()
+        self.__db.executemany("UPDATE elements SET state = ?, seq = ?, owner = NULL WHERE key = ? AND state = ?",
+                              ((_state_todo, seq, _element_key(element), _state_inprogress) for element in elements))
+
+    def reset_inprogress(self):
+        seq = self.__next_seq()
+        self.__db.execute("UPDATE elements SET state = ?, seq = ?, owner = NULL WHERE state = ?",
+                          (_state_todo, seq, _state_inprogress))
+        self.__db.execute("DELETE FROM owners")
+
+    def renew(self, owner, deadline):
+        self.__db.execute("UPDATE owners SET deadline = ? WHERE owner = ?", (deadline, owner))
+
+    def expire(self, now):
+        expired = set()
+        expired_owners = [ owner for (owner,) in self.__db.execute("SELECT owner FROM owners WHERE deadline < ?", (now,)) ]
+        if len(expired_owners) > 0:
+            seq = self.__next_seq()
+            for owner in expired_owners:
+                for (blob,) in self.__db.execute("SELECT element FROM elements WHERE owner = ? AND state = ?",
+                                                 (owner, _state_inprogress)):
+                    expired.add(self.__loads(blob))
+                self.__db.execute("UPDATE elements SET state = ?, seq = ?, owner = NULL WHERE owner = ? AND state = ?",
+                                  (_state_todo, seq, owner, _state_inprogress))
+                self.__db.execute("DELETE FROM owners WHERE owner = ?", (owner,))
+        return expired
+
+    def get_leases(self):
+        leases = dict()
+        for (blob, owner, host, pid, deadline) in self.__db.execute(
+            "SELECT elements.element, owners.owner, owners.host, owners.pid, owners.deadline"
+            " FROM elements JOIN owners ON elements.owner = owners.owner WHERE elements.state = ?",
+            (_state_inprogress,)):
+            leases[self.__loads(blob)] = (owner, host, pid, deadline)
+        return leases
+
+_storages = {
+    "pickle": _PickleStorage,
+    "sqlite": _SqliteStorage,
+    }
+
+def _open_storage(persistence_dir, storage):
+    if storage == None:
+        if os.path.exists(os.path.join(persistence_dir, _sqlite_filename)):
+            storage = "sqlite"
+        else:
+            storage = "pickle"
+    if storage not in _storages:
+        raise ValueError("unknown ParamSweeper storage %r" % (storage,))
+    return _storages[storage](persistence_dir)
+
+_remote_storage_methods = frozenset([
+    "load_sweeps", "save_sweeps", "full_load", "update", "add_done",
+    "add_inprogress", "remove_inprogress", "reset_inprogress", "renew",
+    "expire", "get_leases" ])
+# storage methods which a ParamSweeperCoordinator serves
+
+class _RemoteStorage(object):
+
+    # storage forwarding all operations to a ParamSweeperCoordinator,
+    # which performs them on a storage of its persistence
+    # directory. Entering the storage takes the coordinator lock,
+    # which is held until exit, so that the operations of a with
+    # statement are atomic, as with local storages.
+
+    def __init__(self, address, authkey):
+        self.__connection = multiprocessing.connection.Client(address, authkey = authkey)
+
+    def __request(self, *request):
+        self.__connection.send(request)
+        (status, result) = self.__connection.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def __enter__(self):
+        self.__request("enter")
+        return self
+
+    def __exit__(self, t, v, traceback):
+        self.__request("exit", t != None)
+        return False
+
+    def load_sweeps(self):
+        return self.__request("call", "load_sweeps", ())
+
+    def save_sweeps(self, sweeps):
+        self.__request("call", "save_sweeps", (sweeps,))
+
+    def full_load(self, sweeps):
+        return self.__request("call", "full_load", (sweeps,))
+
+    def update(self):
+        return self.__request("call", "update", ())
+
+    def add_done(self, elements):
+        self.__request("call", "add_done", (list(elements),))
+
+    def add_inprogress(self, elements, lease = None):
+        self.__request("call", "add_inprogress", (list(elements), lease))
+
+    def remove_inprogress(self, elements):
+        self.__request("call", "remove_inprogress", (list(elements),))
+
+    def reset_inprogress(self):
+        self.__request("call", "reset_inprogress", ())
+
+    def renew(self, owner, deadline):
+        self.__request("call", "renew", (owner, deadline))
+
+    def expire(self, now):
+        return self.__request("call", "expire", (now,))
+
+    def get_leases(self):
+        return self.__request("call", "get_leases", ())
+
 class ParamSweeper(object):
 
     """Multi-process-safe, thread-safe and persistent iterable container to iterate over a list of experiment parameters (or whatever, actually).
@@ -235,40 +1545,90 @@ class ParamSweeper(object):
 
     State *inprogress* is stored on disk to avoid concurrent processes
     to get the same elements from different ParamSweeper instances (to
-    avoid duplicating work). In some cases (for example if a process
-    has crashed without marking an element *done* or *skipped* or
-    canceling it), you may want to reset the *inprogress* state. This
-    can be done by removing the file ``inprogress`` in the persistence
-    directory (this can even be done while some ParamSweeper are
-    instanciated and using it).
+    avoid duplicating work). If the ParamSweeper is given a
+    ``lease_duration``, the elements it gets are leased: their lease
+    (owner id, host, pid, deadline) is stored with their *inprogress*
+    state, and is periodically renewed by a background thread while
+    the ParamSweeper exists. If a process crashes without marking its
+    elements *done* or *skipped* or canceling them, its leases are
+    not renewed anymore, and once expired, its elements automatically
+    come back in the *todo* state of all ParamSweepers sharing the
+    persistence directory, at their next update (this assumes that
+    the clocks of the hosts sharing a persistence directory are
+    synchronized). Elements without lease stay *inprogress* until you
+    reset the *inprogress* state. This can be done with
+    `execo_engine.sweep.ParamSweeper.reset`, or, with the default
+    pickle storage, by removing the file ``inprogress`` in the
+    persistence directory (this can even be done while some
+    ParamSweeper are instanciated and using it).
 
     ParamSweeper handle crashes in the following ways: if it crashes
     (or is killed) while synchronizing to disk, in the worst case, the
-    current element marked done can be lost (i.e. other ParamSweepers
-    or later instanciations will not see it marked done), or the whole
-    list of inprogress elements can be lost.
+    current element marked done, or the current inprogress state
+    transition, can be lost (i.e. other ParamSweepers or later
+    instanciations will not see it).
 
     The ParamSweeper code assumes that in typical usage, there may be
     a huge number of elements to iterate on (and accordingly, the list
-    of done elements will grow huge too), and that the number of
-    inprogress elements will stay reasonably low. The whole iterable
-    of elements is (optionally) written to disk only once, at
+    of done elements will grow huge too). The whole iterable of
+    elements is (optionally) written to disk only once, at
     ParamSweeper construction. The set of done elements can only grow
-    and is incrementaly appended. The set of inprogress elements is
-    fully read from and written to disk at each operation, thus this
-    may become a bottleneck to ParamSweeper performance if the set of
-    inprogress elements is big.
+    and is incrementaly appended. The *inprogress* state is stored as
+    a journal: each state transition appends a record to it, and each
+    ParamSweeper only reads the records appended since its last
+    operation. When the journal grows too much compared to the number
+    of inprogress elements, it is compacted (rewritten with a single
+    snapshot record). Thus each operation does an amount of I/O
+    independent of the number of done or inprogress elements.
+
+    States can be stored in two ways, selected with the ``storage``
+    constructor argument:
+
+    - ``"pickle"`` (default): python pickle files ``done``,
+      ``inprogress`` and ``sweeps`` in the persistence directory, as
+      described above. Opening a ParamSweeper needs to read all done
+      elements.
+
+    - ``"sqlite"``: a sqlite database ``sweeps.sqlite`` in WAL mode,
+      where elements are indexed by a stable hash key. Opening a
+      ParamSweeper only looks up the states of its own elements, and
+      incremental updates only read the elements changed since the
+      last update. When the database is created, the states found in
+      pickle files in the persistence directory are imported (the
+      pickle files are left untouched but ignored afterwards). Later
+      instanciations with the default ``storage`` use the database
+      if it exists. Beware: sqlite WAL mode needs shared memory
+      between processes, thus this storage does not work for
+      ParamSweepers on different hosts sharing a persistence
+      directory on nfs.
+
+    ParamSweepers on hosts which do not share a persistence directory
+    (or when nfs locking is too slow or unreliable) can instead be
+    given the address of a `execo_engine.sweep.ParamSweeperCoordinator`:
+    a server, typically started by the engine with
+    `execo_engine.engine.Engine.start_sweeper_coordinator`, which
+    performs the storage operations of all its clients on its own
+    persistence directory, with either storage. Each operation of a
+    ParamSweeper (for example getting a batch of elements, or marking
+    a batch *done*) is then a few requests to the coordinator.
 
     """
 
-    def __init__(self, persistence_dir, sweeps = None, save_sweeps = False, name = None):
+    def __init__(self, persistence_dir, sweeps = None, save_sweeps = False, name = None, storage = None,
+                 lease_duration = None, coordinator = None, authkey = None):
         """
         :param persistence_dir: path to persistence directory. In this
-          directory will be created to python pickle files: ``done``
-          and ``inprogress`` This files can be erased if needed.
+          directory will be created the files of the storage: python
+          pickle files ``done`` and ``inprogress`` or a sqlite
+          database ``sweeps.sqlite``.
 
         :param sweeps: An iterable, what to iterate on. If None
-          (default), try to load it from ``persistence_dir``
+          (default), try to load it from ``persistence_dir``. If it is
+          a `execo_engine.sweep.LazySweep` (as returned by
+          `execo_engine.sweep.isweep`), it is not materialized:
+          remaining elements are enumerated lazily in its order, and
+          only the done, inprogress and skipped elements are kept in
+          memory.
 
         :param save_sweeps: boolean. default False. If True, the
           sweeps are written to disk during initialization (this may
@@ -276,37 +1636,63 @@ class ParamSweeper(object):
 
         :param name: a convenient name to identify an instance in
           logs. If None, compute one from persistence_dir.
+
+        :param storage: how states are stored in
+          ``persistence_dir``: ``"pickle"`` or ``"sqlite"``. If None
+          (default), use ``"sqlite"`` if a sqlite database already
+          exists in ``persistence_dir``, else ``"pickle"``.
+
+        :param lease_duration: if not None, duration in seconds of the
+          leases of the elements got by this ParamSweeper. They are
+          renewed every lease_duration / 3 seconds. If None (default),
+          elements are not leased.
+
+        :param coordinator: if not None, the address of a
+          `execo_engine.sweep.ParamSweeperCoordinator` (or the
+          coordinator itself), which stores the states instead of
+          ``persistence_dir`` (which is then ignored, and can be None)
+          and ``storage``.
+
+        :param authkey: the authentication key of the coordinator.
         """
         self.__lock = threading.RLock()
         self.__persistence_dir = persistence_dir
-        try:
-            os.makedirs(self.__persistence_dir)
-        except os.error:
-            pass
         self.__name = name
-        if not self.__name:
-            self.__name = os.path.basename(self.__persistence_dir)
+        if self.__persistence_dir != None:
+            try:
+                os.makedirs(self.__persistence_dir)
+            except os.error:
+                pass
+            if not self.__name:
+                self.__name = os.path.basename(self.__persistence_dir)
+        if coordinator != None:
+            if isinstance(coordinator, ParamSweeperCoordinator):
+                (coordinator, authkey) = (coordinator.address, coordinator.authkey)
+            if not self.__name:
+                self.__name = str(coordinator)
+            self.__storage = _RemoteStorage(coordinator, authkey)
+        else:
+            self.__storage = _open_storage(self.__persistence_dir, storage)
 
-        self.__done = set()
-        self.__inprogress = set()
         self.__skipped = set()
 
-        self.__filtered_done = set()
-        self.__filtered_inprogress = set()
-        self.__filtered_skipped = set()
+        self.__filtered_done = _CountingSet()
+        self.__filtered_inprogress = _CountingSet()
+        self.__filtered_skipped = _CountingSet()
         # __filtered_done, __filtered_inprogress, __filtered_skipped
-        # are the intersections of __sweeps and __done, __inprogress,
-        # __skipped. They exist because:
+        # are the intersections of __sweeps and the done, inprogress,
+        # __skipped states. They exist because:
         #
         # - client may call set_sweeps with different sweeps, still we
-        #   want to remember the complete list of __done,
-        #   __inprogress, __skipped
+        #   want to remember the complete list of done, inprogress,
+        #   __skipped (done and inprogress are remembered by the
+        #   storage)
         #
         # - different ParamSweeper instances may share the same
         #   storage though having different individual
-        #   __sweeps. __inprogress and __done on storage will be the
-        #   union of all inprogress and done, so the ParamSweeper must
-        #   be prepared to deal correctly with __inprogress and __done
+        #   __sweeps. inprogress and done on storage will be the union
+        #   of all inprogress and done, so the ParamSweeper must be
+        #   prepared to deal correctly with inprogress and done
         #   containing elements not in *its* __sweeps (and it must not
         #   discard them)
         #
@@ -320,12 +1706,41 @@ class ParamSweeper(object):
         #   when displaying or returning the lists, but it's a costly
         #   operation to do the full intersection, whereas doing it
         #   incrementaly is fast.
-
-        self.__remaining = set()
-        self.__done_filepos = None
+        #
+        # They are _CountingSet, as well as __remaining (if __sweeps
+        # is not a LazySweep), so that level_stats is fast.
+
+        self.__remaining = _CountingSet()
+        self.__total_level_counts = None
+        # level counts of __sweeps, if it is not a LazySweep
+
+        self.__score = None
+        self.__group = None
+        self.__heaps = None
+        # when an ordering is set, dict associating groups to heaps of
+        # entries (score, entry number, element) of remaining
+        # elements. Entries of elements which are not remaining
+        # anymore, or which have been pushed again, are discarded
+        # when popped.
+        self.__entries = dict()
+        # number of the valid entry of each element in __heaps
+        self.__ineligible = set()
+        # remaining elements whose score is None
+        self.__num_entries = 0
+        self.__current_group = None
+
+        self.__lease_duration = lease_duration
+        self.__owner = "%s:%i:%x" % (socket.gethostname(), os.getpid(), random.getrandbits(32))
 
         self.set_sweeps(sweeps, save_sweeps)
 
+        if self.__lease_duration != None:
+            heartbeat = threading.Thread(target = _renew_leases_loop,
+                                         args = (weakref.ref(self), self.__lease_duration / 3.0),
+                                         name = "%s leases heartbeat" % (self.__name,))
+            heartbeat.daemon = True
+            heartbeat.start()
+
     def set_sweeps(self, sweeps = None, save_sweeps = False):
         """Change the list of what to iterate on.
 
@@ -336,84 +1751,222 @@ class ParamSweeper(object):
         """
         with self.__lock:
             if sweeps:
-                self.__sweeps = set(sweeps)
+                if isinstance(sweeps, LazySweep):
+                    self.__sweeps = sweeps
+                else:
+                    self.__sweeps = set(sweeps)
                 if save_sweeps:
-                    with _openlock(os.path.join(self.__persistence_dir, "sweeps")) as sweeps_file:
-                        sweeps_file.truncate(0)
-                        pickle.dump(self.__sweeps, sweeps_file)
+                    self.__storage.save_sweeps(self.__sweeps)
             else:
-                with _openlock(os.path.join(self.__persistence_dir, "sweeps")) as sweeps_file:
-                    sweeps_file.seek(0, os.SEEK_SET)
-                    self.__sweeps = pickle.load(sweeps_file)
+                self.__sweeps = self.__storage.load_sweeps()
+            self.__total_level_counts = None
             self.full_update()
 
-    def __nolock_full_update(self, done_file, inprogress_file):
-        self.__done.clear()
-        self.__done_filepos = 0
-        done_file.seek(0, os.SEEK_SET)
-        while True:
-            try:
-                self.__done.add(pickle.load(done_file))
-                self.__done_filepos = done_file.tell()
-            except:
-                done_file.truncate(self.__done_filepos)
-                break
-        inprogress_file.seek(0, os.SEEK_SET)
-        try:
-            self.__inprogress = pickle.load(inprogress_file)
-        except:
-            inprogress_file.truncate(0)
-            self.__inprogress.clear()
-        self.__remaining = set(self.__sweeps).difference(self.__done, self.__skipped, self.__inprogress)
-        self.__filtered_done = self.__done.intersection(self.__sweeps)
-        self.__filtered_inprogress = self.__inprogress.intersection(self.__sweeps)
-        self.__filtered_skipped = self.__skipped.intersection(self.__sweeps)
+    def __nolock_in_sweeps(self, elements):
+        # return the set of elements which are in __sweeps
+        if isinstance(self.__sweeps, LazySweep):
+            return set([ element for element in elements if element in self.__sweeps ])
+        return set(elements).intersection(self.__sweeps)
+
+    def __nolock_full_update(self):
+        (done, inprogress) = self.__storage.full_load(self.__sweeps)
+        inprogress.difference_update(self.__storage.expire(time.time()))
+        if isinstance(self.__sweeps, LazySweep):
+            self.__remaining = _LazyRemaining(self.__sweeps)
+            self.__remaining.difference_update(done)
+            self.__remaining.difference_update(self.__skipped)
+            self.__remaining.difference_update(inprogress)
+        else:
+            self.__remaining = _CountingSet(self.__sweeps.difference(done, self.__skipped, inprogress))
+        self.__filtered_done = _CountingSet(done)
+        self.__filtered_inprogress = _CountingSet(inprogress)
+        self.__filtered_skipped = _CountingSet(self.__nolock_in_sweeps(self.__skipped))
+        self.__nolock_rebuild_heaps()
 
     def full_update(self):
         """Reload completely the ParamSweeper state from disk (may take some time)."""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_full_update(done_file, inprogress_file)
-
-    def __nolock_update(self, done_file, inprogress_file):
-        done_file.seek(0, os.SEEK_END)
-        new_done_filepos = done_file.tell()
-        if new_done_filepos >= self.__done_filepos:
-            if new_done_filepos > self.__done_filepos:
-                done_file.seek(self.__done_filepos, os.SEEK_SET)
-                new_done = list()
-                while True:
-                    try:
-                        new_done.append(pickle.load(done_file))
-                        self.__done_filepos = done_file.tell()
-                    except:
-                        done_file.truncate(self.__done_filepos)
-                        break
-                self.__done.update(new_done)
-                self.__remaining.difference_update(new_done)
-                self.__filtered_done.update(set(new_done).intersection(self.__sweeps))
-            inprogress_file.seek(0, os.SEEK_SET)
-            try:
-                self.__inprogress = pickle.load(inprogress_file)
-            except:
-                inprogress_file.truncate(0)
-                self.__inprogress.clear()
-            self.__remaining.difference_update(self.__inprogress)
-            self.__filtered_inprogress.intersection_update(self.__inprogress)
-        else:
-            self.__nolock_full_update(done_file, inprogress_file)
+            with self.__storage:
+                self.__nolock_full_update()
+
+    def __nolock_update(self):
+        changes = self.__storage.update()
+        if changes == None:
+            self.__nolock_full_update()
+            return
+        (new_done, added_inprogress, removed_inprogress) = changes
+        expired = self.__storage.expire(time.time())
+        if len(expired) > 0:
+            logger.trace("%s expired leases: %s", self.__name, expired)
+            added_inprogress.difference_update(expired)
+            removed_inprogress.update(expired)
+        self.__remaining.difference_update(new_done)
+        self.__filtered_done.update(self.__nolock_in_sweeps(new_done))
+        self.__remaining.difference_update(added_inprogress)
+        self.__filtered_inprogress.difference_update(removed_inprogress)
+        self.__filtered_inprogress.update(self.__nolock_in_sweeps(added_inprogress))
+        # elements canceled, or whose lease expired, come back in
+        # todo, as after a full update
+        back_todo = [ element for element in self.__nolock_in_sweeps(removed_inprogress)
+                      if element not in self.__filtered_done
+                      and element not in self.__filtered_inprogress
+                      and element not in self.__skipped ]
+        self.__remaining.update(back_todo)
+        self.__nolock_push(back_todo)
 
     def update(self):
         """Update incrementaly the ParamSweeper state from disk
 
         fast, except if done file has been truncated or deleted. In
-        this case, will trigger a full_reload.
+        this case, will trigger a full_reload. Elements whose lease has
+        expired come back in the *todo* state.
+        """
+        with self.__lock:
+            with self.__storage:
+                self.__nolock_update()
+
+    def __nolock_lease(self):
+        if self.__lease_duration == None:
+            return None
+        return (self.__owner, socket.gethostname(), os.getpid(), time.time() + self.__lease_duration)
+
+    def _renew_leases(self):
+        # called by the heartbeat thread. The storage must be synced
+        # before writing to it, else records written by other
+        # ParamSweepers since the last update would be skipped (or
+        # erased if the storage compacts its state)
+        with self.__lock:
+            with self.__storage:
+                self.__nolock_update()
+                self.__storage.renew(self.__owner, time.time() + self.__lease_duration)
+
+    def get_leases(self):
+        """Return a dict associating the leased *inprogress* elements to their lease.
+
+        Leases are tuples (owner id, host, pid, deadline), deadline
+        being a unix timestamp.
+        """
+        with self.__lock:
+            with self.__storage:
+                self.__nolock_update()
+                leases = self.__storage.get_leases()
+            return dict([ (element, lease) for (element, lease) in leases.items()
+                          if element in self.__filtered_inprogress ])
+
+    def __nolock_push(self, elements):
+        # (re)compute the score of elements and push them in __heaps
+        if self.__heaps == None:
+            return
+        for element in elements:
+            self.__entries.pop(element, None)
+            self.__ineligible.discard(element)
+            score = self.__score(element)
+            if score == None:
+                self.__ineligible.add(element)
+                continue
+            if self.__group:
+                group = self.__group(element)
+            else:
+                group = None
+            self.__num_entries += 1
+            self.__entries[element] = self.__num_entries
+            heapq.heappush(self.__heaps.setdefault(group, []), (score, self.__num_entries, element))
+
+    def __nolock_rebuild_heaps(self):
+        if self.__heaps == None:
+            return
+        self.__heaps = dict()
+        self.__entries = dict()
+        self.__ineligible = set()
+        self.__nolock_push(self.__remaining)
+
+    def __nolock_is_valid_entry(self, entry):
+        (score, num, element) = entry
+        return self.__entries.get(element) == num and element in self.__remaining
+
+    def __nolock_pop(self, num_elements):
+        # pop up to num_elements elements from __heaps, in the current
+        # group first, then in the group of the best scored element
+        elements = []
+        while len(elements) < num_elements:
+            heap = self.__heaps.get(self.__current_group)
+            if not heap:
+                best_group = None
+                for (group, heap) in list(self.__heaps.items()):
+                    while heap and not self.__nolock_is_valid_entry(heap[0]):
+                        heapq.heappop(heap)
+                    if not heap:
+                        del self.__heaps[group]
+                    elif best_group == None or heap[0] < self.__heaps[best_group][0]:
+                        best_group = group
+                if best_group == None:
+                    break
+                self.__current_group = best_group
+                heap = self.__heaps[best_group]
+            entry = heapq.heappop(heap)
+            if self.__nolock_is_valid_entry(entry):
+                del self.__entries[entry[2]]
+                elements.append(entry[2])
+        return elements
+
+    def set_ordering(self, score = None, group = None):
+        """Set the order in which `execo_engine.sweep.ParamSweeper.get_next` and `execo_engine.sweep.ParamSweeper.get_next_batch` return elements.
+
+        Remaining elements are kept in priority queues, so that
+        getting an element is O(log n). This materializes the
+        remaining elements, even if the sweeps are a
+        `execo_engine.sweep.LazySweep`. The ordering is not used when
+        a ``filtr`` is given to get_next or get_next_batch.
+
+        :param score: function taking an element and returning its
+          score. Elements with the lowest score are returned first.
+          If the score is None, the element is not returned until it
+          is given a score with
+          `execo_engine.sweep.ParamSweeper.reprioritize`. Scores of
+          elements are computed once, they are recomputed only by
+          `execo_engine.sweep.ParamSweeper.reprioritize`. If both
+          score and group are None (default), the order is
+          arbitrary.
+
+        :param group: function taking an element and returning its
+          group (for example the cluster or the deployed environment
+          it needs). If given, elements of the same group as the
+          previously returned element are returned first (by order
+          of score), so as to minimize the reconfigurations between
+          successive elements. When there are no more elements in the
+          current group, the group of the best scored element becomes
+          the current group.
+
+        Scores can be adapted to results: for example
+        `execo_engine.sweep.SuccessiveHalving` gives the scores of an
+        asynchronous successive halving.
+        """
+        with self.__lock:
+            if score == None and group == None:
+                self.__score = None
+                self.__group = None
+                self.__heaps = None
+                self.__entries = dict()
+                self.__ineligible = set()
+            else:
+                if score == None:
+                    score = lambda element: 0
+                self.__score = score
+                self.__group = group
+                self.__heaps = dict()
+                self.__nolock_rebuild_heaps()
+
+    def reprioritize(self, elements = None):
+        """Recompute the scores of the given remaining elements (all remaining elements if None), after they have changed.
+
+        Only meaningful if a score function was given to
+        `execo_engine.sweep.ParamSweeper.set_ordering`.
         """
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
+            if elements == None:
+                self.__nolock_rebuild_heaps()
+            else:
+                self.__nolock_push([ element for element in elements if element in self.__remaining ])
 
     def __str__(self):
         with self.__lock:
@@ -427,6 +1980,8 @@ class ParamSweeper(object):
 
     def get_sweeps(self):
         """Returns the iterable of what to iterate on"""
+        if isinstance(self.__sweeps, LazySweep):
+            return self.__sweeps
         return self.__sweeps.copy()
 
     def get_skipped(self):
@@ -441,7 +1996,9 @@ class ParamSweeper(object):
         """returns an iterable of current remaining *todo* elements
 
         The returned iterable is a copy (safe to use without fearing
-        concurrent mutations by another thread).
+        concurrent mutations by another thread). If the sweeps are a
+        `execo_engine.sweep.LazySweep`, this materializes the
+        remaining elements.
         """
         return self.__remaining.copy()
 
@@ -470,23 +2027,23 @@ class ParamSweeper(object):
           combinations and / or control the order of iteration.
         """
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                if self.__heaps != None and not filtr:
+                    remaining = self.__nolock_pop(1)
+                else:
                     remaining = self.__remaining
                     if filtr:
                         remaining = filtr(remaining)
-                    try:
-                        combination = next(iter(remaining))
-                    except StopIteration:
-                        logger.trace("%s no new combination", self.__name)
-                        logger.trace(self)
-                        return None
-                    self.__remaining.discard(combination)
-                    self.__inprogress.add(combination)
-                    self.__filtered_inprogress.add(combination)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+                try:
+                    combination = next(iter(remaining))
+                except StopIteration:
+                    logger.trace("%s no new combination", self.__name)
+                    logger.trace(self)
+                    return None
+                self.__remaining.discard(combination)
+                self.__filtered_inprogress.add(combination)
+                self.__storage.add_inprogress([combination], self.__nolock_lease())
             logger.trace("%s new combination: %s", self.__name, combination)
             logger.trace(self)
             return combination
@@ -506,26 +2063,27 @@ class ParamSweeper(object):
         """
         combinations = []
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                if self.__heaps != None and not filtr:
+                    remaining = self.__nolock_pop(num_combs)
+                else:
                     remaining = self.__remaining
                     if filtr:
                         remaining = filtr(remaining)
-                    try:
-                        for i in remaining:
-                            if num_combs <= 0:
-                                break
-                            combinations.append(i)
-                            num_combs -= 1
-                    except StopIteration:
-                        logger.trace("%s no new combination", self.__name)
-                        logger.trace(self)
-                    self.__remaining.difference_update(combinations)
-                    self.__inprogress.update(combinations)
-                    self.__filtered_inprogress.update(combinations)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+                try:
+                    for i in remaining:
+                        if num_combs <= 0:
+                            break
+                        combinations.append(i)
+                        num_combs -= 1
+                except StopIteration:
+                    logger.trace("%s no new combination", self.__name)
+                    logger.trace(self)
+                self.__remaining.difference_update(combinations)
+                self.__filtered_inprogress.update(combinations)
+                if len(combinations) > 0:
+                    self.__storage.add_inprogress(combinations, self.__nolock_lease())
             logger.trace("%s new combinations: %s", self.__name, combinations)
             logger.trace(self)
             return combinations
@@ -533,104 +2091,78 @@ class ParamSweeper(object):
     def done(self, combination):
         """mark the given element *done*"""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    self.__remaining.discard(combination)
-                    self.__inprogress.discard(combination)
-                    self.__filtered_inprogress.discard(combination)
-                    self.__done.add(combination)
-                    if combination in self.__sweeps:
-                        self.__filtered_done.add(combination)
-                    done_file.seek(0, os.SEEK_END)
-                    pickle.dump(combination, done_file)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                self.__remaining.discard(combination)
+                self.__filtered_inprogress.discard(combination)
+                if combination in self.__sweeps:
+                    self.__filtered_done.add(combination)
+                self.__storage.add_done([combination])
             logger.trace("%s combination done: %s", self.__name, combination)
             logger.trace(self)
 
     def done_batch(self, combinations):
         """mark the given element(s) *done*"""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    self.__remaining.difference_update(combinations)
-                    self.__inprogress.difference_update(combinations)
-                    self.__filtered_inprogress.difference_update(combinations)
-                    self.__done.update(combinations)
-                    filtered_combinations = set(combinations)
-                    filtered_combinations.intersection_update(self.__sweeps)
-                    self.__filtered_done.update(filtered_combinations)
-                    done_file.seek(0, os.SEEK_END)
-                    for combination in combinations:
-                        pickle.dump(combination, done_file)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                self.__remaining.difference_update(combinations)
+                self.__filtered_inprogress.difference_update(combinations)
+                filtered_combinations = self.__nolock_in_sweeps(combinations)
+                self.__filtered_done.update(filtered_combinations)
+                self.__storage.add_done(combinations)
             logger.trace("%s combinations done: %s", self.__name, combinations)
             logger.trace(self)
 
     def skip(self, combination):
         """mark the given element *skipped*"""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    self.__skipped.add(combination)
-                    if combination in self.__sweeps:
-                        self.__filtered_skipped.add(combination)
-                    self.__inprogress.discard(combination)
-                    self.__filtered_inprogress.discard(combination)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                self.__skipped.add(combination)
+                if combination in self.__sweeps:
+                    self.__filtered_skipped.add(combination)
+                self.__filtered_inprogress.discard(combination)
+                self.__storage.remove_inprogress([combination])
             logger.trace("%s combination skipped: %s", self.__name, combination)
             logger.trace(self)
 
     def skip_batch(self, combinations):
         """mark the given element(s) *skipped*"""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    self.__skipped.update(combinations)
-                    filtered_combinations = set(combinations)
-                    filtered_combinations.intersection_update(self.__sweeps)
-                    self.__filtered_skipped.update(filtered_combinations)
-                    self.__inprogress.difference_update(combinations)
-                    self.__filtered_inprogress.difference_update(combinations)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                self.__skipped.update(combinations)
+                filtered_combinations = self.__nolock_in_sweeps(combinations)
+                self.__filtered_skipped.update(filtered_combinations)
+                self.__filtered_inprogress.difference_update(combinations)
+                self.__storage.remove_inprogress(combinations)
             logger.trace("%s combinations skipped: %s", self.__name, combinations)
             logger.trace(self)
 
     def cancel(self, combination):
         """cancel processing of the given combination, but don't mark it as skipped, it comes back in the *todo* queue."""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    if combination in self.__sweeps:
-                        self.__remaining.add(combination)
-                    self.__inprogress.discard(combination)
-                    self.__filtered_inprogress.discard(combination)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                if combination in self.__sweeps:
+                    self.__remaining.add(combination)
+                    self.__nolock_push([combination])
+                self.__filtered_inprogress.discard(combination)
+                self.__storage.remove_inprogress([combination])
             logger.trace("%s combination cancelled: %s", self.__name, combination)
             logger.trace(self)
 
     def cancel_batch(self, combinations):
         """cancel processing of the given combination(s), but don't mark it/them as skipped, they comes back in the *todo* queue."""
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    filtered_combinations = set(combinations)
-                    filtered_combinations.intersection_update(self.__sweeps)
-                    self.__remaining.update(filtered_combinations)
-                    self.__inprogress.difference_update(combinations)
-                    self.__filtered_inprogress.difference_update(combinations)
-                    inprogress_file.truncate(0)
-                    pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                filtered_combinations = self.__nolock_in_sweeps(combinations)
+                self.__remaining.update(filtered_combinations)
+                self.__nolock_push(filtered_combinations)
+                self.__filtered_inprogress.difference_update(combinations)
+                self.__storage.remove_inprogress(combinations)
             logger.trace("%s combinations cancelled: %s", self.__name, combinations)
             logger.trace(self)
 
@@ -641,17 +2173,15 @@ class ParamSweeper(object):
           *inprogress* is also reset.
         """
         with self.__lock:
-            with _openlock(os.path.join(self.__persistence_dir, "done")) as done_file:
-                with _openlock(os.path.join(self.__persistence_dir, "inprogress")) as inprogress_file:
-                    self.__nolock_update(done_file, inprogress_file)
-                    self.__remaining.update(self.__filtered_skipped)
-                    self.__skipped.clear()
-                    self.__filtered_skipped.clear()
-                    if reset_inprogress:
-                        self.__inprogress.clear()
-                        self.__filtered_inprogress.clear()
-                        inprogress_file.truncate(0)
-                        pickle.dump(self.__inprogress, inprogress_file)
+            with self.__storage:
+                self.__nolock_update()
+                self.__remaining.update(self.__filtered_skipped)
+                self.__nolock_push(self.__filtered_skipped)
+                self.__skipped.clear()
+                self.__filtered_skipped.clear()
+                if reset_inprogress:
+                    self.__filtered_inprogress.clear()
+                    self.__storage.reset_inprogress()
             logger.trace("%s reset", self.__name)
             logger.trace(self)
 
@@ -669,68 +2199,368 @@ class ParamSweeper(object):
                     inprogress,
                     done)
 
-def sweep_stats(stats):
-    """taking stats tuple returned by `execo_engine.sweep.ParamSweeper.stats`, and if the ParamSweeper sweeps are in the format output by `execo_engine.sweep.sweep`, returns a dict detailing number and ratios of remaining, skipped, done, inprogress combinations per combination parameter value."""
+    def level_stats(self):
+        """Return the same dict as ``sweep_stats(self.stats())``, without copying nor iterating over the elements.
+
+        The numbers of elements per factor level of each state are
+        counted at the first call (or at the first call after a
+        `execo_engine.sweep.ParamSweeper.full_update`), then
+        maintained incrementally at each state transition, so that
+        subsequent calls only take a time proportional to the number
+        of factor levels. If the sweeps are a
+        `execo_engine.sweep.LazySweep`, the elements are never
+        iterated over.
+        """
+        with self.__lock:
+            if isinstance(self.__sweeps, LazySweep):
+                total = self.__sweeps._level_counts()
+            else:
+                if self.__total_level_counts == None:
+                    self.__total_level_counts = dict()
+                    _add_level_counts(self.__total_level_counts, self.__sweeps)
+                total = self.__total_level_counts
+            return _level_stats(total,
+                                self.__remaining.level_counts(),
+                                self.__filtered_skipped.level_counts(),
+                                self.__filtered_inprogress.level_counts(),
+                                self.__filtered_done.level_counts())
+
+def _is_local_address(address):
+    # True if address, as accepted by multiprocessing.connection, is
+    # only reachable from the local host: a Unix socket (or windows
+    # pipe), or a loopback interface
+    if not isinstance(address, tuple):
+        return True
+    host = address[0]
+    if host in ("::1", "localhost"):
+        return True
+    try:
+        return socket.gethostbyname(host).startswith("127.")
+    except socket.error:
+        return False
 
-    def count(combs):
-        counts = dict()
-        for comb in combs:
-            for k in comb:
-                if k not in counts:
-                    counts[k] = dict()
-                if comb[k] not in counts[k]:
-                    counts[k][comb[k]] = 0
-                counts[k][comb[k]] += 1
-        return counts
+def _write_authkey(filename):
+    # generate a random authentication key and write it to filename,
+    # readable only by its owner. Returns the key.
+    authkey = hashlib.sha256(os.urandom(32)).hexdigest().encode("ascii")
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+    return authkey
+
+class ParamSweeperCoordinator(object):
+
+    """Server of the states of `execo_engine.sweep.ParamSweeper` instances which do not share a persistence directory.
+
+    The coordinator serves requests from ParamSweepers given its
+    address (``coordinator`` constructor argument), over TCP or a Unix
+    socket. It performs their storage operations on its persistence
+    directory, in the same formats as a local ParamSweeper (which thus
+    stay the durable log of the states: a ParamSweeper or another
+    coordinator can later use the persistence directory directly).
+    Operations of all clients are serialized, each client keeping its
+    own incremental view of the states, as if it were a local
+    ParamSweeper.
+
+    Requests and responses are pickled, so that anyone able to
+    connect can run code in the coordinator process. Clients are
+    thus always authenticated with an ``authkey`` when the
+    coordinator listens on a non loopback interface: if none is
+    given, a random one is generated and written to the file
+    ``authkey`` (readable only by its owner) of the persistence
+    directory, from where it has to be handed to the clients.
+
+    Usage::
+
+      coordinator = ParamSweeperCoordinator(os.path.join(result_dir, "sweeps"),
+                                            ("", 7700))
+      coordinator.start()
+      # coordinator.authkey is also in result_dir/sweeps/authkey
+      [...]
+      # on any host:
+      sweeper = ParamSweeper(None, sweeps, coordinator = ("frontend", 7700),
+                             authkey = authkey, lease_duration = 600)
+      [...]
+      coordinator.stop()
+    """
 
-    (sweeps,
-     remaining,
-     skipped,
-     inprogress,
-     done) = stats
-    ctotal = count(sweeps)
-    cremaining = count(remaining)
-    cskipped = count(skipped)
-    cinprogress = count(inprogress)
-    cdone = count(done)
-    remaining_ratio = dict()
-    skipped_ratio = dict()
-    inprogress_ratio = dict()
-    done_ratio = dict()
-    for k1 in ctotal:
-        remaining_ratio[k1] = dict()
-        skipped_ratio[k1] = dict()
-        inprogress_ratio[k1] = dict()
-        done_ratio[k1] = dict()
-        for k2 in ctotal[k1]:
-            if k1 in cremaining and k2 in cremaining[k1]:
-                r = cremaining[k1][k2]
-            else:
-                r = 0
-            remaining_ratio[k1][k2] = float(r) / float(ctotal[k1][k2])
-            if k1 in cskipped and k2 in cskipped[k1]:
-                s = cskipped[k1][k2]
-            else:
-                s = 0
-            skipped_ratio[k1][k2] = float(s) / float(ctotal[k1][k2])
-            if k1 in cinprogress and k2 in cinprogress[k1]:
-                i = cinprogress[k1][k2]
-            else:
-                i = 0
-            inprogress_ratio[k1][k2] = float(i) / float(ctotal[k1][k2])
-            if k1 in cdone and k2 in cdone[k1]:
-                d = cdone[k1][k2]
-            else:
-                d = 0
-            done_ratio[k1][k2] = float(d) / float(ctotal[k1][k2])
-    return {
-        "total": ctotal,
-        "remaining": cremaining,
-        "remaining_ratio": remaining_ratio,
-        "skipped": cskipped,
-        "skipped_ratio": skipped_ratio,
-        "inprogress": cinprogress,
-        "inprogress_ratio": inprogress_ratio,
-        "done": cdone,
-        "done_ratio": done_ratio
-        }
+    def __init__(self, persistence_dir, address = ("localhost", 0), authkey = None, storage = None):
+        """
+        :param persistence_dir: path to the persistence directory, as
+          for `execo_engine.sweep.ParamSweeper`.
+
+        :param address: address to listen on: a tuple (host, port)
+          for TCP (port 0, the default, selects a free port), or the
+          path of a Unix socket. The actual address is available in
+          `execo_engine.sweep.ParamSweeperCoordinator.address` once
+          started.
+
+        :param authkey: authentication key (bytes) that clients must
+          give. If None (default), clients are not authenticated when
+          listening on the loopback interface or on a Unix socket, and
+          otherwise a key is generated (see above).
+
+        :param storage: how states are stored in ``persistence_dir``,
+          as for `execo_engine.sweep.ParamSweeper`.
+        """
+        self.__persistence_dir = persistence_dir
+        try:
+            os.makedirs(self.__persistence_dir)
+        except os.error:
+            pass
+        if storage != None and storage not in _storages:
+            raise ValueError("unknown ParamSweeper storage %r" % (storage,))
+        self.__storage = storage
+        self.__requested_address = address
+        self.__lock = threading.Lock()
+        # serializes the storage operations of all clients
+        self.__listener = None
+        self.__connections = set()
+        self.__stopped = False
+        self.address = None
+        """The address the coordinator listens on, once started."""
+        if authkey == None and not _is_local_address(address):
+            authkey = _write_authkey(os.path.join(self.__persistence_dir, "authkey"))
+        self.authkey = authkey
+        """The authentication key of the coordinator."""
+
+    def __str__(self):
+        return "<ParamSweeperCoordinator %s at %s>" % (self.__persistence_dir, self.address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, t, v, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        """Start serving requests, in background threads. Returns self."""
+        self.__stopped = False
+        self.__listener = multiprocessing.connection.Listener(self.__requested_address, backlog = 64,
+                                                               authkey = self.authkey)
+        self.address = self.__listener.address
+        accept_thread = threading.Thread(target = self.__accept_loop,
+                                         name = "%s accept" % (self,))
+        accept_thread.daemon = True
+        accept_thread.start()
+        logger.debug("%s started", self)
+        return self
+
+    def stop(self):
+        """Stop serving requests, and close client connections."""
+        if self.__listener == None or self.__stopped:
+            return
+        self.__stopped = True
+        # wake up the accept thread
+        try:
+            multiprocessing.connection.Client(self.address, authkey = self.authkey).close()
+        except Exception:
+            pass
+        self.__listener.close()
+        family = multiprocessing.connection.address_type(self.address)
+        for connection in list(self.__connections):
+            try:
+                s = socket.fromfd(connection.fileno(), getattr(socket, family), socket.SOCK_STREAM)
+                s.shutdown(socket.SHUT_RDWR)
+                s.close()
+            except Exception:
+                pass
+        logger.debug("%s stopped", self)
+
+    def __accept_loop(self):
+        while not self.__stopped:
+            try:
+                connection = self.__listener.accept()
+            except Exception as e:
+                if not self.__stopped:
+                    logger.debug("%s: client rejected: %s", self, e)
+                continue
+            if self.__stopped:
+                connection.close()
+                return
+            self.__connections.add(connection)
+            serve_thread = threading.Thread(target = self.__serve, args = (connection,),
+                                            name = "%s client" % (self,))
+            serve_thread.daemon = True
+            serve_thread.start()
+
+    def __serve(self, connection):
+        # serve the requests of a client: ("enter",) and ("exit",
+        # error) enter / exit the storage with the coordinator lock
+        # held, ("call", method, args) calls a storage method. The
+        # response is ("ok", result) or ("error", exception).
+        entered = False
+        try:
+            storage = _open_storage(self.__persistence_dir, self.__storage)
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, IOError, OSError):
+                    break
+                try:
+                    if request[0] == "enter":
+                        self.__lock.acquire()
+                        try:
+                            storage.__enter__()
+                        except:
+                            self.__lock.release()
+                            raise
+                        entered = True
+                        result = None
+                    elif request[0] == "exit":
+                        entered = False
+                        try:
+                            if request[1]:
+                                storage.__exit__(RuntimeError, RuntimeError("client error"), None)
+                            else:
+                                storage.__exit__(None, None, None)
+                        finally:
+                            self.__lock.release()
+                        result = None
+                    elif request[0] == "call" and request[1] in _remote_storage_methods:
+                        if entered:
+                            result = getattr(storage, request[1])(*request[2])
+                        else:
+                            with self.__lock:
+                                result = getattr(storage, request[1])(*request[2])
+                    else:
+                        raise ValueError("invalid request %r" % (request[:2],))
+                    response = ("ok", result)
+                except Exception as e:
+                    response = ("error", e)
+                try:
+                    connection.send(response)
+                except (IOError, OSError):
+                    break
+                except Exception as e:
+                    connection.send(("error", RuntimeError("%s: %s" % (self, e))))
+        finally:
+            if entered:
+                try:
+                    storage.__exit__(RuntimeError, RuntimeError("client disconnected"), None)
+                finally:
+                    self.__lock.release()
+            self.__connections.discard(connection)
+            connection.close()
+
+def _renew_leases_loop(sweeper_ref, interval):
+    # heartbeat thread of a ParamSweeper with leases. It only keeps a
+    # weak reference to the ParamSweeper, and exits when it is
+    # garbage collected.
+    while True:
+        time.sleep(interval)
+        sweeper = sweeper_ref()
+        if sweeper == None:
+            return
+        try:
+            sweeper._renew_leases()
+        except Exception as e:
+            logger.warning("%s: error renewing leases: %s", sweeper, e)
+        del sweeper
+
+class SuccessiveHalving(object):
+
+    """Asynchronous successive halving scores, for `execo_engine.sweep.ParamSweeper.set_ordering`.
+
+    The elements of the sweeps must be combinations having a budget
+    factor (for example a number of iterations, a duration, a data
+    size), whose levels are increasing budgets. A configuration is a
+    combination without its budget factor. The combinations with the
+    lowest budget are eligible first. Results are reported with
+    `execo_engine.sweep.SuccessiveHalving.report`, and a
+    configuration becomes eligible for the next budget when its
+    result is among the best 1/eta of the results reported for its
+    current budget (*L. Li et al., A System for Massively Parallel
+    Hyperparameter Tuning, MLSys 2020*). Eligible combinations with
+    higher budgets are returned first.
+
+    Usage::
+
+      sh = SuccessiveHalving("iterations", [1, 3, 9, 27])
+      sweeper.set_ordering(score = sh.score)
+      combination = sweeper.get_next()
+      result = run_experiment(combination)
+      sweeper.done(combination)
+      sweeper.reprioritize(sh.report(combination, result))
+
+    Combinations of configurations which are never promoted stay
+    *todo* but are never returned.
+    """
+
+    def __init__(self, budget_factor, budgets, eta = 3, minimize = True):
+        """
+        :param budget_factor: the factor of the combinations which
+          is the budget
+
+        :param budgets: the list of increasing budgets (levels of the
+          budget factor)
+
+        :param eta: the inverse of the proportion of configurations
+          promoted to the next budget
+
+        :param minimize: if True (default), best results are the
+          lowest, else the highest
+        """
+        self.__lock = threading.RLock()
+        self.__budget_factor = budget_factor
+        self.__budgets = list(budgets)
+        self.__eta = eta
+        self.__minimize = minimize
+        self.__results = [ dict() for budget in self.__budgets ]
+        # for each budget, dict associating configurations to results
+        self.__promoted = [ set() for budget in self.__budgets ]
+        # for each budget, configurations promoted to this budget
+
+    def __get_configuration(self, combination):
+        return Combination([ (k, v) for (k, v) in combination.items() if k != self.__budget_factor ])
+
+    def score(self, combination):
+        """Return the score of a combination: minus its budget index if it is eligible, else None."""
+        with self.__lock:
+            rung = self.__budgets.index(combination[self.__budget_factor])
+            if rung > 0 and self.__get_configuration(combination) not in self.__promoted[rung]:
+                return None
+            return -rung
+
+    def report(self, combination, result):
+        """Report the result of a combination.
+
+        Returns the list of the combinations which became eligible,
+        to be given to `execo_engine.sweep.ParamSweeper.reprioritize`.
+        """
+        with self.__lock:
+            rung = self.__budgets.index(combination[self.__budget_factor])
+            self.__results[rung][self.__get_configuration(combination)] = result
+            if rung + 1 >= len(self.__budgets):
+                return []
+            ranked = sorted(self.__results[rung].items(),
+                            key = lambda item: item[1],
+                            reverse = not self.__minimize)
+            eligible = []
+            for (configuration, result) in ranked[:len(ranked) // self.__eta]:
+                if configuration not in self.__promoted[rung + 1]:
+                    self.__promoted[rung + 1].add(configuration)
+                    next_combination = configuration.copy()
+                    next_combination[self.__budget_factor] = self.__budgets[rung + 1]
+                    eligible.append(HashableDict(next_combination))
+            return eligible
+
+def sweep_stats(stats):
+    """taking stats tuple returned by `execo_engine.sweep.ParamSweeper.stats`, and if the ParamSweeper sweeps are in the format output by `execo_engine.sweep.sweep`, returns a dict detailing number and ratios of remaining, skipped, done, inprogress combinations per combination parameter value.
+
+    `execo_engine.sweep.ParamSweeper.level_stats` returns the same
+    dict much faster, from counters maintained by the ParamSweeper.
+    """
+    counts = []
+    for elements in stats:
+        if isinstance(elements, LazySweep):
+            counts.append(elements._level_counts())
+        else:
+            counts.append(dict())
+            _add_level_counts(counts[-1], elements)
+    return _level_stats(*counts)
@@ -0,0 +1,453 @@
+# Copyright 2009-2016 INRIA Rhone-Alpes, Service Experimentation et
+# Developpement
+#
+# This file is part of Execo.
+#
+# Execo is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Execo is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Execo.  If not, see <http://www.gnu.org/licenses/>
+
+import threading, os, sys, time, struct, array, hashlib
+if sys.version_info >= (3,):
+    import pickle
+else:
+    import cPickle as pickle
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from execo.action import TaktukRemote
+from .log import logger
+from .utils import slugify
+
+_default_tiers = ((1, 6 * 3600), (60, 7 * 1440), (3600, 365 * 24))
+# default tiers of TimeSeriesStore: tuples (period in seconds,
+# capacity in records): 6 hours at 1 second, one week at 1 minute,
+# one year at 1 hour
+
+_record = struct.Struct("=dd")
+# records of the ring files: timestamp (0 for an empty record), value
+
+def _write_pickle(filename, obj):
+    # atomically replace filename with obj pickled
+    tmp_filename = "%s.%i.tmp" % (filename, os.getpid())
+    with open(tmp_filename, "wb") as f:
+        pickle.dump(obj, f, 2)
+    os.rename(tmp_filename, filename)
+
+def _read_pickle(filename, default):
+    try:
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    except (IOError, OSError):
+        return default
+
+class TimeSeriesStore(object):
+
+    """Persistent, fixed size, store of time series, with downsampling tiers.
+
+    A series, identified by a string key (for example
+    ``"<host>/<metric>"``), is stored in one ring file per tier. A
+    tier is a tuple (period, capacity): its ring file has capacity
+    records, the record of a timestamp t being at index ``int(t //
+    period) % capacity``, so that each ring file keeps the last
+    ``period * capacity`` seconds of the series, with one record per
+    period, and never grows. The first tier stores the points
+    appended (with the period of the series: a point overwrites a
+    previous point of the same period), the next tiers store the
+    mean of the points of each of their periods, computed as the
+    points are appended. The state of these computations is
+    persisted with the watermarks, and when flushing or closing the
+    store, so that a store reopened on the same directory continues
+    the means of the current periods instead of overwriting them.
+
+    Several processes must not append to the same store
+    concurrently, but any process can read it. TimeSeriesStores are
+    thread-safe.
+
+    Usage::
+
+      store = TimeSeriesStore(os.path.join(self.result_dir, "metrics"))
+      store.append("griffon-1/power", [ (1500000000, 153.2), (1500000001, 154.0) ])
+      [...]
+      store.close()
+      # later, for analysis:
+      store = TimeSeriesStore(result_dir + "/metrics")
+      points = store.get("griffon-1/power", tier = 1)
+    """
+
+    def __init__(self, directory, tiers = _default_tiers):
+        """
+        :param directory: the directory of the store, created if
+          needed.
+
+        :param tiers: list of tuples (period in seconds, capacity in
+          records), by increasing periods. The tiers of an existing
+          store must not be changed.
+        """
+        self.__directory = directory
+        try:
+            os.makedirs(self.__directory)
+        except os.error:
+            pass
+        self.tiers = [ (float(period), int(capacity)) for (period, capacity) in tiers ]
+        """the list of tuples (period, capacity) of the tiers"""
+        self.__lock = threading.RLock()
+        self.__keys = _read_pickle(os.path.join(self.__directory, "keys"), set())
+        (self.__watermarks, self.__buckets) = _read_pickle(os.path.join(self.__directory, "state"),
+                                                           (dict(), dict()))
+        # __buckets associates tuples (key, tier index) to the current
+        # bucket [ bucket index, sum of values, number of values ] of
+        # downsampled tiers
+
+    def __str__(self):
+        return "<TimeSeriesStore %s>" % (self.__directory,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, traceback):
+        self.close()
+        return False
+
+    def __filename(self, key, tier):
+        return os.path.join(self.__directory, "%s-%s.%g" % (
+            slugify(key)[:64],
+            hashlib.md5(key.encode("utf-8")).hexdigest()[:8],
+            self.tiers[tier][0]))
+
+    def __write_records(self, key, tier, records):
+        # write (timestamp, value) records to their ring index
+        (period, capacity) = self.tiers[tier]
+        filename = self.__filename(key, tier)
+        try:
+            f = open(filename, "r+b")
+        except (IOError, OSError):
+            f = open(filename, "w+b")
+            f.truncate(capacity * _record.size)
+        with f:
+            for (timestamp, value) in records:
+                f.seek(int(timestamp // period) % capacity * _record.size)
+                f.write(_record.pack(timestamp, value))
+
+    def __save_state(self):
+        _write_pickle(os.path.join(self.__directory, "state"),
+                      (self.__watermarks, self.__buckets))
+
+    def __flush_bucket(self, key, tier):
+        (index, total, count) = self.__buckets.pop((key, tier))
+        if count > 0:
+            self.__write_records(key, tier, [ (index * self.tiers[tier][0], total / count) ])
+
+    def append(self, key, points):
+        """Append points to a series.
+
+        :param key: the key of the series (a string)
+
+        :param points: iterable of tuples (timestamp, value), with
+          increasing timestamps. Points whose value is None are
+          ignored.
+        """
+        points = [ (float(timestamp), float(value)) for (timestamp, value) in points
+                   if value != None ]
+        if len(points) == 0:
+            return
+        with self.__lock:
+            if key not in self.__keys:
+                self.__keys.add(key)
+                _write_pickle(os.path.join(self.__directory, "keys"), self.__keys)
+            self.__write_records(key, 0, points)
+            for tier in range(1, len(self.tiers)):
+                period = self.tiers[tier][0]
+                for (timestamp, value) in points:
+                    index = int(timestamp // period)
+                    bucket = self.__buckets.get((key, tier))
+                    if bucket != None and index > bucket[0]:
+                        self.__flush_bucket(key, tier)
+                        bucket = None
+                    if bucket == None:
+                        bucket = self.__buckets[(key, tier)] = [ index, 0.0, 0 ]
+                    if index == bucket[0]:
+                        bucket[1] += value
+                        bucket[2] += 1
+
+    def flush(self):
+        """Write the means of the current, incomplete, periods of the downsampled tiers.
+
+        They are updated as more points are appended.
+        """
+        with self.__lock:
+            for (key, tier), (index, total, count) in self.__buckets.items():
+                if count > 0:
+                    self.__write_records(key, tier, [ (index * self.tiers[tier][0], total / count) ])
+            self.__save_state()
+
+    def close(self):
+        """Write the means of the current periods of the downsampled tiers, and persist their state."""
+        self.flush()
+
+    def keys(self):
+        """Return the list of the keys of the series."""
+        with self.__lock:
+            return sorted(self.__keys)
+
+    def get(self, key, tier = 0, from_ts = None, to_ts = None, arrays = False):
+        """Return the points of a series, by increasing timestamps.
+
+        :param key: the key of the series
+
+        :param tier: the index of the tier in
+          `execo_engine.timeseries.TimeSeriesStore.tiers`
+
+        :param from_ts: if not None, only return points whose
+          timestamp is greater or equal.
+
+        :param to_ts: if not None, only return points whose timestamp
+          is lower.
+
+        :param arrays: if False (default), return a list of tuples
+          (timestamp, value), else a tuple (timestamps, values) of
+          numpy arrays. Needs numpy.
+        """
+        if arrays and not numpy:
+            raise ValueError("numpy is needed to get series as arrays")
+        (period, capacity) = self.tiers[tier]
+        records = array.array("d")
+        with self.__lock:
+            try:
+                with open(self.__filename(key, tier), "rb") as f:
+                    if sys.version_info >= (3,):
+                        records.frombytes(f.read())
+                    else:
+                        records.fromstring(f.read())
+            except (IOError, OSError):
+                pass
+        points = [ (records[i], records[i + 1]) for i in range(0, len(records), 2)
+                   if records[i] != 0 ]
+        if len(points) > 0:
+            # records older than the ring window were not overwritten
+            # because of gaps in the series
+            oldest = max([ timestamp for (timestamp, value) in points ]) - period * capacity
+            points = [ p for p in points if p[0] > oldest
+                       and (from_ts == None or p[0] >= from_ts)
+                       and (to_ts == None or p[0] < to_ts) ]
+        points.sort()
+        if arrays:
+            return (numpy.array([ p[0] for p in points ], dtype = float),
+                    numpy.array([ p[1] for p in points ], dtype = float))
+        return points
+
+    def get_watermarks(self, name):
+        """Return the watermarks of a name (for example of a source): a dict associating series keys to the latest timestamp collected."""
+        with self.__lock:
+            return dict(self.__watermarks.get(name, {}))
+
+    def set_watermarks(self, name, watermarks):
+        """Set and persist the watermarks of a name.
+
+        The state of the downsampled tiers is persisted with them, so
+        that it is consistent with the points appended before.
+        """
+        with self.__lock:
+            self.__watermarks[name] = dict(watermarks)
+            self.__save_state()
+
+class MetricsCollector(object):
+
+    """Background collection of metrics into a `execo_engine.timeseries.TimeSeriesStore`.
+
+    A thread periodically polls metrics sources. A source is a
+    callable, called with a timestamp watermark (or None at the
+    first poll), returning a dict associating series keys to lists
+    of points (timestamp, value) measured since the watermark.
+
+    Each series has its own watermark, the timestamp of its latest
+    point stored, and only the points newer than the watermark of
+    their series are stored, so that series whose points arrive
+    with different delays do not lose points. A source is called
+    with the lowest watermark of its series, ignoring the series
+    lagging more than max_lag seconds behind its most recent series
+    (for example those of a host which went down): if they report
+    again, their points older than this bound may not be
+    fetched. Watermarks are persisted in the store, so that a
+    collector restarted on the same store does not store again the
+    points already collected, and the overhead of each poll only
+    depends on the polling interval and max_lag.
+
+    See `execo_g5k.api_utils.HostsMetricSource` for the Grid'5000
+    metrology API, and `execo_engine.timeseries.RemoteProcSource`
+    for sampling ``/proc`` on remote hosts.
+
+    Usage::
+
+      collector = MetricsCollector(
+          TimeSeriesStore(os.path.join(self.result_dir, "metrics")),
+          { "power": HostsMetricSource(hosts, "power") },
+          interval = 60)
+      collector.start()
+      [...]
+      collector.stop()
+    """
+
+    def __init__(self, store, sources, interval = 60, max_lag = None):
+        """
+        :param store: the `execo_engine.timeseries.TimeSeriesStore`
+
+        :param sources: dict associating source names (used for
+          their watermarks) to sources.
+
+        :param interval: polling interval in seconds.
+
+        :param max_lag: lag in seconds after which a series is
+          ignored to compute the watermark given to its source. If
+          None (default), 10 polling intervals.
+        """
+        self.store = store
+        """the `execo_engine.timeseries.TimeSeriesStore`"""
+        self.__sources = dict(sources)
+        self.__interval = interval
+        self.__max_lag = max_lag
+        if self.__max_lag == None:
+            self.__max_lag = 10 * interval
+        self.__condition = threading.Condition()
+        self.__stopped = False
+        self.__thread = None
+
+    def __str__(self):
+        return "<MetricsCollector %s>" % (self.store,)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, t, v, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        """Start the collector thread."""
+        self.__stopped = False
+        self.__thread = threading.Thread(target = self.__collect_loop,
+                                         name = "%s collector" % (self,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """Stop the collector thread, after a last poll of the sources, and close the store."""
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+        self.poll()
+        self.store.close()
+
+    def poll(self):
+        """Poll all sources now."""
+        for (name, source) in self.__sources.items():
+            try:
+                self.__poll_source(name, source)
+            except Exception as e:
+                logger.error("%s: error polling source %s: %s", self, name, e)
+
+    def __poll_source(self, name, source):
+        watermarks = self.store.get_watermarks(name)
+        from_ts = None
+        if len(watermarks) > 0:
+            newest = max(watermarks.values())
+            from_ts = min([ watermark for watermark in watermarks.values()
+                            if watermark >= newest - self.__max_lag ])
+        changed = False
+        for (key, points) in source(from_ts).items():
+            watermark = watermarks.get(key)
+            if watermark != None:
+                points = [ p for p in points if p[0] > watermark ]
+            if len(points) == 0:
+                continue
+            self.store.append(key, points)
+            latest = max([ p[0] for p in points ])
+            if watermark == None or latest > watermark:
+                watermarks[key] = latest
+                changed = True
+        if changed:
+            self.store.set_watermarks(name, watermarks)
+        logger.trace("%s: polled source %s from %s", self, name, from_ts)
+
+    def __collect_loop(self):
+        while True:
+            self.poll()
+            with self.__condition:
+                if not self.__stopped:
+                    self.__condition.wait(self.__interval)
+                if self.__stopped:
+                    return
+
+class RemoteProcSource(object):
+
+    """Metrics source sampling ``/proc`` on remote hosts, for `execo_engine.timeseries.MetricsCollector`.
+
+    Each call runs a single `execo.action.TaktukRemote` reading
+    ``/proc/loadavg``, ``/proc/meminfo`` and ``/proc/stat`` on all
+    hosts, and returns one point for the series
+    ``<host>/load1`` (load average over 1 minute),
+    ``<host>/mem_used`` (used memory in bytes) and
+    ``<host>/cpu_busy`` (fraction of non idle cpu time since the
+    previous call, from the second call) of each host.
+    """
+
+    def __init__(self, hosts, connection_params = None):
+        """
+        :param hosts: iterable of `execo.host.Host` or host names
+
+        :param connection_params: connection params of the
+          `execo.action.TaktukRemote`
+        """
+        self.hosts = hosts
+        self.connection_params = connection_params
+        self.__cpu_times = dict()
+        # associates hosts addresses to their previous (busy, total)
+        # cpu times
+
+    def __call__(self, watermark):
+        remote = TaktukRemote("cat /proc/loadavg /proc/meminfo /proc/stat",
+                                    self.hosts,
+                                    connection_params = self.connection_params,
+                                    process_args = { "nolog_exit_code": True,
+                                                     "nolog_error": True })
+        remote.run()
+        timestamp = time.time()
+        points = dict()
+        for process in remote.processes:
+            if not process.ok:
+                continue
+            host = process.host.address
+            lines = process.stdout.splitlines()
+            meminfo = dict()
+            for line in lines:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0].endswith(":"):
+                    meminfo[fields[0][:-1]] = int(fields[1]) * 1024
+                elif len(fields) > 4 and fields[0] == "cpu":
+                    times = [ int(field) for field in fields[1:] ]
+                    idle = sum(times[3:5])
+                    total = sum(times[:8])
+                    previous = self.__cpu_times.get(host)
+                    self.__cpu_times[host] = (total - idle, total)
+                    if previous != None and total > previous[1]:
+                        points[host + "/cpu_busy"] = [
+                            (timestamp, float(total - idle - previous[0]) / (total - previous[1])) ]
+            if len(lines) > 0:
+                points[host + "/load1"] = [ (timestamp, float(lines[0].split()[0])) ]
+            if "MemTotal" in meminfo and "MemAvailable" in meminfo:
+                points[host + "/mem_used"] = [ (timestamp, meminfo["MemTotal"] - meminfo["MemAvailable"]) ]
+        return points
@@ -16,8 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Execo.  If not, see <http://www.gnu.org/licenses/>
 
-from execo.utils import MAXFD
-import os, unicodedata, re, sys, ctypes, signal
+import os, unicodedata, re, sys, threading, select, atexit, gzip, time
 
 def _redirect_fd(fileno, filename):
     # create and open file filename, and redirect open file fileno to it
@@ -25,47 +24,186 @@ def _redirect_fd(fileno, filename):
     os.dup2(f, fileno)
     os.close(f)
 
-def _disable_sigs(sigs):
-    # Disable a list of signals with sigprocmask. This makes a bunch
-    # of assumptions about various libc structures and as such, is
-    # fragile and not portable. Code taken and modified from
-    # http://stackoverflow.com/questions/3791398/how-to-stop-python-from-propagating-signals-to-subprocesses#3792294
-    libc = ctypes.CDLL('libc.so.6')
-    SIGSET_NWORDS = 1024 // (8 *  ctypes.sizeof(ctypes.c_ulong))
-    class SIGSET(ctypes.Structure):
-        _fields_ = [
-            ('val', ctypes.c_ulong * SIGSET_NWORDS)
-            ]
-    sigset = (ctypes.c_ulong * SIGSET_NWORDS)()
-    for sig in sigs:
-        ulongindex = sig // ctypes.sizeof(ctypes.c_ulong)
-        ulongoffset = sig % ctypes.sizeof(ctypes.c_ulong)
-        sigset[ulongindex] |= 1 << (ulongoffset - 1)
-    mask = SIGSET(sigset)
-    SIG_BLOCK = 0
-    libc.sigprocmask(SIG_BLOCK, ctypes.pointer(mask), 0)
-
-def _tee_fd(fileno, filename):
-    # create and open file filename, and duplicate open file fileno to it
-    pr, pw = os.pipe()
-    pid = os.fork()
-    if pid == 0:
-        os.dup2(pr, 0)
-        os.dup2(fileno, 1)
-        if ("SC_OPEN_MAX" in os.sysconf_names):
-            maxfd = os.sysconf("SC_OPEN_MAX")
-        else:
-            maxfd = MAXFD
-        # close all unused fd
-        os.closerange(3, maxfd)
-        # disable signals on tee to allow getting last outputs of engine.
-        # tee will close anyway on broken pipe
-        _disable_sigs([signal.SIGINT, signal.SIGTERM])
-        os.execv('/usr/bin/tee', ['tee', '-a', filename])
+def _line_buffer_stdout():
+    # reopen stdout line buffered, so that its outputs are timely
+    # interleaved with the outputs of subprocesses (unbuffered text
+    # files are not possible with python 3)
+    if sys.version_info >= (3,):
+        sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 1, closefd = False)
     else:
-        os.close(pr)
+        sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 1)
+
+class _OutputLog(object):
+
+    # append only log file, optionally gzip compressed, and rotated
+    # when its size exceeds max_size: the current file is renamed
+    # with suffix .1, the previous .1 to .2, and so on up to
+    # backup_count. The size is the size on disk, given by the
+    # position of the underlying file, thus the compressed size when
+    # compressing (which lags behind the data written, until zlib
+    # flushes it).
+
+    def __init__(self, filename, compress, max_size, backup_count):
+        self.__basename = filename
+        self.__extension = ""
+        if compress:
+            self.__extension = ".gz"
+        self.__compress = compress
+        self.__max_size = max_size
+        self.__backup_count = backup_count
+        self.__open()
+
+    def __str__(self):
+        return self.__filename()
+
+    def __filename(self, backup = 0):
+        if backup == 0:
+            return self.__basename + self.__extension
+        return "%s.%i%s" % (self.__basename, backup, self.__extension)
+
+    def __open(self):
+        if self.__compress:
+            self.__file = gzip.open(self.__filename(), "ab")
+        else:
+            self.__file = open(self.__filename(), "ab")
+
+    def __disk_size(self):
+        if self.__compress:
+            return self.__file.fileobj.tell()
+        return self.__file.tell()
+
+    def write(self, data):
+        self.__file.write(data)
+        if self.__max_size and self.__disk_size() >= self.__max_size:
+            self.__file.close()
+            for backup in range(self.__backup_count - 1, 0, -1):
+                if os.path.exists(self.__filename(backup)):
+                    os.rename(self.__filename(backup), self.__filename(backup + 1))
+            if self.__backup_count > 0:
+                os.rename(self.__filename(), self.__filename(1))
+            else:
+                os.remove(self.__filename())
+            self.__open()
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+class _OutputsCopier(object):
+
+    # copy of the data written to file descriptors, both to their
+    # original destination and to log files, by a thread of the
+    # engine process. Each file descriptor is replaced by the write
+    # end of a pipe, whose read end is pumped by the thread. Log files
+    # are flushed every flush_interval seconds. At exit, file
+    # descriptors are restored and the pipes are drained, so that the
+    # last outputs are not lost (but outputs still buffered when the
+    # process is killed are). If writing to a log file fails (disk
+    # full, rotation error), logging to it stops, but outputs are
+    # still copied to their original destination, so that writers
+    # never block on a full pipe.
+
+    def __init__(self, flush_interval):
+        self.__flush_interval = flush_interval
+        self.__pipes = dict()
+        # associates pipes read ends to tuples (fileno, original
+        # destination fd, _OutputLog)
+        self.__logs = dict()
+        # associates log filenames to _OutputLog, shared by file
+        # descriptors copied to the same file
+        self.__failed_logs = set()
+        self.__error_fd = os.dup(2)
+        # original stderr, where log errors are reported
+        (self.__wakeup_r, self.__wakeup_w) = os.pipe()
+        self.__stopped = False
+        self.__thread = threading.Thread(target = self.__pump, name = "copy outputs")
+        self.__thread.daemon = True
+        self.__thread.start()
+        atexit.register(self.stop)
+
+    def add(self, fileno, filename, compress, max_size, backup_count):
+        if filename not in self.__logs:
+            self.__logs[filename] = _OutputLog(filename, compress, max_size, backup_count)
+        pr, pw = os.pipe()
+        self.__pipes[pr] = (fileno, os.dup(fileno), self.__logs[filename])
         os.dup2(pw, fileno)
         os.close(pw)
+        os.write(self.__wakeup_w, b"x")
+
+    def stop(self):
+        if self.__stopped:
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.__stopped = True
+        # restore the file descriptors, so that the pipes are closed
+        # (unless subprocesses still have them open)
+        for (fileno, original_fd, log) in list(self.__pipes.values()):
+            os.dup2(original_fd, fileno)
+        os.write(self.__wakeup_w, b"x")
+        self.__thread.join()
+
+    def __copy(self, pr):
+        # copy the data available in a pipe. Return False on end of
+        # file.
+        data = os.read(pr, 65536)
+        if not data:
+            del self.__pipes[pr]
+            os.close(pr)
+            return False
+        (fileno, original_fd, log) = self.__pipes[pr]
+        view = data
+        while view:
+            try:
+                view = view[os.write(original_fd, view):]
+            except OSError:
+                # original destination closed: only log
+                break
+        self.__log_call(log, "write", data)
+        return True
+
+    def __log_call(self, log, method, *args):
+        # call a method of a log, unless it failed before. If it
+        # fails, stop using the log.
+        if log in self.__failed_logs:
+            return
+        try:
+            getattr(log, method)(*args)
+        except Exception as e:
+            self.__failed_logs.add(log)
+            try:
+                os.write(self.__error_fd, ("error writing outputs to %s, stop copying outputs to it: %s\n"
+                                           % (log, e)).encode("utf-8", "replace"))
+            except OSError:
+                pass
+
+    def __pump(self):
+        last_flush = time.time()
+        while not self.__stopped:
+            (readable, w, x) = select.select(list(self.__pipes) + [ self.__wakeup_r ], [], [],
+                                             self.__flush_interval)
+            for pr in readable:
+                if pr == self.__wakeup_r:
+                    os.read(self.__wakeup_r, 4096)
+                else:
+                    self.__copy(pr)
+            if time.time() - last_flush >= self.__flush_interval:
+                for log in self.__logs.values():
+                    self.__log_call(log, "flush")
+                last_flush = time.time()
+        # drain the data already written to the pipes
+        while self.__pipes:
+            (readable, w, x) = select.select(list(self.__pipes), [], [], 0)
+            if not readable:
+                break
+            for pr in readable:
+                self.__copy(pr)
+        for log in self.__logs.values():
+            self.__log_call(log, "close")
+
+_outputs_copier = None
 
 def redirect_outputs(stdout_filename, stderr_filename):
     """Redirects, and optionnaly merge, stdout and stderr to files"""
@@ -73,21 +211,37 @@ def redirect_outputs(stdout_filename, stderr_filename):
     sys.stderr.flush()
     _redirect_fd(1, stdout_filename)
     _redirect_fd(2, stderr_filename)
-    # additionnaly force stdout unbuffered by reopening stdout
-    # file descriptor with write mode
-    # and 0 as the buffer size (unbuffered)
-    sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 0)
+    _line_buffer_stdout()
+
+def copy_outputs(stdout_filename, stderr_filename, flush_interval = 1, compress = False,
+                 max_size = None, backup_count = 5):
+    """Copy, and optionnaly merge, stdout and stderr to file(s)
+
+    Outputs (of the python process and of its subprocesses) are
+    copied by a thread of the python process, which writes to the
+    files with buffering.
+
+    :param flush_interval: files are flushed at least every
+      flush_interval seconds.
 
-def copy_outputs(stdout_filename, stderr_filename):
-    """Copy, and optionnaly merge, stdout and stderr to file(s)"""
+    :param compress: if True, files are gzip compressed, and their
+      names get the suffix ``.gz``.
+
+    :param max_size: if not None, files are rotated when their size
+      on disk exceeds max_size bytes (the compressed size if
+      compress): the current file is renamed with suffix ``.1``, the
+      previous ``.1`` to ``.2``, and so on.
+
+    :param backup_count: number of rotated files kept.
+    """
+    global _outputs_copier
     sys.stdout.flush()
     sys.stderr.flush()
-    _tee_fd(1, stdout_filename)
-    _tee_fd(2, stderr_filename)
-    # additionnaly force stdout unbuffered by reopening stdout
-    # file descriptor with write mode
-    # and 0 as the buffer size (unbuffered)
-    sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 0)
+    if _outputs_copier == None:
+        _outputs_copier = _OutputsCopier(flush_interval)
+    _outputs_copier.add(1, stdout_filename, compress, max_size, backup_count)
+    _outputs_copier.add(2, stderr_filename, compress, max_size, backup_count)
+    _line_buffer_stdout()
 
 def slugify(value):
     """
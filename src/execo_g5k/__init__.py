@@ -44,9 +44,9 @@ from .api_utils import get_g5k_sites, get_site_clusters, \
     get_host_cluster, group_hosts, get_resource_attributes, \
     get_site_network_equipments, get_host_attributes, get_cluster_attributes, \
     get_site_attributes, get_network_equipment_attributes, canonical_host_name,\
-    get_network_equipment_site, get_host_shortname, get_host_longname, \
+    get_network_equipment_site, get_network_equipment_hosts, get_host_shortname, get_host_longname, \
     get_cluster_network_equipments, get_site_hosts, get_host_network_equipments, \
-    get_hosts_metric
+    get_hosts_metric, HostsMetricSource
 
 from .charter import g5k_charter_time, get_next_charter_period
 
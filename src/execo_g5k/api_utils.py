@@ -24,8 +24,14 @@ cache will be used.
 
 Functions for wrapping the grid5000 REST API. This module also
 manage a cache of the Grid'5000 Reference API (hosts and network
-equipments) (Data are stored in $HOME/.execo/g5k_api_cache/' under
-pickle format)
+equipments) (Data are stored in $HOME/.execo/g5k_api_cache/' in an
+indexed file of pickled records, one per host, cluster, site and
+site network, which is memory mapped read-only and whose records are
+only decoded when looked up, so that loading the cache is nearly
+free, and its pages are shared by all processes using it). Each resource of the API is cached with its ETag and
+Last-Modified headers, so that when the API commit changes, the cache
+is updated with conditional requests: only the sites, clusters, nodes
+and network equipments which changed are transferred again.
 
 All queries to the Grid5000 REST API are done with or without
 credentials, depending on key ``api_username`` of
@@ -49,12 +55,21 @@ import execo
 import requests
 import re, itertools
 import threading
-import logging, sys
-from os import makedirs, environ, path
+from multiprocessing.pool import ThreadPool
+import logging, sys, mmap, struct, hashlib, time
+from os import makedirs, environ, path, getpid, rename
 if sys.version_info >= (3,):
-    from pickle import load, dump
+    from pickle import load, dump, loads, dumps
 else:
-    from cPickle import load, dump
+    from cPickle import load, dump, loads, dumps
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 if 'HOME' in environ:
     _cache_dir = environ['HOME'] + "/.execo/g5k_api_cache-%s.%s/" % (sys.version_info[0], sys.version_info[1])
@@ -63,6 +78,19 @@ else:
 _data_lock = threading.RLock()
 _data = None
 
+_api_data_keys = ['network', 'sites', 'clusters', 'hosts', 'hierarchy']
+# keys of the dict returned by get_api_data, each associated to a
+# mapping
+
+_cache_magic = b'execoapi'
+_cache_header = struct.Struct('<8sQQ')
+# header of the indexed cache file: magic, offset of the index,
+# number of slots of the index
+_cache_slot = struct.Struct('<QQQ')
+# slot of the index (an open addressing hash table with linear
+# probing): key hash (0 for an empty slot), record offset, record
+# length. Records are pickled tuples (key, value)
+
 _g5k_api_lock = threading.RLock()
 _g5k_api = None
 """Internal singleton instance of the g5k api rest resource."""
@@ -79,10 +107,18 @@ def _ask_password(username, uri, message, password_check_func):
             return password
     return None
 
+_insecure_warnings_disabled = False
+
+def _disable_insecure_warnings():
+    global _insecure_warnings_disabled
+    if not _insecure_warnings_disabled:
+        requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+        _insecure_warnings_disabled = True
+
 def _get_api_password_check_func(username, uri, password):
     if g5k_configuration['api_verify_ssl_cert'] == False:
         verify = False
-        requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+        _disable_insecure_warnings()
     else:
         verify = True
     response = requests.get(uri,
@@ -129,16 +165,56 @@ class APIException(Exception):
     def __str__(self):
         return "<APIException uri=%r method=%s response=%s content=%r>" % (self.uri, self.method, self.response, self.content)
 
+class _RateLimiter(object):
+    """Thread-safe token bucket, limiting the rate of requests"""
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: maximum rate, in requests per second
+
+        :param burst: maximum number of requests without delay. If
+          None, one second of requests.
+        """
+        self.rate = float(rate)
+        if burst:
+            self.burst = float(burst)
+        else:
+            self.burst = max(1.0, self.rate)
+        self.__tokens = self.burst
+        self.__last = time.time()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request can be done"""
+        with self.__lock:
+            now = time.time()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+            self.__last = now
+            self.__tokens -= 1
+            delay = -self.__tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
 class APIConnection(object):
     """Basic class for easily getting url contents.
 
     Intended to be used to get content from restfull apis, particularly the grid5000 api.
+
+    Requests go through a `requests.Session` keeping connections
+    alive, GET requests failing with a connection error or a 429, 500,
+    502, 503, 504 http status are retried with an exponential backoff
+    (see ``api_retries`` and ``api_retry_backoff`` in
+    `execo_g5k.config.g5k_configuration`), and the rate of requests
+    can be limited. APIConnections are thread-safe, and
+    `execo_g5k.api_utils.APIConnection.get_async` allows using them
+    from asyncio code.
     """
 
     def __init__(self, base_uri=None,
                  username=None, password=None,
                  headers=None, additional_args=None,
-                 timeout=g5k_configuration.get('api_timeout')):
+                 timeout=g5k_configuration.get('api_timeout'),
+                 pool_size=None, max_rate=None):
         """:param base_uri: server base uri. defaults to
           ``g5k_configuration.get('api_uri')``
 
@@ -160,6 +236,14 @@ class APIConnection(object):
 
         :param timeout: timeout for the http connection.
 
+        :param pool_size: number of kept-alive connections, and of
+          threads of `execo_g5k.api_utils.APIConnection.get_async`. If
+          None (default), use ``g5k_configuration.get('api_max_workers')``
+
+        :param max_rate: maximum rate of requests, in requests per
+          second. If None (default), use
+          ``g5k_configuration.get('api_max_rate')``
+
         """
         if not base_uri:
             base_uri = g5k_configuration.get('api_uri')
@@ -181,32 +265,89 @@ class APIConnection(object):
         if self.username and not self.password:
             self.password = _get_api_password(self.username, self.base_uri)
         self.timeout = timeout
+        self.session = requests.Session()
+        """requests session, keeping connections alive between requests"""
+        retry = requests.packages.urllib3.util.retry.Retry(
+            total=g5k_configuration.get('api_retries'),
+            backoff_factor=g5k_configuration.get('api_retry_backoff'),
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False)
+        if pool_size == None:
+            pool_size = g5k_configuration.get('api_max_workers')
+        self.pool_size = pool_size
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_size,
+                                                max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if max_rate == None:
+            max_rate = g5k_configuration.get('api_max_rate')
+        if max_rate:
+            self._rate_limiter = _RateLimiter(max_rate)
+        else:
+            self._rate_limiter = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def get(self, relative_uri, headers=None):
+        """Get the (response, content) tuple for the given path on the server
 
-    def get(self, relative_uri):
-        """Get the (response, content) tuple for the given path on the server"""
+        :param headers: optional dict of http headers to add to the
+          default headers of the connection, for this request only
+          (for example for conditional requests).
+        """
         uri = self._build_uri(relative_uri)
         auth, verify = self._get_security_conf()
-        response = requests.get(uri,
-                                params=self.additional_args,
-                                headers=self.headers,
-                                auth=auth,
-                                verify=verify,
-                                timeout=self.timeout)
+        if headers:
+            headers = dict(self.headers, **headers)
+        else:
+            headers = self.headers
+        if self._rate_limiter:
+            self._rate_limiter.acquire()
+        response = self.session.get(uri,
+                                    params=self.additional_args,
+                                    headers=headers,
+                                    auth=auth,
+                                    verify=verify,
+                                    timeout=self.timeout)
         if response.status_code not in [200, 304]:
             raise APIException(uri, 'GET', response)
         return response
 
+    def get_async(self, relative_uri, headers=None, loop=None):
+        """Get the response for the given path on the server, as an asyncio future.
+
+        The request is done by `execo_g5k.api_utils.APIConnection.get`
+        in a pool of pool_size threads, so that a coroutine can
+        concurrently await many requests::
+
+          responses = await asyncio.gather(*[ api.get_async(path) for path in paths ])
+
+        :param headers: see `execo_g5k.api_utils.APIConnection.get`
+
+        :param loop: the asyncio event loop. If None (default), the
+          current event loop.
+        """
+        import asyncio, concurrent.futures
+        with self._executor_lock:
+            if not self._executor:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.pool_size)
+        if loop == None:
+            loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, lambda: self.get(relative_uri, headers))
+
     def post(self, relative_uri, json):
         """Submit the body to a given path on the server, returns the (response, content) tuple"""
         uri = self._build_uri(relative_uri)
         auth, verify = self._get_security_conf()
-        response = requests.post(uri,
-                                 params=self.additional_args,
-                                 headers=self.headers,
-                                 json=json,
-                                 auth=auth,
-                                 verify=verify,
-                                 timeout=self.timeout)
+        if self._rate_limiter:
+            self._rate_limiter.acquire()
+        response = self.session.post(uri,
+                                     params=self.additional_args,
+                                     headers=self.headers,
+                                     json=json,
+                                     auth=auth,
+                                     verify=verify,
+                                     timeout=self.timeout)
         if response.status_code not in [200, 304]:
             raise APIException(uri, 'POST', response)
         return response
@@ -222,7 +363,7 @@ class APIConnection(object):
             auth = None
         if auth == None or g5k_configuration['api_verify_ssl_cert'] == False:
             verify = False
-            requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+            _disable_insecure_warnings()
         else:
             verify = True
         return (auth, verify)
@@ -233,6 +374,30 @@ def get_resource_attributes(path):
     attributes = response.json()
     return attributes
 
+def _get_revalidated_resource_attributes(path, resources):
+    """Get generic resource (path on g5k api) attributes as a dict, revalidating its cache entry.
+
+    resources is a dict associating paths to cache entries, tuples
+    (etag, last_modified, attributes). If path has a cache entry, the
+    request is conditional, and if the resource is unchanged, the
+    server answers 304 without content and the cached attributes are
+    returned. Else the cache entry of path is replaced.
+    """
+    entry = resources.get(path)
+    headers = {}
+    if entry:
+        (etag, last_modified, attributes) = entry
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    response = _get_g5k_api().get(path, headers=headers)
+    if response.status_code == 304 and entry:
+        return entry[2]
+    attributes = response.json()
+    resources[path] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), attributes)
+    return attributes
+
 def _get_g5k_sites_uncached():
     return [site['uid'] for site in get_resource_attributes('/sites')['items']]
 
@@ -241,131 +406,255 @@ def _get_site_clusters_uncached(site):
 
 def get_api_data(cache_dir=_cache_dir):
     """Return a dict containing the data from network, sites, clusters
-    and hosts."""
+    and hosts.
+
+    With a cache_dir, its values are read-only mappings
+    (``collections.abc.Mapping``) reading their values from the
+    cache when accessed, whether the data was just retrieved from
+    the API or read from the cache. They are not dicts: use their
+    ``copy()`` method (or ``dict()``) to get a dict, for example to
+    modify or serialize it. Without cache_dir, they are dicts.
+    """
     global _data
     if not _data:
         with _data_lock:
             if cache_dir:
-                if _is_cache_old_and_reachable(cache_dir):
-                    _data = _get_api()
-                    _write_api_cache(cache_dir, _data)
-                else:
-                    _data = _read_api_cache(cache_dir)
+                (is_old, api_commit) = _is_cache_old_and_reachable(cache_dir)
+                if is_old:
+                    resources = _read_api_resources_cache(cache_dir)
+                    _write_api_cache(cache_dir, _get_api(resources), resources, api_commit)
+                _data = _read_api_cache(cache_dir)
             else:
                 _data = _get_api()
     return _data
 
 def _is_cache_old_and_reachable(cache_dir):
     """Try to read the api_commit stored in the cache_dir and compare
-    it with latest commit, return True if remote commit is different
-    from cache commit"""
+    it with latest commit, return the tuple (is_old, api_commit),
+    is_old being True if remote commit is different from cache
+    commit, and api_commit being the remote commit (None if unknown)"""
     try:
         with open(cache_dir + 'api_commit') as f:
             local_commit = f.readline()
     except:
         logger.detail('No commit version found')
-        return True
+        return (True, None)
+    if not path.exists(cache_dir + 'api_data'):
+        logger.detail('No cache data found')
+        return (True, None)
     try:
         api_commit = get_resource_attributes('')['version']
     except:
         logger.warning('Unable to check API, reverting to cache')
-        return False
-    if local_commit != get_resource_attributes('')['version']:
+        return (False, None)
+    if local_commit != api_commit:
         logger.info('Cache is outdated, will retrieve the latest commit')
-        return True
+        return (True, api_commit)
     else:
         logger.detail('Already at the latest commit')
-        return False
-
-def __get_backbone():
-    logger.detail("backbone network")
-    threading.currentThread().backbone_data = get_resource_attributes('/network_equipments')['items']
-
-def __get_site_attrs(site):
-    logger.detail(site + " attrs")
-    threading.currentThread().site_data = get_resource_attributes('sites/' + site)
-
-def __get_cluster_attrs(site, cluster):
-    logger.detail(cluster + " attrs")
-    threading.currentThread().cluster_data = get_resource_attributes('sites/' + site
-                                                                     + '/clusters/'
-                                                                     + cluster)
-
-def __get_host_attrs(site, cluster):
-    logger.detail(cluster + " hosts")
-    threading.currentThread().host_data = {}
-    for host in get_resource_attributes('sites/' + site + '/clusters/'
-                                        + cluster + '/nodes')['items']:
-        threading.currentThread().host_data[host['uid']] = host
-
-def __get_site_network(site):
-    logger.detail(site + " network")
-    threading.currentThread().network_data = {}
-    for equip in get_resource_attributes('sites/' + site + '/network_equipments')['items']:
-        threading.currentThread().network_data[equip['uid']] = equip
-
-def __get_site(site):
-    logger.detail(site)
-    site_attrs_th = threading.Thread(target = __get_site_attrs, args = (site,))
-    site_attrs_th.start()
-    site_network_th = threading.Thread(target = __get_site_network, args = (site,))
-    site_network_th.start()
-    cluster_attrs_th = {}
-    host_attrs_th = {}
-    for cluster in _get_site_clusters_uncached(site):
-        t = threading.Thread(target = __get_cluster_attrs, args = (site, cluster))
-        t.start()
-        cluster_attrs_th[cluster] = t
-        t = threading.Thread(target = __get_host_attrs, args = (site, cluster))
-        t.start()
-        host_attrs_th[cluster] = t
-    for t in [ site_attrs_th, site_network_th ] + list(cluster_attrs_th.values()) + list(host_attrs_th.values()):
-        t.join()
-    threading.currentThread().site_data = site_attrs_th.site_data
-    threading.currentThread().network_data = site_network_th.network_data
-    threading.currentThread().cluster_data = {}
-    threading.currentThread().host_data = {}
-    for cluster in cluster_attrs_th:
-        threading.currentThread().cluster_data[cluster] = cluster_attrs_th[cluster].cluster_data
-        threading.currentThread().host_data[cluster] = host_attrs_th[cluster].host_data
-
-def _get_api():
-    """Retrieve data from the Grid'5000 API"""
-    logger.info('Retrieving data from API...')
-
-    backbone_th = threading.Thread(target = __get_backbone)
-    backbone_th.start()
+        return (False, api_commit)
 
-    site_th = {}
-    for site in sorted(_get_g5k_sites_uncached()):
-        t = threading.Thread(target = __get_site, args = (site,))
-        t.start()
-        site_th[site] = t
+def _get_resources_attributes(pool, paths, resources=None):
+    """Get the attributes of several resources concurrently, return a dict associating paths to attributes
 
-    for t in [ backbone_th ] + list(site_th.values()):
-        t.join()
+    If resources is not None, it is a dict of cache entries, with
+    which the resources are revalidated (see
+    `execo_g5k.api_utils._get_revalidated_resource_attributes`).
+    """
+    if resources == None:
+        return dict(zip(paths, pool.map(get_resource_attributes, paths)))
+    return dict(zip(paths, pool.map(lambda path: _get_revalidated_resource_attributes(path, resources),
+                                    paths)))
+
+def _get_api(resources=None):
+    """Retrieve data from the Grid'5000 API
+
+    :param resources: if not None, dict associating the paths of the
+      API resources to cache entries (see
+      `execo_g5k.api_utils._get_revalidated_resource_attributes`). The
+      resources are then retrieved with conditional requests, so
+      that only the resources (sites, clusters, their nodes or
+      network equipments) changed since they were cached are
+      transferred, and the entries are updated. Entries of the
+      resources which no longer exist are removed.
+    """
+    logger.info('Retrieving data from API...')
+    pool = ThreadPool(g5k_configuration.get('api_max_workers'))
+    try:
+        # resources are retrieved by a bounded pool of threads, in
+        # three steps, the paths of each step depending on the
+        # results of the previous step
+        attrs = _get_resources_attributes(pool, ['/sites', '/network_equipments'], resources)
+        sites = sorted([ site['uid'] for site in attrs['/sites']['items'] ])
+        logger.detail("sites: %s" % (sites,))
+        attrs.update(_get_resources_attributes(
+            pool,
+            [ 'sites/' + site for site in sites ]
+            + [ 'sites/' + site + '/network_equipments' for site in sites ]
+            + [ 'sites/' + site + '/clusters' for site in sites ],
+            resources))
+        clusters = [ (site, cluster['uid'])
+                     for site in sites
+                     for cluster in attrs['sites/' + site + '/clusters']['items'] ]
+        logger.detail("clusters: %s" % ([ cluster for (site, cluster) in clusters ],))
+        attrs.update(_get_resources_attributes(
+            pool,
+            [ 'sites/' + site + '/clusters/' + cluster for (site, cluster) in clusters ]
+            + [ 'sites/' + site + '/clusters/' + cluster + '/nodes' for (site, cluster) in clusters ],
+            resources))
+    finally:
+        pool.terminate()
+        pool.join()
+    if resources != None:
+        for resource_path in list(resources):
+            if resource_path not in attrs:
+                del resources[resource_path]
 
     data = {'network': {},
             'sites': {},
             'clusters': {},
             'hosts':  {},
             'hierarchy': {}}
-    data['network']['backbone'] = backbone_th.backbone_data
-    for site in site_th:
-        data['network'][site] = site_th[site].network_data
-        data['sites'][site] = site_th[site].site_data
+    data['network']['backbone'] = attrs['/network_equipments']['items']
+    for site in sites:
+        data['network'][site] = {}
+        for equip in attrs['sites/' + site + '/network_equipments']['items']:
+            data['network'][site][equip['uid']] = equip
+        data['sites'][site] = attrs['sites/' + site]
         data['hierarchy'][site] = {}
-        for cluster in site_th[site].cluster_data:
-            data['clusters'][cluster] = site_th[site].cluster_data[cluster]
-            data['hierarchy'][site][cluster] = []
-            for host in site_th[site].host_data[cluster]:
-                data['hosts'][host] = site_th[site].host_data[cluster][host]
-                data['hierarchy'][site][cluster].append(host)
+    for (site, cluster) in clusters:
+        data['clusters'][cluster] = attrs['sites/' + site + '/clusters/' + cluster]
+        data['hierarchy'][site][cluster] = []
+        for host in attrs['sites/' + site + '/clusters/' + cluster + '/nodes']['items']:
+            data['hosts'][host['uid']] = host
+            data['hierarchy'][site][cluster].append(host['uid'])
 
     return data
 
-def _write_api_cache(cache_dir, data):
-    """write Grid'5000 API data into cache directory"""
+def _cache_key_hash(key):
+    """Return the hash of a key of the indexed cache, stable across processes, never 0"""
+    return struct.unpack('<Q', hashlib.md5(key.encode('utf-8')).digest()[:8])[0] | 1
+
+def _write_indexed_cache(filename, records):
+    """Write an indexed cache file from an iterable of (key, value) records.
+
+    The file is written to a temporary file, then renamed, so that
+    processes which have mapped a previous version of the file keep
+    reading it unchanged.
+    """
+    tmp_filename = "%s.%i.tmp" % (filename, getpid())
+    with open(tmp_filename, 'wb') as f:
+        f.write(_cache_header.pack(_cache_magic, 0, 0))
+        entries = []
+        for key, value in records:
+            record = dumps((key, value), 2)
+            entries.append((_cache_key_hash(key), f.tell(), len(record)))
+            f.write(record)
+        num_slots = 1
+        while num_slots < 2 * len(entries):
+            num_slots *= 2
+        slots = [ (0, 0, 0) ] * num_slots
+        for entry in entries:
+            i = entry[0] & (num_slots - 1)
+            while slots[i][0] != 0:
+                i = (i + 1) & (num_slots - 1)
+            slots[i] = entry
+        index_offset = f.tell()
+        for slot in slots:
+            f.write(_cache_slot.pack(*slot))
+        f.seek(0)
+        f.write(_cache_header.pack(_cache_magic, index_offset, num_slots))
+    rename(tmp_filename, filename)
+
+class _IndexedCache(object):
+    """Read-only, memory mapped, indexed cache file.
+
+    Records are only read and unpickled when looked up, in O(1).
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.__index_offset, self.__num_slots) = _cache_header.unpack_from(self.__map, 0)
+        if magic != _cache_magic:
+            raise ValueError("%s is not an api cache file" % (filename,))
+
+    def get(self, key, default=None):
+        """Return the value of a key, or default if it is not in the cache"""
+        key_hash = _cache_key_hash(key)
+        i = key_hash & (self.__num_slots - 1)
+        while True:
+            (slot_hash, offset, length) = _cache_slot.unpack_from(
+                self.__map, self.__index_offset + i * _cache_slot.size)
+            if slot_hash == 0:
+                return default
+            if slot_hash == key_hash:
+                (record_key, value) = loads(self.__map[offset:offset + length])
+                if record_key == key:
+                    return value
+            i = (i + 1) & (self.__num_slots - 1)
+
+class _CachedMapping(Mapping):
+    """Read-only mapping whose values are lazily read from an `execo_g5k.api_utils._IndexedCache`.
+
+    The value of a key k of mapping name is the record name/k, and
+    the list of keys is the record keys/name. Values are memoized.
+    """
+
+    def __init__(self, cache, name):
+        self.__cache = cache
+        self.__name = name
+        self.__keys = None
+        self.__key_set = None
+        self.__values = {}
+
+    def __get_keys(self):
+        if self.__keys == None:
+            self.__keys = self.__cache.get('keys/' + self.__name)
+            self.__key_set = frozenset(self.__keys)
+        return self.__keys
+
+    def __getitem__(self, key):
+        try:
+            return self.__values[key]
+        except KeyError:
+            pass
+        if key not in self:
+            raise KeyError(key)
+        value = self.__cache.get(self.__name + '/' + key)
+        self.__values[key] = value
+        return value
+
+    def __contains__(self, key):
+        self.__get_keys()
+        return key in self.__key_set
+
+    def __iter__(self):
+        return iter(self.__get_keys())
+
+    def __len__(self):
+        return len(self.__get_keys())
+
+    def copy(self):
+        """Return a dict with the same content."""
+        return dict(self.items())
+
+def _api_data_records(data):
+    """Generate the records of the indexed cache file of API data"""
+    for name in _api_data_keys:
+        yield ('keys/' + name, list(data[name]))
+        for key, value in data[name].items():
+            yield (name + '/' + key, value)
+
+def _write_api_cache(cache_dir, data, resources=None, api_commit=None):
+    """write Grid'5000 API data into cache directory
+
+    :param resources: if not None, the cache entries of the API
+      resources, written to revalidate them at the next update.
+
+    :param api_commit: the API commit of data. If None, the version
+      of the backbone network equipments is used.
+    """
     if not path.exists(cache_dir):
         makedirs(cache_dir)
         logger.detail('No cache found, directory created')
@@ -373,23 +662,34 @@ def _write_api_cache(cache_dir, data):
         logger.detail('Cache directory is present')
 
     logger.detail('Writing data to cache ...')
-    for e, d in data.items():
-        with open(cache_dir + e, 'wb') as f:
-            dump(d, f)
+    _write_indexed_cache(cache_dir + 'api_data', _api_data_records(data))
+    if resources != None:
+        with open(cache_dir + 'resources', 'wb') as f:
+            dump(resources, f)
+    if api_commit == None:
+        api_commit = data['network']['backbone'][0]['version']
     with open(cache_dir + 'api_commit', 'w') as f:
-        f.write(data['network']['backbone'][0]['version'])
+        f.write(api_commit)
 
 def _read_api_cache(cache_dir):
-    """Read the picke files from cache_dir and return two dicts
+    """Map the indexed cache file from cache_dir, return a dict
+    associating network, sites, clusters, hosts and hierarchy to
+    mappings whose values are read when accessed
     - network = the network_equipements of all sites and backbone
     - hosts = the hosts of all sites
     """
-    data = {}
     logger.detail('Reading data from cache ...')
-    for e in ['network', 'sites', 'clusters', 'hosts', 'hierarchy']:
-        with open(cache_dir + e, 'rb') as f:
-            data[e] = load(f)
-    return data
+    cache = _IndexedCache(cache_dir + 'api_data')
+    return dict([ (name, _CachedMapping(cache, name)) for name in _api_data_keys ])
+
+def _read_api_resources_cache(cache_dir):
+    """Read the cache entries of the API resources from cache_dir, return an empty dict if there are none"""
+    try:
+        with open(cache_dir + 'resources', 'rb') as f:
+            return load(f)
+    except:
+        logger.detail('No resources cache found')
+        return {}
 
 
 def _get_g5k_api():
@@ -400,6 +700,108 @@ def _get_g5k_api():
             _g5k_api = APIConnection()
         return _g5k_api
 
+_default_cluster_queues = [ "admin", "default", "besteffort" ]
+# queues of clusters without queues attribute
+
+class _APIIndexes(object):
+    """Lookup indexes of the API data, built once per load of the data.
+
+    Indexes which need to decode the records of all hosts are only
+    built when first used.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.sites = list(data['hierarchy'])
+        self.site_clusters = {}
+        # site -> list of clusters
+        self.cluster_site = {}
+        self.cluster_hosts = {}
+        # cluster -> list of host shortnames
+        self.host_cluster = {}
+        self.host_site = {}
+        for site in self.sites:
+            self.site_clusters[site] = list(data['hierarchy'][site])
+            for cluster, hosts in data['hierarchy'][site].items():
+                self.cluster_site[cluster] = site
+                self.cluster_hosts[cluster] = hosts
+                for host in hosts:
+                    self.host_cluster[host] = cluster
+                    self.host_site[host] = site
+        self.clusters = list(data['clusters'])
+        self.cluster_queues = {}
+        self.queue_clusters = {}
+        for cluster in self.clusters:
+            queues = data['clusters'][cluster].get("queues")
+            if not queues:
+                queues = _default_cluster_queues
+            self.cluster_queues[cluster] = frozenset(queues)
+            for queue in queues:
+                self.queue_clusters.setdefault(queue, set()).add(cluster)
+        self.equipment_site = {}
+        for site in self.sites:
+            for equip in data['network'][site]:
+                self.equipment_site[equip] = site
+        self.queues_clusters = {}
+        # frozenset of queues -> set of the clusters in at least one
+        # of the queues
+        self.filtered_clusters = {}
+        # frozenset of queues -> list of all the clusters in at least
+        # one of the queues
+        self.host_equipments = {}
+        # host shortname -> list of network equipments, filled on
+        # demand
+        self.equipment_hosts = None
+        # network equipment -> list of host shortnames, built on
+        # first use
+        self.host_longnames = {}
+        # host name -> fully qualified name, filled on demand
+
+    def get_queues_clusters(self, queues):
+        clusters = self.queues_clusters.get(queues)
+        if clusters == None:
+            clusters = set()
+            for queue in queues:
+                clusters.update(self.queue_clusters.get(queue, ()))
+            self.queues_clusters[queues] = clusters
+        return clusters
+
+    def get_host_equipments(self, host):
+        equipments = self.host_equipments.get(host)
+        if equipments == None:
+            equipments = list(set([n['switch']
+                                   for n in self.data['hosts'][host]['network_adapters']
+                                   if 'switch' in n
+                                   and not n['management']
+                                   and n['mountable']
+                                   and n['switch']
+                                   and n['interface'] == 'Ethernet']))
+            self.host_equipments[host] = equipments
+        return equipments
+
+    def get_equipment_hosts(self):
+        if self.equipment_hosts == None:
+            equipment_hosts = {}
+            for host in self.host_cluster:
+                for equip in self.get_host_equipments(host):
+                    equipment_hosts.setdefault(equip, []).append(host)
+            self.equipment_hosts = equipment_hosts
+        return self.equipment_hosts
+
+_indexes = None
+
+def _get_api_indexes():
+    """Return the `execo_g5k.api_utils._APIIndexes` of the current API data, building them if needed."""
+    global _indexes
+    data = get_api_data()
+    indexes = _indexes
+    if indexes == None or indexes.data is not data:
+        with _data_lock:
+            if _indexes == None or _indexes.data is not data:
+                _indexes = _APIIndexes(data)
+            indexes = _indexes
+    return indexes
+
 def filter_clusters(clusters, queues = "default"):
     """Filter a list of clusters on their queue(s).
 
@@ -421,22 +823,20 @@ def filter_clusters(clusters, queues = "default"):
 
     if queues == None or queues == False:
         return clusters
-    queues = singleton_to_collection(queues)
+    indexes = _get_api_indexes()
+    queues_clusters = indexes.get_queues_clusters(frozenset(singleton_to_collection(queues)))
     filtered_clusters = []
     for cluster in clusters:
-        cluster_queues = get_cluster_attributes(cluster).get("queues")
-        if not cluster_queues:
-            cluster_queues = [ "admin", "default", "besteffort" ]
-        for q in queues:
-            if q in cluster_queues:
-                filtered_clusters.append(cluster)
-                break
+        if cluster not in indexes.cluster_queues:
+            raise KeyError(cluster)
+        if cluster in queues_clusters:
+            filtered_clusters.append(cluster)
     return filtered_clusters
 
 def get_g5k_sites():
 
     """Get the list of Grid5000 sites. Returns an iterable."""
-    return list(get_api_data()['hierarchy'])
+    return list(_get_api_indexes().sites)
 
 def get_site_clusters(site, queues = "default"):
     """Get the list of clusters from a site. Returns an iterable.
@@ -446,9 +846,10 @@ def get_site_clusters(site, queues = "default"):
     :param queues: queues filter, see
       `execo_g5k.api_utils.filter_clusters`
     """
-    if not site in get_g5k_sites():
+    indexes = _get_api_indexes()
+    if not site in indexes.site_clusters:
         raise ValueError("unknown g5k site %s" % (site,))
-    return filter_clusters(list(get_api_data()['hierarchy'][site]), queues)
+    return filter_clusters(list(indexes.site_clusters[site]), queues)
 
 def get_site_hosts(site, queues = "default"):
     """Get the list of hosts from a site. Returns an iterable.
@@ -458,8 +859,6 @@ def get_site_hosts(site, queues = "default"):
     :param queues: queues filter, see
       `execo_g5k.api_utils.filter_clusters`
     """
-    if not site in get_g5k_sites():
-        raise ValueError("unknown g5k site %s" % (site,))
     hosts = []
     for cluster in get_site_clusters(site, queues):
         hosts += get_cluster_hosts(cluster)
@@ -467,22 +866,23 @@ def get_site_hosts(site, queues = "default"):
 
 def get_site_network_equipments(site):
     """Get the list of network elements from a site. Returns an iterable."""
-    if not site in get_g5k_sites():
+    if not site in _get_api_indexes().site_clusters:
         raise ValueError("unknown g5k site %s" % (site,))
     return list(get_api_data()['network'][site])
 
 def get_cluster_hosts(cluster):
     """Get the list of hosts from a cluster. Returns an iterable."""
-    for site in get_g5k_sites():
-        if cluster in get_site_clusters(site, queues = None):
-            return get_api_data()['hierarchy'][site][cluster]
-    raise ValueError("unknown g5k cluster %s" % (cluster,))
+    hosts = _get_api_indexes().cluster_hosts.get(cluster)
+    if hosts == None:
+        raise ValueError("unknown g5k cluster %s" % (cluster,))
+    return hosts
 
 def get_cluster_network_equipments(cluster):
     """Get the list of the network equipments used by a cluster"""
-    if cluster in get_g5k_clusters():
-        return list(set([e for h in get_cluster_hosts(cluster, queues = None)
-                    for e in get_host_network_equipments(h)]))
+    indexes = _get_api_indexes()
+    if cluster in indexes.cluster_hosts:
+        return list(set([e for h in indexes.cluster_hosts[cluster]
+                         for e in indexes.get_host_equipments(h)]))
     raise ValueError("unknown g5k cluster %s" % (cluster,))
 
 def get_g5k_clusters(queues = "default"):
@@ -491,7 +891,15 @@ def get_g5k_clusters(queues = "default"):
     :param queues: queues filter, see
       `execo_g5k.api_utils.filter_clusters`
     """
-    return filter_clusters(list(get_api_data()['clusters']), queues)
+    indexes = _get_api_indexes()
+    if queues == None or queues == False:
+        return list(indexes.clusters)
+    queues = frozenset(singleton_to_collection(queues))
+    clusters = indexes.filtered_clusters.get(queues)
+    if clusters == None:
+        clusters = filter_clusters(indexes.clusters, queues)
+        indexes.filtered_clusters[queues] = clusters
+    return list(clusters)
 
 def get_g5k_hosts(queues = "default"):
     """Get the list of all g5k hosts. Returns an iterable.
@@ -506,13 +914,27 @@ def get_g5k_hosts(queues = "default"):
 
 def get_cluster_site(cluster):
     """Get the site of a cluster."""
-    for site in get_g5k_sites():
-        if cluster in get_site_clusters(site, queues = None):
-            return site
-    raise ValueError("unknown g5k cluster %s" % (cluster,))
+    site = _get_api_indexes().cluster_site.get(cluster)
+    if site == None:
+        raise ValueError("unknown g5k cluster %s" % (cluster,))
+    return site
 
 __g5k_host_group_regex = re.compile("^([a-zA-Z]+)-\d+(\.(\w+))?")
 
+__host_groups = {}
+# host name -> tuple (cluster, site or None) parsed from the name
+
+def __get_host_group(host):
+    group = __host_groups.get(host)
+    if group == None:
+        m = __g5k_host_group_regex.match(canonical_host_name(host))
+        if m:
+            group = (m.group(1), m.group(3))
+        else:
+            group = (None, None)
+        __host_groups[host] = group
+    return group
+
 def get_host_cluster(host):
     """Get the cluster of a host.
 
@@ -520,10 +942,7 @@ def get_host_cluster(host):
     """
     if isinstance(host, execo.Host):
         host = host.address
-    host = canonical_host_name(host)
-    m = __g5k_host_group_regex.match(host)
-    if m: return m.group(1)
-    else: return None
+    return __get_host_group(host)[0]
 
 def get_host_site(host):
     """Get the site of a host.
@@ -532,34 +951,31 @@ def get_host_site(host):
     """
     if isinstance(host, execo.Host):
         host = host.address
-    host = canonical_host_name(host)
-    m = __g5k_host_group_regex.match(host)
-    if m:
-        if m.group(3):
-            return m.group(3)
-        else:
-            return get_cluster_site(m.group(1))
+    (cluster, site) = __get_host_group(host)
+    if site:
+        return site
+    elif cluster:
+        site = _get_api_indexes().host_site.get(get_host_shortname(host))
+        if site:
+            return site
+        return get_cluster_site(cluster)
     else: return None 
 
 def get_host_network_equipments(host):
     """"""
     _host = get_host_shortname(host)
-    if _host in get_g5k_hosts():
-        return list(set([n['switch']
-                         for n in get_host_attributes(_host)['network_adapters']
-                         if 'switch' in n
-                         and not n['management']
-                         and n['mountable']
-                         and n['switch']
-                         and n['interface'] == 'Ethernet']))
+    indexes = _get_api_indexes()
+    if _host in indexes.host_cluster:
+        return list(indexes.get_host_equipments(_host))
     raise ValueError("unknown g5k host %s" % (host,))
 
 def get_network_equipment_site(equip):
     """Return the site of a network_equipment"""
-    for site in get_g5k_sites():
-        if equip in get_site_network_equipments(site):
-            return site 
-    return None
+    return _get_api_indexes().equipment_site.get(equip)
+
+def get_network_equipment_hosts(equip):
+    """Return the list of the hosts connected to a network equipment"""
+    return list(_get_api_indexes().get_equipment_hosts().get(equip, []))
 
 def group_hosts(hosts):
     """Given a sequence of hosts, group them in a dict by sites and clusters"""
@@ -593,6 +1009,9 @@ def get_network_equipment_attributes(equip):
 
 __canonical_host_name_regex = re.compile("^([a-zA-Z]+-\d+)(-kavlan-\d+)?(\.([.\w]+))?")
 
+__canonical_host_names = {}
+# host name -> canonical host name
+
 def __canonical_sub_func(matchobj):
     n = matchobj.group(1)
     if matchobj.lastindex >= 3:
@@ -606,19 +1025,27 @@ def canonical_host_name(host):
     Can be given a string, will return a string.
     Works with short or fqdn forms of hostnames.
     """
-    h = execo.Host(host)
-    h.address = __canonical_host_name_regex.sub(__canonical_sub_func, h.address)
     if isinstance(host, execo.Host):
+        h = execo.Host(host)
+        h.address = __canonical_host_name_regex.sub(__canonical_sub_func, h.address)
         return h
-    else:
-        return h.address
+    name = __canonical_host_names.get(host)
+    if name == None:
+        name = __canonical_host_name_regex.sub(__canonical_sub_func, host)
+        __canonical_host_names[host] = name
+    return name
+
+__host_shortnames = {}
+# host name -> host shortname
 
 def get_host_shortname(host):
     """Convert, if needed, the host name to its shortname"""
     if isinstance(host, execo.Host):
         host = host.address
-    host = canonical_host_name(host)
-    host_shortname, _, _ = host.partition(".")
+    host_shortname = __host_shortnames.get(host)
+    if host_shortname == None:
+        host_shortname, _, _ = canonical_host_name(host).partition(".")
+        __host_shortnames[host] = host_shortname
     return host_shortname
 
 __host_longname_regex = re.compile("^([^.]*)(\.([^.]+))?")
@@ -630,29 +1057,64 @@ def get_host_longname(host):
     mo = __host_longname_regex.match(host)
     host_shortname = mo.group(1)
     if mo.group(3):
-        host_site = mo.group(3)
-    else:
-        host_site = get_host_site(host_shortname)
-    return host_shortname + "." + host_site + ".grid5000.fr"
-
-def __get_site_metrics(site, grouped_hosts, metric, from_ts, to_ts, resolution):
-    threading.currentThread().res = {}
-    hosts_site = [ h for cluster in grouped_hosts[site].values() for h in cluster ]
-    path = "sites/%s/metrics/%s/timeseries?resolution=%s&only=%s%s%s" \
-           % (site, metric, resolution,
-              ','.join([ get_host_shortname(host) for host in hosts_site ]),
-              '&from=' + str(from_ts) if from_ts else '',
-              '&to=' + str(to_ts) if to_ts else '')
-    for host in hosts_site:
-        for apires in get_resource_attributes(path)['items']:
-            if get_host_shortname(host) == apires['uid']:
-                threading.currentThread().res[host] = [
-                    (apires['timestamps'][i], apires['values'][i])
-                    for i in range(len(apires['values']))]
-
-def get_hosts_metric(hosts, metric, from_ts=None, to_ts=None, resolution=1):
+        return host_shortname + "." + mo.group(3) + ".grid5000.fr"
+    longnames = _get_api_indexes().host_longnames
+    longname = longnames.get(host)
+    if longname == None:
+        longname = host_shortname + "." + get_host_site(host_shortname) + ".grid5000.fr"
+        longnames[host] = longname
+    return longname
+
+_metrics_max_path_length = 4000
+# maximum length of the path of a metrology request: the hosts of a
+# site are split in several requests if needed
+
+def _get_site_metrics_paths(site, uids, metric, from_ts, to_ts, resolution):
+    """Return the paths of the metrology requests for the hosts uids of a site."""
+    prefix = "sites/%s/metrics/%s/timeseries?resolution=%s&only=" % (site, metric, resolution)
+    suffix = "%s%s" % ('&from=' + str(from_ts) if from_ts else '',
+                       '&to=' + str(to_ts) if to_ts else '')
+    paths = []
+    chunk = []
+    length = len(prefix) + len(suffix)
+    for uid in uids:
+        if chunk and length + len(uid) + 1 > _metrics_max_path_length:
+            paths.append(prefix + ','.join(chunk) + suffix)
+            chunk = []
+            length = len(prefix) + len(suffix)
+        chunk.append(uid)
+        length += len(uid) + 1
+    if chunk:
+        paths.append(prefix + ','.join(chunk) + suffix)
+    return paths
+
+def _resample_metrics(res, period, from_ts, to_ts):
+    """Linearly interpolate (timestamps, values) arrays of res on a common grid of multiples of period."""
+    series = [ s for s in res.values() if len(s[0]) > 0 ]
+    if not series:
+        return res
+    start = from_ts if from_ts else min([ s[0].min() for s in series ])
+    stop = to_ts if to_ts else max([ s[0].max() for s in series ])
+    first = numpy.ceil(start / period) * period
+    grid = first + period * numpy.arange(max(int(numpy.floor((stop - first) / period)) + 1, 0))
+    resampled = {}
+    for host, (timestamps, values) in res.items():
+        if len(timestamps) == 0:
+            resampled[host] = (grid, numpy.full(len(grid), numpy.nan))
+            continue
+        order = numpy.argsort(timestamps, kind='mergesort')
+        resampled[host] = (grid, numpy.interp(grid, timestamps[order], values[order],
+                                              left=numpy.nan, right=numpy.nan))
+    return resampled
+
+def get_hosts_metric(hosts, metric, from_ts=None, to_ts=None, resolution=1,
+                     arrays=False, resample=None):
     """Get metric values from Grid'5000 metrology API
 
+    The metrics of all the hosts of a site are retrieved with a single
+    request (or a few requests if there are many hosts), requests to
+    different sites being done concurrently.
+
     :param hosts: List of hosts
 
     :param metric: Grid'5000 metrology metric to fetch (eg: "power",
@@ -667,27 +1129,95 @@ def get_hosts_metric(hosts, metric, from_ts=None, to_ts=None, resolution=1):
     :param resolution: time resolution, in any type supported by
       `execo.time_utils.get_seconds`, default 1 second.
 
+    :param arrays: if True, the metric values of each host are
+      returned as a tuple of numpy arrays (timestamps, values), with
+      NaN for missing values. Needs numpy.
+
+    :param resample: if not None, a period, in any type supported by
+      `execo.time_utils.get_seconds`. The metric values of all hosts
+      are then linearly interpolated on a common grid of timestamps
+      multiple of this period, from from_ts (or the earliest
+      timestamp) to to_ts (or the latest timestamp), with NaN outside
+      of the timestamps of each host. Implies arrays.
+
     :return: A dict of host -> List of (timestamp, metric value)
-      retrieved from API
+      retrieved from API, or, with arrays or resample, a dict of host
+      -> tuple (timestamps, values) of numpy arrays.
     """
+    if (arrays or resample != None) and not numpy:
+        raise ValueError("numpy is needed to get metrics as arrays")
     from_ts = get_unixts(from_ts)
     to_ts = get_unixts(to_ts)
     resolution = get_seconds(resolution)
-    grouped_hosts = group_hosts(hosts)
+    hosts_by_uid = {}
+    site_uids = {}
+    for host in hosts:
+        uid = get_host_shortname(host)
+        if uid not in hosts_by_uid:
+            hosts_by_uid[uid] = []
+            site_uids.setdefault(get_host_site(host), []).append(uid)
+        hosts_by_uid[uid].append(host)
+    paths = [ p for site in sorted(site_uids)
+              for p in _get_site_metrics_paths(site, site_uids[site], metric, from_ts, to_ts, resolution) ]
+    if not paths:
+        return {}
+    pool = ThreadPool(min(len(paths), g5k_configuration.get('api_max_workers')))
+    try:
+        results = pool.map(get_resource_attributes, paths)
+    finally:
+        pool.terminate()
+        pool.join()
     res = {}
-    site_threads = []
-    for site in grouped_hosts:
-        site_th = threading.Thread(
-            target=__get_site_metrics,
-            args=(site, grouped_hosts, metric, from_ts, to_ts, resolution)
-            )
-        site_th.start()
-        site_threads.append(site_th)
-    for site_th in site_threads:
-        site_th.join()
-        res.update(site_th.res)
+    for attributes in results:
+        for item in attributes['items']:
+            if arrays or resample != None:
+                series = (numpy.array(item['timestamps'], dtype=float),
+                          numpy.array(item['values'], dtype=float))
+            else:
+                series = list(zip(item['timestamps'], item['values']))
+            for host in hosts_by_uid.get(item['uid'], []):
+                res[host] = series
+    if resample != None:
+        res = _resample_metrics(res, float(get_seconds(resample)), from_ts, to_ts)
     return res
 
+class HostsMetricSource(object):
+    """Metrics source of the Grid'5000 metrology API, for `execo_engine.timeseries.MetricsCollector`.
+
+    Each call fetches, with `execo_g5k.api_utils.get_hosts_metric`,
+    the values of a metric of hosts since the watermark, as series
+    ``<host shortname>/<metric>``.
+    """
+
+    def __init__(self, hosts, metric, resolution=1, from_ts=None):
+        """
+        :param hosts: List of hosts
+
+        :param metric: Grid'5000 metrology metric to fetch (eg: "power",
+          "cpu_user")
+
+        :param resolution: time resolution, in any type supported by
+          `execo.time_utils.get_seconds`, default 1 second.
+
+        :param from_ts: Time from which metric is collected at the
+          first call (without watermark), in any type supported by
+          `execo.time_utils.get_unixts`. Defaults to the creation of
+          the source.
+        """
+        self.hosts = hosts
+        self.metric = metric
+        self.resolution = resolution
+        if from_ts == None:
+            from_ts = time.time()
+        self.from_ts = get_unixts(from_ts)
+
+    def __call__(self, watermark):
+        if watermark == None:
+            watermark = self.from_ts
+        values = get_hosts_metric(self.hosts, self.metric, from_ts=watermark, resolution=self.resolution)
+        return dict([ (get_host_shortname(host) + "/" + self.metric, points)
+                      for host, points in values.items() ])
+
 def set_nodes_vlan(site, hosts, interface, vlan_id):
     """Set the interface of a list of hosts in a given vlan
 
@@ -710,6 +1240,6 @@ def set_nodes_vlan(site, hosts, interface, vlan_id):
         splitted[0] = splitted[0] + "-" + interface
         return ".".join(splitted)
 
-    network_addresses = map(_to_network_address, hosts)
+    network_addresses = [ _to_network_address(host) for host in hosts ]
     logger.info("Setting %s in vlan %s of site %s" % (network_addresses, vlan_id, site))
     return _get_g5k_api().post('/sites/%s/vlans/%s' % (site, str(vlan_id)), {"nodes": network_addresses})
@@ -35,6 +35,10 @@ g5k_configuration = {
     'api_additional_args': {},
     'api_timeout': 30,
     'api_verify_ssl_cert': True,
+    'api_max_workers': 16,
+    'api_retries': 3,
+    'api_retry_backoff': 0.5,
+    'api_max_rate': None,
     'oar_job_key_file': None,
     'oar_pgsql_ro_db': 'oar2',
     'oar_pgsql_ro_user': 'oarreader',
@@ -94,6 +98,20 @@ g5k_configuration = {
 - ``api_verify_ssl_cert``: If set to false, will disable ssl
   certificates check for api https requests
 
+- ``api_max_workers``: maximum number of concurrent requests to the
+  api, when retrieving many resources (for example when filling the
+  api cache). Also the number of kept-alive connections.
+
+- ``api_retries``: number of retries of api GET requests failing
+  with a connection error or a 429, 500, 502, 503, 504 http status.
+
+- ``api_retry_backoff``: backoff factor of retries: retry n waits
+  api_retry_backoff * 2^(n-1) seconds.
+
+- ``api_max_rate``: maximum rate of api requests, in requests per
+  second, to stay under api quotas. Requests exceeding it are
+  delayed. None for no limit.
+
 - ``oar_job_key_file``: ssh key to use for oar. If defined, takes
   precedence over environment variable OAR_JOB_KEY_FILE.
 
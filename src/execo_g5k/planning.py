@@ -113,13 +113,16 @@ def get_planning(elements=['grid5000'], vlan=False, subnet=False, storage=False,
     if 'grid5000' in elements:
         sites = elements = get_g5k_sites()
     else:
+        g5k_sites = set(get_g5k_sites())
+        g5k_clusters = set(get_g5k_clusters(queues=queues))
+        g5k_hosts = set(get_g5k_hosts())
         sites = list(set([site for site in elements
-                          if site in get_g5k_sites()] + 
+                          if site in g5k_sites] + 
                          [get_cluster_site(cluster) for cluster in elements
-                          if cluster in get_g5k_clusters(queues=queues)] +
+                          if cluster in g5k_clusters] +
                          [get_host_site(host) for host in elements
-                          if host in get_g5k_hosts()
-                          or get_host_shortname(host) in get_g5k_hosts()]))
+                          if host in g5k_hosts
+                          or get_host_shortname(host) in g5k_hosts]))
     if len(sites) == 0:
         logger.error('Wrong elements given: %s' % (elements,))
         return None
@@ -208,6 +211,7 @@ def compute_slots(planning, walltime, excluded_elements=None):
             else:
                 kavlan = True
 
+    g5k_clusters = set(get_g5k_clusters(queues=None))
     for limit in limits:
         log = ''
         free_elements = {'grid5000': 0}
@@ -220,7 +224,7 @@ def compute_slots(planning, walltime, excluded_elements=None):
 
             for cluster, cluster_planning in site_planning.items():
 
-                if cluster in get_g5k_clusters(queues=None):
+                if cluster in g5k_clusters:
                     free_elements[cluster] = 0
                     for host, host_planning in cluster_planning.items():
                         host_free = False
@@ -282,6 +286,7 @@ def compute_coorm_slots(planning, excluded_elements=None):
     """ """
     slots = []
     limits = _slots_limits(planning)
+    g5k_clusters = set(get_g5k_clusters(queues=None))
     for start in limits:
         stop = 10 ** 25
         free_cores = {'grid5000': 0}
@@ -289,7 +294,7 @@ def compute_coorm_slots(planning, excluded_elements=None):
             free_cores[site] = 0
             for cluster, cluster_planning in site_planning.items():
                 free_cores[cluster] = 0
-                if cluster in get_g5k_clusters(queues=None):
+                if cluster in g5k_clusters:
                     for host, host_planning in cluster_planning.items():
                         for free_slot in host_planning['free']:
                             if free_slot[0] <= start and free_slot[0] < stop:
@@ -416,11 +421,12 @@ def get_hosts_jobs(hosts, walltime, out_of_chart=False):
     planning = get_planning(elements=hosts, out_of_chart=out_of_chart)
     limits = _slots_limits(planning)
     walltime = get_seconds(walltime)
+    g5k_clusters = set(get_g5k_clusters(queues=None))
     for limit in limits:
         all_host_free = True
         for site_planning in planning.values():
             for cluster, cluster_planning in site_planning.items():
-                if cluster in get_g5k_clusters(queues=None):
+                if cluster in g5k_clusters:
                     for host_planning in cluster_planning.values():
                         host_free = False
                         for free_slot in host_planning['free']:
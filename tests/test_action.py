@@ -0,0 +1,103 @@
+import os, sys, shutil, stat, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from execo import Host, TaktukSession
+
+_fake_taktuk = """#!%s
+# minimal taktuk interactive mode, running the commands locally for
+# each host given with -m, with the output templates of execo
+import sys, os, re, signal, subprocess, threading, time
+hosts = [ sys.argv[i + 1] for i in range(len(sys.argv) - 1) if sys.argv[i] == "-m" ]
+output_lock = threading.Lock()
+running = set()
+
+def output(s):
+    with output_lock:
+        sys.stdout.write(s)
+        sys.stdout.flush()
+
+def forward(pipe, header, position):
+    for line in iter(pipe.readline, b""):
+        output("%%s %%i # %%s" %% (header, position, line.decode()))
+
+def execute(position, cmd):
+    # commands start after the latency of the deployment tree
+    time.sleep(0.5)
+    process = subprocess.Popen(cmd, shell = True, stdout = subprocess.PIPE,
+                               stderr = subprocess.PIPE, start_new_session = True)
+    running.add(process)
+    output("E %%i # 0 # 6 # command started\\n" %% (position,))
+    readers = [ threading.Thread(target = forward, args = (process.stdout, "A", position)),
+                threading.Thread(target = forward, args = (process.stderr, "B", position)) ]
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+    exit_code = process.wait()
+    running.discard(process)
+    # like taktuk, the status does not wait for the end of the
+    # outputs of background processes
+    for reader in readers:
+        reader.join(0.2)
+    output("C %%i # %%i\\n" %% (position, exit_code))
+
+for line in iter(sys.stdin.readline, ""):
+    line = line.strip()
+    match = re.match(r"^(broadcast|\\d+) exec \\[ (.*) \\]$", line)
+    if match:
+        cmd = match.group(2).replace("\\\\[", "[").replace("\\\\]", "]")
+        if match.group(1) == "broadcast":
+            positions = range(1, len(hosts) + 1)
+        else:
+            positions = [ int(match.group(1)) ]
+        for position in positions:
+            thread = threading.Thread(target = execute, args = (position, cmd))
+            thread.daemon = True
+            thread.start()
+    elif line == "broadcast kill":
+        for process in list(running):
+            os.killpg(process.pid, signal.SIGTERM)
+    elif line == "quit":
+        break
+"""
+
+class TestTaktukSession(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.taktuk = os.path.join(self.directory, "taktuk")
+        with open(self.taktuk, "w") as f:
+            f.write(_fake_taktuk % (sys.executable,))
+        os.chmod(self.taktuk, stat.S_IRWXU)
+        self.hosts = [ Host("host-1"), Host("host-2") ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_two_actions_in_a_row(self):
+        with TaktukSession(self.hosts, connection_params = { "taktuk": self.taktuk }) as session:
+            # the output of the background process of the first action
+            # arrives after its end, while the command of the second
+            # action is sent but not yet started
+            first = session.run("(sleep 0.45; echo late; echo late >&2) & echo first")
+            second = session.run("sleep 1; echo second; echo error >&2")
+        for process in first.processes:
+            self.assertEqual(process.stdout, "first\n")
+            self.assertEqual(process.stderr, "")
+        for process in second.processes:
+            self.assertEqual(process.stdout, "second\n")
+            self.assertEqual(process.stderr, "error\n")
+        self.assertTrue(first.ok)
+        self.assertTrue(second.ok)
+
+    def test_action_after_killed_action(self):
+        with TaktukSession(self.hosts, connection_params = { "taktuk": self.taktuk }) as session:
+            first = session.run("echo first; sleep 10", timeout = 1)
+            second = session.run("echo second")
+        for process in first.processes:
+            self.assertEqual(process.stdout, "first\n")
+            self.assertTrue(process.killed)
+        for process in second.processes:
+            self.assertEqual(process.stdout, "second\n")
+        self.assertTrue(second.ok)
+
+if __name__ == "__main__":
+    unittest.main()
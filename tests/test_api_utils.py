@@ -0,0 +1,138 @@
+import os, sys, json, shutil, tempfile, threading, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+if sys.version_info >= (3,):
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+try:
+    import requests
+except ImportError:
+    requests = None
+if requests:
+    from execo_g5k.config import g5k_configuration
+    import execo_g5k.api_utils as api_utils
+
+_sites = { "grenoble": [ "grea", "greb" ], "lyon": [ "lyoa" ] }
+
+def _build_api_tree(version):
+    # resources of a small mock reference API, by path
+    tree = { "": { "version": version },
+             "sites": { "items": [ { "uid": site } for site in sorted(_sites) ] },
+             "network_equipments": { "items": [ { "uid": "renater", "version": version } ] } }
+    for site, clusters in _sites.items():
+        tree["sites/" + site] = { "uid": site, "version": version }
+        tree["sites/%s/network_equipments" % site] = { "items": [ { "uid": "sw-" + site, "linecards": [] } ] }
+        tree["sites/%s/clusters" % site] = { "items": [ { "uid": cluster } for cluster in clusters ] }
+        for cluster in clusters:
+            tree["sites/%s/clusters/%s" % (site, cluster)] = { "uid": cluster, "queues": [ "default" ] }
+            tree["sites/%s/clusters/%s/nodes" % (site, cluster)] = { "items": [
+                    { "uid": "%s-%i" % (cluster, i), "network_adapters": [] } for i in (1, 2) ] }
+    return tree
+
+class _MockAPIHandler(BaseHTTPRequestHandler):
+
+    # serves server.tree, answering 503 to the first request of
+    # each path if server.fail_first is True
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def __respond(self, status, body = b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].strip("/")[len("api"):].strip("/")
+        with self.server.lock:
+            self.server.requests.append(path)
+            first = self.server.requests.count(path) == 1
+        if self.server.fail_first and first:
+            self.server.num_503 += 1
+            self.__respond(503)
+        elif path not in self.server.tree:
+            self.__respond(404)
+        else:
+            self.__respond(200, json.dumps(self.server.tree[path]).encode("utf-8"))
+
+class _MockAPIServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+@unittest.skipIf(requests == None, "requests is not installed")
+class TestAPICrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _MockAPIServer(("127.0.0.1", 0), _MockAPIHandler)
+        self.server.tree = _build_api_tree("v1")
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.num_503 = 0
+        self.server.fail_first = False
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.saved_configuration = dict(g5k_configuration)
+        g5k_configuration["api_uri"] = "http://127.0.0.1:%i/api/" % self.server.server_address[1]
+        g5k_configuration["api_retries"] = 3
+        g5k_configuration["api_retry_backoff"] = 0.01
+        api_utils._g5k_api = None
+        api_utils._data = None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        g5k_configuration.clear()
+        g5k_configuration.update(self.saved_configuration)
+        api_utils._g5k_api = None
+        api_utils._data = None
+
+    def check_api_data(self, data):
+        self.assertEqual(sorted(data), sorted(api_utils._api_data_keys))
+        self.assertEqual(data["hierarchy"], {
+                "grenoble": { "grea": [ "grea-1", "grea-2" ], "greb": [ "greb-1", "greb-2" ] },
+                "lyon": { "lyoa": [ "lyoa-1", "lyoa-2" ] } })
+        self.assertEqual(data["sites"]["lyon"], { "uid": "lyon", "version": "v1" })
+        self.assertEqual(data["clusters"]["greb"], { "uid": "greb", "queues": [ "default" ] })
+        self.assertEqual(sorted(data["hosts"]),
+                         [ "grea-1", "grea-2", "greb-1", "greb-2", "lyoa-1", "lyoa-2" ])
+        self.assertEqual(data["hosts"]["lyoa-2"], { "uid": "lyoa-2", "network_adapters": [] })
+        self.assertEqual(data["network"]["backbone"], [ { "uid": "renater", "version": "v1" } ])
+        self.assertEqual(data["network"]["grenoble"], { "sw-grenoble": { "uid": "sw-grenoble", "linecards": [] } })
+
+    def test_crawl(self):
+        self.check_api_data(api_utils._get_api())
+        self.assertEqual(self.server.num_503, 0)
+
+    def test_crawl_retries_503(self):
+        self.server.fail_first = True
+        self.check_api_data(api_utils._get_api())
+        # each resource was requested twice: once answered 503, then retried
+        self.assertTrue(self.server.num_503 > 0)
+        self.assertEqual(self.server.num_503, len(set(self.server.requests)))
+        self.assertEqual(len(self.server.requests), 2 * len(set(self.server.requests)))
+
+    def test_get_api_data_same_type_with_cache(self):
+        cache_dir = tempfile.mkdtemp() + "/"
+        try:
+            crawled = api_utils.get_api_data(cache_dir)
+            num_requests = len(self.server.requests)
+            api_utils._data = None
+            cached = api_utils.get_api_data(cache_dir)
+            # only the API version was checked
+            self.assertEqual(self.server.requests[num_requests:], [ "" ])
+            for key in api_utils._api_data_keys:
+                self.assertEqual(type(crawled[key]), type(cached[key]))
+                self.assertEqual(json.dumps(crawled[key].copy(), sort_keys = True),
+                                 json.dumps(cached[key].copy(), sort_keys = True))
+            self.check_api_data(dict([ (key, cached[key].copy()) for key in cached ]))
+        finally:
+            shutil.rmtree(cache_dir)
+
+if __name__ == "__main__":
+    unittest.main()
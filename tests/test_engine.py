@@ -0,0 +1,56 @@
+import os, sys, shutil, tempfile, threading, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from execo_engine import Engine, ParamSweeper, sweep
+
+def _unpicklable_result(combination):
+    return threading.Lock()
+
+def _square(combination):
+    return combination["a"] ** 2
+
+class TestRunSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.engine.result_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.engine.result_dir)
+
+    def run_sweep(self, func, mode):
+        sweeper = ParamSweeper(os.path.join(self.engine.result_dir, "sweeps"),
+                               sweep({ "a": list(range(6)) }))
+        thread = threading.Thread(target = self.engine.run_sweep,
+                                  args = (sweeper, func),
+                                  kwargs = { "workers": 2, "mode": mode })
+        thread.daemon = True
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive(), "run_sweep did not return")
+        return sweeper
+
+    def test_process_mode(self):
+        sweeper = self.run_sweep(_square, "process")
+        self.assertEqual(len(sweeper.get_done()), 6)
+
+    def test_process_mode_unpicklable_result(self):
+        sweeper = self.run_sweep(_unpicklable_result, "process")
+        self.assertEqual(len(sweeper.get_skipped()), 6)
+        self.assertEqual(len(sweeper.get_remaining()), 0)
+
+    def check_unpicklable_func(self, func):
+        sweeper = ParamSweeper(os.path.join(self.engine.result_dir, "sweeps"),
+                               sweep({ "a": list(range(6)) }))
+        self.assertRaises(ValueError, self.engine.run_sweep, sweeper, func,
+                          workers = 2, mode = "process")
+        self.assertEqual(len(sweeper.get_remaining()), 6)
+
+    def test_process_mode_unpicklable_func(self):
+        self.check_unpicklable_func(lambda combination: combination["a"])
+
+    def test_process_mode_engine_method(self):
+        self.engine.sweeper = ParamSweeper(os.path.join(self.engine.result_dir, "other"), [ 1 ])
+        self.check_unpicklable_func(self.engine.run_sweep)
+
+if __name__ == "__main__":
+    unittest.main()
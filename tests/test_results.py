@@ -0,0 +1,83 @@
+import os, sys, glob, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from execo_engine.results import ResultStore
+from execo_engine.sweep import Combination
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self):
+        # three chunks: two npz (if numpy is available), and a pickle
+        # one, with results appended several times for some
+        # combinations, and a factor absent from some combinations
+        with ResultStore(self.directory, flush_interval = 3600) as store:
+            for i in range(4):
+                store.append({ "n": i, "mode": "a" }, { "bw": 1.0 * i })
+            store.flush()
+            store.append({ "n": 1, "mode": "a" }, { "bw": 10.0 })
+            store.append({ "n": 4, "mode": "b" }, { "bw": 4.0 })
+            store.flush()
+            store.append({ "n": 2, "mode": "a" }, { "bw": 20.0, "note": ("x", 1) })
+            store.append({ "n": 5 }, 5.0)
+        self.assertEqual(len(glob.glob(os.path.join(self.directory, "chunk-*"))), 3)
+
+    def expected(self):
+        # rows, ordered by last append
+        return [ ({ "n": 0, "mode": "a" }, { "bw": 0.0 }),
+                 ({ "n": 3, "mode": "a" }, { "bw": 3.0 }),
+                 ({ "n": 1, "mode": "a" }, { "bw": 10.0 }),
+                 ({ "n": 4, "mode": "b" }, { "bw": 4.0 }),
+                 ({ "n": 2, "mode": "a" }, { "bw": 20.0, "note": ("x", 1) }),
+                 ({ "n": 5 }, { "result": 5.0 }) ]
+
+    def expected_columns(self):
+        rows = self.expected()
+        keys = set()
+        for (combination, result) in rows:
+            keys.update(combination)
+            keys.update(result)
+        return dict([ (key, [ combination.get(key, result.get(key)) for (combination, result) in rows ])
+                      for key in keys ])
+
+    def test_get_results(self):
+        self.fill()
+        results = ResultStore(self.directory).get_results()
+        self.assertEqual(results, dict([ (Combination(combination), result)
+                                         for (combination, result) in self.expected() ]))
+        for combination in results:
+            self.assertTrue(isinstance(combination, Combination))
+
+    def test_load_lists(self):
+        self.fill()
+        columns = ResultStore(self.directory).load(arrays = False)
+        self.assertEqual(columns, self.expected_columns())
+        for column in columns.values():
+            self.assertTrue(isinstance(column, list))
+
+    @unittest.skipIf(numpy == None, "numpy is not installed")
+    def test_load_arrays(self):
+        self.fill()
+        columns = ResultStore(self.directory).load()
+        expected = self.expected_columns()
+        self.assertEqual(sorted(columns), sorted(expected))
+        for key in expected:
+            self.assertEqual(columns[key].tolist(), expected[key])
+        self.assertEqual(columns["n"].dtype.kind, "i")
+        self.assertEqual(columns["bw"].dtype, object)
+        self.assertEqual(columns["mode"].dtype, object)
+
+    def test_load_empty(self):
+        self.assertEqual(ResultStore(self.directory).load(), {})
+        self.assertEqual(ResultStore(self.directory).get_results(), {})
+
+if __name__ == "__main__":
+    unittest.main()
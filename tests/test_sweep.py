@@ -0,0 +1,121 @@
+import os, sys, shutil, stat, tempfile, unittest, json, multiprocessing, multiprocessing.connection
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from execo_engine.sweep import ParamSweeper, ParamSweeperCoordinator, sweep, isweep, \
+    HashableDict, random_sweep, latin_hypercube_sweep, fractional_factorial_sweep
+
+class TestCombinations(unittest.TestCase):
+
+    def test_sweep_returns_dicts(self):
+        parameters = { "a": [ 1, 2 ], "b": { "x": { "c": [ 3 ] }, "y": {} } }
+        for combinations in (sweep(parameters),
+                             random_sweep(parameters, 2, seed = 0),
+                             latin_hypercube_sweep({ "a": [ 1, 2 ], "b": [ 3, 4 ] }, 2, seed = 0),
+                             fractional_factorial_sweep({ "a": [ 1, 2 ], "b": [ 3, 4 ], "c": [ 5, 6 ] },
+                                                        { "c": [ "a", "b" ] })):
+            for combination in combinations:
+                self.assertTrue(isinstance(combination, HashableDict))
+                self.assertEqual(json.loads(json.dumps(combination)), combination)
+
+    def test_isweep_combinations_mix_with_sweep(self):
+        parameters = { "a": [ 1, 2 ], "b": [ "x", "y" ] }
+        lazy = list(isweep(parameters))
+        self.assertEqual(lazy, sweep(parameters))
+        self.assertEqual(set(lazy), set(sweep(parameters)))
+        self.assertEqual(json.loads(json.dumps(lazy[0].copy())), lazy[0])
+
+class TestLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.persistence_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.persistence_dir)
+
+    def check_renew_keeps_other_claims(self, storage):
+        sweeps = sweep({ "a": list(range(20)) })
+        a = ParamSweeper(self.persistence_dir, sweeps, save_sweeps = True,
+                         storage = storage, lease_duration = 3600)
+        b = ParamSweeper(self.persistence_dir, sweeps, storage = storage,
+                         lease_duration = 3600)
+        claimed_a = [ a.get_next() ]
+        claimed_b = b.get_next_batch(2)
+        a._renew_leases()
+        claimed_a += a.get_next_batch(10)
+        self.assertEqual(len(claimed_b), 2)
+        self.assertEqual(set(claimed_a).intersection(claimed_b), set())
+        b.update()
+        self.assertEqual(set(b.get_inprogress()), set(claimed_a + claimed_b))
+
+    def test_renew_keeps_other_claims_pickle(self):
+        self.check_renew_keeps_other_claims("pickle")
+
+    def test_renew_keeps_other_claims_sqlite(self):
+        self.check_renew_keeps_other_claims("sqlite")
+
+def _coordinator_client(address, authkey, sweeps, results):
+    sweeper = ParamSweeper(None, sweeps, coordinator = address, authkey = authkey)
+    processed = []
+    while True:
+        combination = sweeper.get_next()
+        if combination == None:
+            break
+        processed.append(combination)
+        sweeper.done(combination)
+    results.put(processed)
+
+class TestCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.persistence_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.persistence_dir)
+
+    def check_clients(self, address, num_clients = 4):
+        sweeps = sweep({ "a": list(range(10)), "b": [ "x", "y", "z" ] })
+        with ParamSweeperCoordinator(self.persistence_dir, address) as coordinator:
+            results = multiprocessing.Queue()
+            clients = [ multiprocessing.Process(target = _coordinator_client,
+                                                args = (coordinator.address, coordinator.authkey,
+                                                        sweeps, results))
+                        for i in range(num_clients) ]
+            for client in clients:
+                client.start()
+            processed = [ c for i in range(num_clients) for c in results.get(timeout = 60) ]
+            for client in clients:
+                client.join(60)
+                self.assertEqual(client.exitcode, 0)
+        self.assertEqual(len(processed), len(sweeps))
+        self.assertEqual(set(processed), set(sweeps))
+        # the persistence directory is a regular ParamSweeper one
+        sweeper = ParamSweeper(self.persistence_dir, sweeps)
+        self.assertEqual(set(sweeper.get_done()), set(sweeps))
+
+    def test_tcp_localhost(self):
+        self.check_clients(("localhost", 0))
+
+    def test_unix_socket(self):
+        self.check_clients(os.path.join(self.persistence_dir, "socket"))
+
+    def test_authkey_generated_for_non_loopback(self):
+        coordinator = ParamSweeperCoordinator(self.persistence_dir, ("0.0.0.0", 0))
+        self.assertNotEqual(coordinator.authkey, None)
+        authkey_filename = os.path.join(self.persistence_dir, "authkey")
+        self.assertEqual(stat.S_IMODE(os.stat(authkey_filename).st_mode), 0o600)
+        with open(authkey_filename, "rb") as f:
+            self.assertEqual(f.read(), coordinator.authkey)
+        with coordinator:
+            address = ("localhost", coordinator.address[1])
+            self.assertRaises(Exception, multiprocessing.connection.Client,
+                              address, authkey = b"wrong")
+            sweeper = ParamSweeper(None, sweep({ "a": [ 1, 2 ] }), coordinator = address,
+                                   authkey = coordinator.authkey)
+            self.assertEqual(len(sweeper.get_remaining()), 2)
+
+    def test_no_authkey_on_loopback(self):
+        coordinator = ParamSweeperCoordinator(self.persistence_dir, ("127.0.0.1", 0))
+        self.assertEqual(coordinator.authkey, None)
+        self.assertFalse(os.path.exists(os.path.join(self.persistence_dir, "authkey")))
+
+if __name__ == "__main__":
+    unittest.main()
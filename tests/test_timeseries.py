@@ -0,0 +1,60 @@
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from execo_engine.timeseries import TimeSeriesStore, MetricsCollector
+
+class TestMetricsCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lagging_series(self):
+        polls = [ { "a/p": [ (110, 1.0) ], "b/p": [ (100, 2.0) ] },
+                  { "b/p": [ (105, 3.0), (110, 4.0), (120, 5.0) ] },
+                  { "a/p": [ (110, 1.0), (115, 6.0) ], "b/p": [ (120, 5.0) ] } ]
+        watermarks = []
+        def source(watermark):
+            watermarks.append(watermark)
+            return polls.pop(0)
+        store = TimeSeriesStore(self.directory)
+        collector = MetricsCollector(store, { "s": source })
+        for i in range(3):
+            collector.poll()
+        self.assertEqual(watermarks, [ None, 100, 110 ])
+        self.assertEqual(store.get("a/p"), [ (110, 1.0), (115, 6.0) ])
+        self.assertEqual(store.get("b/p"), [ (100, 2.0), (105, 3.0), (110, 4.0), (120, 5.0) ])
+        store.close()
+        self.assertEqual(TimeSeriesStore(self.directory).get_watermarks("s"),
+                         { "a/p": 115, "b/p": 120 })
+
+    def test_stale_series_ignored(self):
+        polls = [ { "a/p": [ (100, 1.0) ], "b/p": [ (100, 1.0) ] } ]
+        polls += [ { "a/p": [ (100 + 60 * i, 1.0) ] } for i in range(1, 20) ]
+        watermarks = []
+        def source(watermark):
+            watermarks.append(watermark)
+            return polls.pop(0)
+        store = TimeSeriesStore(self.directory)
+        collector = MetricsCollector(store, { "s": source }, interval = 60, max_lag = 300)
+        for i in range(20):
+            collector.poll()
+        # b/p stops reporting at 100: it holds the watermark back only
+        # while it lags at most max_lag behind a/p
+        self.assertEqual(watermarks[:7], [ None, 100, 100, 100, 100, 100, 100 ])
+        self.assertEqual(watermarks[7:], [ 100 + 60 * i for i in range(6, 19) ])
+        self.assertEqual(store.get_watermarks("s")["b/p"], 100)
+
+    def test_downsampling_resumed_after_restart(self):
+        tiers = ((1, 1000), (60, 100))
+        store = TimeSeriesStore(self.directory, tiers)
+        store.append("a/p", [ (120, 1.0), (121, 2.0), (122, 3.0) ])
+        store.close()
+        store = TimeSeriesStore(self.directory, tiers)
+        store.append("a/p", [ (123, 6.0), (180, 10.0) ])
+        store.close()
+        self.assertEqual(store.get("a/p", tier = 1), [ (120, 3.0), (180, 10.0) ])
+
+if __name__ == "__main__":
+    unittest.main()
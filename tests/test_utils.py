@@ -0,0 +1,105 @@
+import os, sys, shutil, tempfile, gzip, subprocess, unittest
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, src_dir)
+from execo_engine.utils import _OutputLog
+
+class TestOutputLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_rotation(self, compress):
+        filename = os.path.join(self.directory, "log")
+        suffix = ".gz" if compress else ""
+        lines = [ ("%04i %s\n" % (i, os.urandom(40).hex())).encode("ascii") for i in range(200) ]
+        log = _OutputLog(filename, compress, 4096, 2)
+        for line in lines:
+            log.write(line)
+            log.flush()
+        log.close()
+        files = [ filename + ".2" + suffix, filename + ".1" + suffix, filename + suffix ]
+        self.assertFalse(os.path.exists(filename + ".3" + suffix))
+        contents = b""
+        for f in files:
+            if compress:
+                with gzip.open(f, "rb") as fd:
+                    contents += fd.read()
+            else:
+                with open(f, "rb") as fd:
+                    contents += fd.read()
+        # the last files contain the last lines, each rotated file at
+        # least max_size bytes on disk
+        self.assertTrue(b"".join(lines).endswith(contents))
+        for f in files[:2]:
+            self.assertTrue(os.path.getsize(f) >= 4096)
+        self.assertTrue(os.path.getsize(files[2]) < 4096 + 200)
+
+    def test_rotation(self):
+        self.check_rotation(False)
+
+    def test_rotation_compressed(self):
+        self.check_rotation(True)
+
+_copy_outputs_script = """
+import sys, subprocess
+sys.path.insert(0, %r)
+from execo_engine.utils import copy_outputs, _OutputLog
+if sys.argv[2] == "fail":
+    def write(self, data):
+        raise IOError("disk full")
+    _OutputLog.write = write
+copy_outputs(sys.argv[1] + ".out", sys.argv[1] + ".err")
+for i in range(20000):
+    print("line %%i" %% i)
+subprocess.call("echo from subprocess; echo error from subprocess >&2", shell = True)
+sys.stdout.write("no newline at exit")
+"""
+
+class TestCopyOutputs(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.directory, "outputs")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_script(self, mode):
+        process = subprocess.Popen([ sys.executable, "-c", _copy_outputs_script % (src_dir,),
+                                     self.prefix, mode ],
+                                   stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        try:
+            (stdout, stderr) = process.communicate(timeout = 60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            self.fail("process blocked writing its outputs")
+        self.assertEqual(process.returncode, 0)
+        return (stdout, stderr)
+
+    def expected_stdout(self):
+        return ("".join([ "line %i\n" % i for i in range(20000) ])
+                + "from subprocess\nno newline at exit").encode("ascii")
+
+    def test_drained_at_exit(self):
+        (stdout, stderr) = self.run_script("ok")
+        self.assertEqual(stdout, self.expected_stdout())
+        with open(self.prefix + ".out", "rb") as f:
+            self.assertEqual(f.read(), self.expected_stdout())
+        with open(self.prefix + ".err", "rb") as f:
+            self.assertEqual(f.read(), b"error from subprocess\n")
+
+    def test_log_errors(self):
+        # with a log failing at each write, outputs are still copied
+        # to their original destination, and the process does not
+        # block on a full pipe
+        (stdout, stderr) = self.run_script("fail")
+        self.assertEqual(stdout, self.expected_stdout())
+        self.assertTrue(b"disk full" in stderr)
+        self.assertTrue(b"error from subprocess\n" in stderr)
+
+if __name__ == "__main__":
+    unittest.main()